@@ -0,0 +1 @@
+"""Скрипты для замеров производительности этапов ETL."""
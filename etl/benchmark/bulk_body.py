@@ -0,0 +1,114 @@
+"""Замер скорости сборки тел bulk-запросов.
+
+Сравнивает прежнюю сборку (str.format и json.dumps на документ, затем
+склейка в одну строку и кодирование в UTF-8) с BulkBodyBuilder на orjson
+и на стандартном json. Документы строятся из dump/dump.sql тем же
+преобразователем, что и при загрузке.
+
+Запуск из директории etl:
+    python -m benchmark.bulk_body --repeat 20
+"""
+import argparse
+import json
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable
+
+from benchmark.dump_data import DEFAULT_DUMP, dump_documents
+from benchmark.report import write_report
+from loader.bulk_body import BulkBodyBuilder, dumps_stdlib, orjson
+
+INDEX_NAME = 'movies'
+DEFAULT_REPEAT = 20
+
+Documents = list[dict[str, Any]]
+
+
+def legacy_body(documents: Documents) -> bytes:
+    """Собирает тело запроса так, как загрузчик делал до BulkBodyBuilder.
+
+    Args:
+        documents: документы индекса
+
+    Returns:
+        тело запроса в UTF-8
+    """
+    bulk_string = '\n'.join(
+        [
+            (
+                '{{"index": {{"_index": "{index}", "_id": "{entry_id}"}}}}\n'
+                + '{entry_json}'
+            ).format(
+                index=INDEX_NAME,
+                entry_id=document.get('id'),
+                entry_json=json.dumps(document),
+            )
+            for document in documents
+        ],
+    ) + '\n'
+    return bulk_string.encode('utf-8')
+
+
+def measure(
+    name: str,
+    build: Callable[[Documents], bytes],
+    documents: Documents,
+    repeat: int,
+) -> dict:
+    """Замеряет сборку тела запроса из всех документов.
+
+    Args:
+        name: название способа сборки
+        build: функция сборки тела
+        documents: документы индекса
+        repeat: количество повторов
+
+    Returns:
+        Словарь с результатами замера.
+    """
+    timings = []
+    for _ in range(repeat):
+        started_at = perf_counter()
+        body = build(documents)
+        timings.append(perf_counter() - started_at)
+    best = min(timings)
+    return {
+        'builder': name,
+        'documents': len(documents),
+        'body_bytes': len(body),
+        'best_seconds': round(best, 5),
+        'documents_per_second': round(len(documents) / best, 1),
+    }
+
+
+def get_builders() -> dict[str, Callable[[Documents], bytes]]:
+    """Возвращает сравниваемые способы сборки.
+
+    Returns:
+        функции сборки по названиям
+    """
+    builders = {
+        'legacy': legacy_body,
+        'builder+json': BulkBodyBuilder(INDEX_NAME, dumps_stdlib).body,
+    }
+    if orjson is not None:
+        builders['builder+orjson'] = BulkBodyBuilder(INDEX_NAME).body
+    return builders
+
+
+def main():
+    """Разбирает аргументы и выводит сравнение способов сборки."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dump', type=Path, default=DEFAULT_DUMP)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    args = parser.parse_args()
+
+    documents = dump_documents(args.dump)
+    write_report([
+        measure(name, build, documents, args.repeat)
+        for name, build in get_builders().items()
+    ])
+
+
+if __name__ == '__main__':
+    main()
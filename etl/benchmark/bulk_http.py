@@ -0,0 +1,107 @@
+"""Замер пропускной способности bulk-запросов к elastic search.
+
+Сравнивает отправку через отдельный requests.post на каждый запрос
+(новое соединение каждый раз), через общую сессию с пулом соединений
+и через сессию со сжатием тел gzip. Запросы отправляются в локальную
+заглушку _bulk, результаты выводятся в JSON.
+
+Запуск из директории etl:
+    python -m benchmark.bulk_http --requests 200 --chunk-size 100
+"""
+import argparse
+from functools import partial
+from time import perf_counter
+from typing import Callable
+
+import requests
+from benchmark.documents import make_document
+from benchmark.report import write_report
+from benchmark.stub_elastic import StubElasticServer
+from db.elastic import ElasticClient
+from loader.bulk_body import BulkBodyBuilder
+
+DEFAULT_REQUESTS = 200
+
+
+def post_without_session(url: str, body: bytes) -> requests.Response:
+    """Отправляет запрос без общей сессии, как до появления пула.
+
+    Args:
+        url: базовый адрес elastic
+        body: тело bulk-запроса
+
+    Returns:
+        HTTP Response
+    """
+    return requests.post(
+        '{0}/_bulk/'.format(url),
+        headers={'Content-Type': 'application/json'},
+        data=body,
+        timeout=10,
+    )
+
+
+def get_sender(mode: str, url: str) -> Callable[[bytes], requests.Response]:
+    """Возвращает функцию отправки bulk-запроса выбранным способом.
+
+    Args:
+        mode: способ отправки (requests.post, session, session+gzip)
+        url: базовый адрес elastic
+
+    Returns:
+        функция, принимающая тело запроса
+    """
+    if mode == 'requests.post':
+        return partial(post_without_session, url)
+    client = ElasticClient(url, 'movies', compress=(mode == 'session+gzip'))
+    return client.post_bulk
+
+
+def measure(mode: str, bodies: list[bytes], chunk_size: int) -> dict:
+    """Отправляет все тела запросов выбранным способом.
+
+    Args:
+        mode: способ отправки (requests.post, session, session+gzip)
+        bodies: тела bulk-запросов
+        chunk_size: количество документов в одном запросе
+
+    Returns:
+        Словарь с результатами замера.
+    """
+    with StubElasticServer() as server:
+        send = get_sender(mode, server.url)
+        started_at = perf_counter()
+        for bulk_body in bodies:
+            send(bulk_body).raise_for_status()
+        elapsed = perf_counter() - started_at
+        return {
+            'mode': mode,
+            'requests': len(bodies),
+            'seconds': round(elapsed, 4),
+            'requests_per_second': round(len(bodies) / elapsed, 1),
+            'documents_per_second': round(
+                len(bodies) * chunk_size / elapsed, 1,
+            ),
+            'connections': server.stats['connections'],
+            'bytes_sent': server.stats['bytes_received'],
+        }
+
+
+def main():
+    """Разбирает аргументы и выводит сравнение способов отправки."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS)
+    parser.add_argument('--chunk-size', type=int, default=100)
+    args = parser.parse_args()
+
+    documents = [make_document() for _ in range(args.chunk_size)]
+    body = BulkBodyBuilder('movies').body(documents)
+    bodies = [body for _ in range(args.requests)]
+    write_report([
+        measure(mode, bodies, args.chunk_size)
+        for mode in ('requests.post', 'session', 'session+gzip')
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Подготовка отдельной БД для замеров из дампа dump/dump.sql.
+
+Дамп выполняется как есть, кроме смены владельцев объектов: команды
+между блоками COPY - одним запросом, данные блоков - через COPY FROM
+STDIN.
+"""
+import io
+from pathlib import Path
+
+from benchmark.dump_data import COPY_END, DEFAULT_DUMP
+from config import settings
+from psycopg2 import connect, sql
+
+COPY_COMMAND = 'COPY '
+OWNER_CHANGE = 'OWNER TO'
+COMMENT = '--'
+DUMP_ENCODING = 'utf-8'
+CREATE_DATABASE_QUERY = """
+CREATE DATABASE {0} ENCODING 'UTF8' TEMPLATE template0;
+"""
+
+
+def create_database(dbname: str):
+    """Создаёт пустую БД, удаляя прежнюю с тем же именем.
+
+    Args:
+        dbname: имя БД
+    """
+    connection = connect(**settings.pg_dsn.dict())
+    # CREATE DATABASE не выполняется внутри транзакции
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql.SQL('DROP DATABASE IF EXISTS {0};').format(
+                sql.Identifier(dbname),
+            ),
+        )
+        cursor.execute(
+            sql.SQL(CREATE_DATABASE_QUERY).format(sql.Identifier(dbname)),
+        )
+    connection.close()
+
+
+def load_dump(dump_path: Path = DEFAULT_DUMP):
+    """Выполняет дамп в БД из настроек.
+
+    Args:
+        dump_path: путь к файлу дампа
+    """
+    connection = connect(**settings.pg_dsn.dict())
+    with connection:
+        with connection.cursor() as cursor:
+            with open(dump_path, encoding=DUMP_ENCODING) as dump_file:
+                _execute_dump(cursor, dump_file)
+    connection.close()
+
+
+def _execute_dump(cursor, dump_file):
+    """Выполняет команды и блоки COPY дампа.
+
+    Args:
+        cursor: курсор подключения
+        dump_file: файл дампа
+    """
+    statements = []
+    for line in dump_file:
+        if line.startswith(COPY_COMMAND):
+            _execute(cursor, statements)
+            statements = []
+            cursor.copy_expert(line, _copy_data(dump_file))
+        elif not line.startswith(COMMENT) and OWNER_CHANGE not in line:
+            statements.append(line)
+    _execute(cursor, statements)
+
+
+def _execute(cursor, statements: list[str]):
+    """Выполняет накопленные команды дампа одним запросом.
+
+    Args:
+        cursor: курсор подключения
+        statements: строки команд
+    """
+    query = ''.join(statements).strip()
+    if query:
+        cursor.execute(query)
+
+
+def _copy_data(dump_file) -> io.BytesIO:
+    """Читает данные блока COPY до маркера окончания.
+
+    Args:
+        dump_file: файл дампа, спозиционированный на первом ряде
+
+    Returns:
+        данные блока в текстовом формате COPY в кодировке дампа
+    """
+    copy_data = io.BytesIO()
+    for line in dump_file:
+        if line.rstrip('\n') == COPY_END:
+            break
+        copy_data.write(line.encode(DUMP_ENCODING))
+    copy_data.seek(0)
+    return copy_data
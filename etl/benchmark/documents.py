@@ -0,0 +1,71 @@
+"""Генерация синтетических документов индекса movies для замеров."""
+import random
+from uuid import uuid4
+
+WORDS = (
+    'star',
+    'war',
+    'trek',
+    'galaxy',
+    'return',
+    'empire',
+    'force',
+    'dark',
+    'light',
+    'planet',
+    'ship',
+    'captain',
+    'journey',
+    'night',
+)
+MAX_ACTORS = 30
+MAX_WRITERS = 5
+
+
+def make_text(words_count: int) -> str:
+    """Формирует случайный текст.
+
+    Args:
+        words_count: количество слов
+
+    Returns:
+        строка из случайных слов
+    """
+    return ' '.join(random.choices(WORDS, k=words_count))  # noqa: S311
+
+
+def make_people(max_count: int) -> list[dict]:
+    """Формирует случайный список персон.
+
+    Args:
+        max_count: максимальное количество персон
+
+    Returns:
+        список персон в формате индекса
+    """
+    return [
+        {'id': str(uuid4()), 'name': make_text(2)}
+        for _ in range(random.randint(1, max_count))  # noqa: S311
+    ]
+
+
+def make_document() -> dict:
+    """Формирует случайный документ в формате индекса movies.
+
+    Returns:
+        документ film_work
+    """
+    actors = make_people(MAX_ACTORS)
+    writers = make_people(MAX_WRITERS)
+    return {
+        'id': str(uuid4()),
+        'title': make_text(3),
+        'description': make_text(60),
+        'imdb_rating': round(random.uniform(1, 10), 1),  # noqa: S311
+        'genre': random.sample(WORDS, 3),  # noqa: S311
+        'director': [make_text(2)],
+        'actors': actors,
+        'actors_names': [actor['name'] for actor in actors],
+        'writers': writers,
+        'writers_names': [writer['name'] for writer in writers],
+    }
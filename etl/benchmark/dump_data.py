@@ -0,0 +1,162 @@
+"""Чтение данных схемы content из дампа dump/dump.sql без Postgres.
+
+Блоки COPY разбираются в ряды таблиц, из которых собираются записи
+в формате движка обогащения aggregated и документы индекса movies.
+"""
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Iterator
+
+from config import settings
+from frozendict import frozendict
+from transformer.pg_to_elastic import PostgresElasticTransformer
+
+DEFAULT_DUMP = settings.base_dir.parent / 'dump' / 'dump.sql'
+COPY_HEADER = re.compile(r'^COPY content\.(\w+) \((.+)\) FROM stdin;$')
+COPY_END = r'\.'
+COPY_NULL = r'\N'
+COPY_ESCAPES = re.compile(r'\\(.)')
+COPY_ESCAPED_CHARS = frozendict({'t': '\t', 'n': '\n', 'r': '\r'})
+
+Rows = list[dict[str, Any]]
+Tables = dict[str, Rows]
+
+
+def read_tables(dump_path: Path = DEFAULT_DUMP) -> Tables:
+    """Читает ряды таблиц схемы content из блоков COPY дампа.
+
+    Args:
+        dump_path: путь к файлу дампа
+
+    Returns:
+        ряды каждой таблицы в виде словарей
+    """
+    tables: Tables = {}
+    with open(dump_path, encoding='utf-8') as dump_file:
+        for line in dump_file:
+            header = COPY_HEADER.match(line.rstrip('\n'))
+            if header:
+                columns = header.group(2).split(', ')
+                tables[header.group(1)] = _read_copy_rows(dump_file, columns)
+    return tables
+
+
+def _read_copy_rows(dump_file, columns: list[str]) -> Rows:
+    """Читает ряды блока COPY до маркера окончания.
+
+    Args:
+        dump_file: файл дампа, спозиционированный на первом ряде
+        columns: колонки блока
+
+    Returns:
+        ряды блока
+    """
+    rows = []
+    for line in dump_file:
+        row_line = line.rstrip('\n')
+        if row_line == COPY_END:
+            break
+        values = [_unescape(value) for value in row_line.split('\t')]
+        rows.append(dict(zip(columns, values)))
+    return rows
+
+
+def _unescape(copy_value: str):
+    """Раскодирует значение поля текстового формата COPY.
+
+    Args:
+        copy_value: значение поля
+
+    Returns:
+        строка или None для NULL
+    """
+    if copy_value == COPY_NULL:
+        return None
+    return COPY_ESCAPES.sub(
+        lambda escaped: COPY_ESCAPED_CHARS.get(
+            escaped.group(1),
+            escaped.group(1),
+        ),
+        copy_value,
+    )
+
+
+def aggregated_records(tables: Tables) -> Iterator[dict[str, Any]]:
+    """Собирает записи в формате запроса AGGREGATED_DATA_QUERY.
+
+    Args:
+        tables: ряды таблиц схемы content
+
+    Yields:
+        запись film_work с персонами и жанрами
+    """
+    film_persons = _film_persons(tables)
+    film_genres = _film_genres(tables)
+    for film_work in tables['film_work']:
+        rating = film_work['rating']
+        yield {
+            'fw_id': film_work['id'],
+            'fw_title': film_work['title'],
+            'fw_description': film_work['description'],
+            'fw_rating': float(rating) if rating is not None else None,
+            'fw_type': film_work['type'],
+            'persons': film_persons[film_work['id']],
+            'genres': sorted(film_genres[film_work['id']]),
+        }
+
+
+def _film_persons(tables: Tables) -> Tables:
+    """Группирует персоны с ролями по film_work.
+
+    Args:
+        tables: ряды таблиц схемы content
+
+    Returns:
+        персоны каждого film_work
+    """
+    people = {person['id']: person['full_name'] for person in tables['person']}
+    film_persons = defaultdict(list)
+    for person_role in tables['person_film_work']:
+        film_persons[person_role['film_work_id']].append({
+            'id': person_role['person_id'],
+            'name': people[person_role['person_id']],
+            'role': person_role['role'],
+        })
+    return film_persons
+
+
+def _film_genres(tables: Tables) -> dict[str, set[str]]:
+    """Группирует названия жанров по film_work.
+
+    Args:
+        tables: ряды таблиц схемы content
+
+    Returns:
+        жанры каждого film_work
+    """
+    genres = {genre['id']: genre['name'] for genre in tables['genre']}
+    film_genres = defaultdict(set)
+    for film_genre in tables['genre_film_work']:
+        film_genres[film_genre['film_work_id']].add(
+            genres[film_genre['genre_id']],
+        )
+    return film_genres
+
+
+def dump_documents(dump_path: Path = DEFAULT_DUMP) -> list[dict[str, Any]]:
+    """Строит документы индекса movies из дампа тем же преобразователем.
+
+    Args:
+        dump_path: путь к файлу дампа
+
+    Returns:
+        документы индекса
+    """
+    records = aggregated_records(read_tables(dump_path))
+    transformer = PostgresElasticTransformer()
+    return [
+        document
+        for documents in transformer.transform(records)
+        for document in documents
+    ]
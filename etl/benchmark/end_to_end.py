@@ -0,0 +1,212 @@
+"""Замер полной и инкрементальной синхронизации на данных дампа.
+
+Создаёт отдельную БД, выполняет в ней dump/dump.sql и при --scale N
+размножает данные схемы content в N раз. Затем с пустым состоянием
+выполняет проход выбранного runner (полная синхронизация), меняет
+--changes film_work и персон и выполняет второй проход (инкрементальная
+синхронизация). Документы отправляются в заглушку _bulk в текущем
+процессе или, с --elastic-url, в elastic search в индекс --index.
+
+Для каждого прохода выводятся в JSON время прохода и этапов по метрикам
+common.metrics, количество запросов и рядов Postgres, ряды и документы
+в секунду и пиковый размер памяти процесса.
+
+Запуск из директории etl:
+    python -m benchmark.end_to_end --scale 10 --runner threaded
+"""
+import argparse
+import tempfile
+from time import perf_counter
+from typing import Callable
+
+from benchmark import database, report, synthetic
+from benchmark.stub_elastic import StubElasticServer
+from common import metrics
+from config import settings
+from extractor.pg_extract import create_keyset_indexes
+from extractor.tombstones import install_tombstones
+from loader.indices import IndexManager
+from runner import async_pipeline, parallel, sequential, threaded
+
+runners = {
+    'sequential': sequential.run_pass,
+    'threaded': threaded.run_pass,
+    'parallel': parallel.run_pass,
+    'async': async_pipeline.run_pass,
+}
+# метрики, по разнице значений которых считаются итоги прохода
+MEASURED_METRICS = (
+    metrics.pg_query_seconds,
+    metrics.pg_rows,
+    metrics.transform_seconds,
+    metrics.documents,
+    metrics.bulk_seconds,
+    metrics.bulk_requests,
+    metrics.bulk_bytes,
+)
+
+
+def metric_totals() -> dict[str, float]:
+    """Снимает текущие суммы и количества замеряемых метрик.
+
+    Returns:
+        значения рядов по имени метрики и значениям меток
+    """
+    return {
+        ':'.join((name, *labels.values())): sample_value
+        for metric in MEASURED_METRICS
+        for name, labels, sample_value in metric.samples()
+        if not name.endswith('_bucket')
+    }
+
+
+def metric_total(increments: dict[str, float], name: str) -> float:
+    """Суммирует приращения ряда метрики по всем значениям меток.
+
+    Args:
+        increments: приращения рядов за проход
+        name: имя метрики
+
+    Returns:
+        сумма приращений
+    """
+    return sum(
+        increment
+        for key, increment in increments.items()
+        if key.split(':')[0] == name
+    )
+
+
+def measure_pass(run_pass: Callable[[], None]) -> dict:
+    """Выполняет проход и собирает его итоги.
+
+    Args:
+        run_pass: функция прохода runner
+
+    Returns:
+        итоги прохода
+    """
+    before = metric_totals()
+    started_at = perf_counter()
+    run_pass()
+    seconds = perf_counter() - started_at
+    return pass_summary(
+        seconds,
+        {
+            key: total - before.get(key, 0)
+            for key, total in metric_totals().items()
+            if total != before.get(key, 0)
+        },
+    )
+
+
+def pass_summary(seconds: float, increments: dict[str, float]) -> dict:
+    """Составляет итоги прохода по приращениям метрик.
+
+    Время этапов - сумма времени их операций; в конвейерных runner этапы
+    идут одновременно, и сумма может превышать время прохода.
+
+    Args:
+        seconds: время прохода
+        increments: приращения рядов метрик за проход
+
+    Returns:
+        итоги прохода
+    """
+    pg_rows = metric_total(increments, 'etl_pg_rows_total')
+    sent = increments.get('etl_documents_total:sent', 0)
+    return {
+        'seconds': round(seconds, 3),
+        'stage_seconds': {
+            'extract': round(
+                metric_total(increments, 'etl_pg_query_seconds_sum'),
+                3,
+            ),
+            'transform': round(
+                increments.get('etl_transform_seconds_sum', 0),
+                3,
+            ),
+            'load': round(increments.get('etl_bulk_seconds_sum', 0), 3),
+        },
+        'pg_queries': metric_total(increments, 'etl_pg_query_seconds_count'),
+        'pg_rows': pg_rows,
+        'pg_rows_per_second': round(pg_rows / seconds, 1),
+        'documents_sent_per_second': round(sent / seconds, 1),
+        'peak_rss_mb': report.peak_rss_mb(),
+        'metrics': increments,
+    }
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    """Выполняет полную и инкрементальную синхронизацию.
+
+    Args:
+        args: аргументы командной строки
+
+    Returns:
+        отчёт замеров
+    """
+    if args.elastic_url:
+        settings.elastic_url = args.elastic_url
+        settings.elastic_index = args.index
+        IndexManager().ensure_alias()
+    if settings.pg_track_deletes:
+        install_tombstones()
+    if settings.pg_create_keyset_indexes:
+        create_keyset_indexes()
+    run_pass = runners[args.runner]
+    full_sync = measure_pass(run_pass)
+    synthetic.change_content(args.changes)
+    incremental_sync = measure_pass(run_pass)
+    return {
+        'runner': args.runner,
+        'enrichment_engine': settings.enrichment_engine,
+        'chunk_size': settings.chunk_size,
+        'transform_processes': settings.transform_processes,
+        'scale': args.scale,
+        'changes': args.changes,
+        'rows': synthetic.count_rows(),
+        'full_sync': full_sync,
+        'incremental_sync': incremental_sync,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    """Разбирает аргументы командной строки.
+
+    Returns:
+        аргументы
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dbname', default='movies_benchmark')
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--skip-load', action='store_true')
+    parser.add_argument('--runner', choices=runners, default=settings.runner)
+    parser.add_argument('--changes', type=int, default=100)
+    parser.add_argument('--elastic-url')
+    parser.add_argument('--index', default='movies_benchmark')
+    return parser.parse_args()
+
+
+def main():
+    """Готовит БД и выводит отчёт замеров."""
+    args = parse_args()
+    if not args.skip_load:
+        database.create_database(args.dbname)
+    settings.pg_dsn.dbname = args.dbname
+    if not args.skip_load:
+        database.load_dump()
+        synthetic.scale_content(args.scale)
+    # состояние и хеши загруженных документов каждого запуска - с нуля
+    settings.storage_subdir = tempfile.mkdtemp(prefix='etl_benchmark_')
+
+    if args.elastic_url:
+        report.write_report(run_benchmark(args))
+        return
+    with StubElasticServer() as stub:
+        settings.elastic_url = stub.url
+        report.write_report(run_benchmark(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Сравнение движков получения расширенных данных.
+
+Прогоняет все film_work из БД (заполненной dump/dump.sql) блоками через
+движки join, aggregated и cached и выводит количество рядов и время
+запросов в JSON.
+
+Запуск из директории etl:
+    python -m benchmark.enrichment_queries --chunk-size 100 --repeat 3
+"""
+import argparse
+from statistics import median
+from time import perf_counter
+
+from benchmark.report import MILLISECONDS, P95, percentile, write_report
+from config import settings
+from db.postgres import PostgresQueryWrapper
+
+ALL_FILM_WORK_IDS_QUERY = 'SELECT id FROM content.film_work ORDER BY id;'
+
+
+def time_pass(db: PostgresQueryWrapper, fw_ids: list[str], chunk_size: int):
+    """Выполняет один полный проход по film_work блоками.
+
+    Args:
+        db: обёртка запросов с выбранным движком
+        fw_ids: набор id film_work для выгрузки
+        chunk_size: количество film_work в одном запросе
+
+    Returns:
+        Время выполнения каждого запроса и общее количество рядов.
+    """
+    timings = []
+    rows_count = 0
+    for start in range(0, len(fw_ids), chunk_size):
+        started_at = perf_counter()
+        rows = list(db.get_enriched_rows(fw_ids[start:start + chunk_size]))
+        timings.append(perf_counter() - started_at)
+        rows_count += len(rows)
+
+    return timings, rows_count
+
+
+def measure_engine(
+    engine: str,
+    fw_ids: list[str],
+    chunk_size: int,
+    repeat: int,
+) -> dict:
+    """Замеряет выполнение запросов расширенных данных для движка.
+
+    Args:
+        engine: название движка (join, aggregated или cached)
+        fw_ids: набор id film_work для выгрузки
+        chunk_size: количество film_work в одном запросе
+        repeat: количество повторов полного прохода
+
+    Returns:
+        Словарь с результатами замеров.
+    """
+    db = PostgresQueryWrapper(chunk_size, enrichment_engine=engine)
+    timings = []
+    rows_count = 0
+    for _ in range(repeat):
+        pass_timings, rows_count = time_pass(db, fw_ids, chunk_size)
+        timings.extend(pass_timings)
+    db.client.close()
+
+    return {
+        'engine': engine,
+        'film_works': len(fw_ids),
+        'rows': rows_count,
+        'rows_per_film_work': round(rows_count / max(len(fw_ids), 1), 2),
+        'queries': len(timings),
+        'total_seconds': round(sum(timings) / repeat, 4),
+        'median_ms': round(median(timings) * MILLISECONDS, 2),
+        'p95_ms': percentile(timings, P95),
+    }
+
+
+def main():
+    """Разбирает аргументы и выводит сравнение движков."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chunk-size', type=int, default=settings.chunk_size)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    db = PostgresQueryWrapper(args.chunk_size)
+    fw_ids = [
+        row.id
+        for row in db.client.get_query_rows(ALL_FILM_WORK_IDS_QUERY)
+    ]
+    db.client.close()
+
+    report = [
+        measure_engine(engine, fw_ids, args.chunk_size, args.repeat)
+        for engine in PostgresQueryWrapper.enrichment_queries.keys()
+    ]
+    write_report(report)
+
+
+if __name__ == '__main__':
+    main()
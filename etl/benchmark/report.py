@@ -0,0 +1,55 @@
+"""Общие функции для обработки результатов замеров."""
+import json
+import resource
+import sys
+from typing import Any
+
+MILLISECONDS = 1000
+P95 = 0.95
+# ru_maxrss в Linux - в килобайтах
+RSS_UNIT = 1024
+
+
+def percentile(timings: list[float], share: float) -> float:
+    """Возвращает перцентиль набора замеров в миллисекундах.
+
+    Args:
+        timings: набор замеров в секундах
+        share: доля перцентиля (например, 0.95)
+
+    Returns:
+        значение перцентиля в миллисекундах (0 для пустого набора)
+    """
+    if not timings:
+        return 0
+    ordered = sorted(timings)
+    last_index = len(ordered) - 1
+    index = min(int(len(ordered) * share), last_index)
+    return round(ordered[index] * MILLISECONDS, 2)
+
+
+def write_report(report: Any):
+    """Выводит отчёт замеров в stdout в формате JSON.
+
+    Args:
+        report: сериализуемый в JSON отчёт
+    """
+    sys.stdout.write('{0}\n'.format(json.dumps(report, indent=2)))
+
+
+def peak_rss_mb() -> dict[str, float]:
+    """Возвращает пиковый размер памяти процесса и дочерних процессов.
+
+    Returns:
+        размер в мегабайтах для процесса и для завершённых дочерних
+    """
+    return {
+        'self': round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / RSS_UNIT,
+            1,
+        ),
+        'children': round(
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / RSS_UNIT,
+            1,
+        ),
+    }
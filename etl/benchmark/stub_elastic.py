@@ -0,0 +1,138 @@
+"""Локальная заглушка API _bulk elastic search для замеров загрузки.
+
+Принимает bulk-запросы (в том числе сжатые gzip) и отвечает успешным
+результатом для каждого действия, не храня документы.
+"""
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HTTP_OK = 200
+HTTP_CREATED = 201
+
+
+def parse_bulk_actions(body: bytes) -> list[tuple[str, dict]]:
+    """Разбирает тело bulk-запроса на действия.
+
+    Args:
+        body: тело запроса в формате NDJSON
+
+    Returns:
+        список пар (тип действия, метаданные действия)
+    """
+    lines = iter(body.splitlines())
+    actions = []
+    for action_line in lines:
+        if not action_line.strip():
+            continue
+        action_type, action_meta = next(iter(json.loads(action_line).items()))
+        actions.append((action_type, action_meta))
+        # у всех действий, кроме delete, за метаданными следует тело
+        if action_type != 'delete':
+            next(lines, None)
+    return actions
+
+
+class StubElasticHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов заглушки elastic search."""
+
+    protocol_version = 'HTTP/1.1'
+    # заголовки и тело ответа пишутся отдельно: без TCP_NODELAY на
+    # keep-alive соединении каждый ответ ждал бы отложенного ACK клиента
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        """Считает новые TCP-соединения."""
+        super().setup()
+        self.server.stats['connections'] += 1
+
+    def do_POST(self):  # noqa: N802
+        """Отвечает на bulk-запрос успешным результатом."""
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.stats['requests'] += 1
+        self.server.stats['bytes_received'] += len(body)
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        items = [
+            {
+                action_type: {
+                    '_index': action_meta.get('_index'),
+                    '_id': action_meta.get('_id'),
+                    'status': HTTP_CREATED,
+                },
+            }
+            for action_type, action_meta in parse_bulk_actions(body)
+        ]
+        self.server.stats['actions'] += len(items)
+        self._send_json({'took': 1, 'errors': False, 'items': items})
+
+    def log_message(self, *args):
+        """Отключает журнал запросов в stderr.
+
+        Args:
+            args: параметры сообщения
+        """
+
+    def _send_json(self, response: dict):
+        """Отправляет ответ в формате JSON.
+
+        Args:
+            response: тело ответа
+        """
+        response_body = json.dumps(response).encode('utf-8')
+        self.send_response(HTTP_OK)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+
+class StubElasticServer:
+    """Запускает заглушку elastic search в отдельном потоке."""
+
+    def __init__(self, handler=StubElasticHandler):
+        """Создаёт сервер на свободном локальном порту.
+
+        Args:
+            handler: класс обработчика запросов
+        """
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._server.daemon_threads = True
+        self._server.stats = {
+            'connections': 0,
+            'requests': 0,
+            'bytes_received': 0,
+            'actions': 0,
+        }
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            daemon=True,
+        )
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def url(self) -> str:
+        """Возвращает базовый адрес заглушки.
+
+        Returns:
+            базовый url заглушки
+        """
+        host, port = self._server.server_address
+        return 'http://{0}:{1}'.format(host, port)
+
+    @property
+    def stats(self) -> dict:
+        """Возвращает счётчики принятых запросов.
+
+        Returns:
+            количество соединений, запросов, принятых байт и действий
+        """
+        return self._server.stats
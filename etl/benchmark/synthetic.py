@@ -0,0 +1,149 @@
+"""Синтетические данные схемы content для замеров на больших объёмах.
+
+Данные размножаются на стороне сервера: у копий id получаются из id
+оригинала и номера копии, поэтому при одинаковом масштабе данные всегда
+одни и те же.
+"""
+from config import settings
+from frozendict import frozendict
+from psycopg2 import connect, sql
+
+# id копии из id оригинала (колонка) и номера копии
+COPY_ID = 'md5({0}::text || copy)::uuid'
+# колонки таблиц content и выражения для их значений в копиях
+SCALED_COLUMNS = frozendict({
+    'film_work': {
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+        'id': COPY_ID.format('id'),
+        'title': "title || ' #' || copy",
+        'description': 'description',
+        'creation_date': 'creation_date',
+        'rating': 'rating',
+        'type': 'type',
+        'file_path': 'file_path',
+    },
+    'genre': {
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+        'id': COPY_ID.format('id'),
+        # имена жанров уникальны
+        'name': "name || ' #' || copy",
+        'description': 'description',
+    },
+    'person': {
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+        'id': COPY_ID.format('id'),
+        'full_name': 'full_name',
+    },
+    'person_film_work': {
+        'id': COPY_ID.format('id'),
+        'role': 'role',
+        'created_at': 'created_at',
+        'film_work_id': COPY_ID.format('film_work_id'),
+        'person_id': COPY_ID.format('person_id'),
+    },
+    'genre_film_work': {
+        'id': COPY_ID.format('id'),
+        'created_at': 'created_at',
+        'film_work_id': COPY_ID.format('film_work_id'),
+        'genre_id': COPY_ID.format('genre_id'),
+    },
+})
+SCALE_QUERY = """
+INSERT INTO content.{table} ({columns})
+SELECT {expressions}
+FROM content.{table}, generate_series(1, {copies}) AS copy;
+"""
+# изменения данных для инкрементальной синхронизации
+CHANGE_FILM_WORK_QUERY = """
+UPDATE content.film_work SET updated_at = now()
+WHERE id IN (SELECT id FROM content.film_work ORDER BY id LIMIT {changes});
+"""
+CHANGE_PERSON_QUERY = """
+UPDATE content.person SET full_name = full_name || '.', updated_at = now()
+WHERE id IN (SELECT id FROM content.person ORDER BY id LIMIT {changes});
+"""
+COUNT_QUERY = 'SELECT count(*) FROM content.{0};'
+
+
+def scale_content(scale: int):
+    """Добавляет scale - 1 копий данных схемы content.
+
+    Args:
+        scale: во сколько раз увеличить количество данных
+    """
+    if scale < 2:
+        return
+    connection = connect(**settings.pg_dsn.dict())
+    with connection:
+        with connection.cursor() as cursor:
+            # каждая вставка читает только оригиналы: копии одного запроса
+            # не видны ему самому
+            for table, columns in SCALED_COLUMNS.items():
+                cursor.execute(_scale_query(table, columns, scale - 1))
+    connection.autocommit = True
+    with connection.cursor() as analyze_cursor:
+        analyze_cursor.execute('ANALYZE;')
+    connection.close()
+
+
+def count_rows() -> dict[str, int]:
+    """Считает ряды таблиц схемы content.
+
+    Returns:
+        количество рядов каждой таблицы
+    """
+    connection = connect(**settings.pg_dsn.dict())
+    counts = {}
+    with connection:
+        with connection.cursor() as cursor:
+            for table in SCALED_COLUMNS:
+                cursor.execute(
+                    sql.SQL(COUNT_QUERY).format(sql.Identifier(table)),
+                )
+                counts[table] = cursor.fetchone()[0]
+    connection.close()
+    return counts
+
+
+def change_content(changes: int):
+    """Отмечает изменёнными film_work и переименовывает персон.
+
+    Args:
+        changes: количество film_work и персон
+    """
+    connection = connect(**settings.pg_dsn.dict())
+    with connection:
+        with connection.cursor() as cursor:
+            for change_query in (CHANGE_FILM_WORK_QUERY, CHANGE_PERSON_QUERY):
+                cursor.execute(
+                    sql.SQL(change_query).format(
+                        changes=sql.Literal(changes),
+                    ),
+                )
+    connection.close()
+
+
+def _scale_query(
+    table: str,
+    columns: dict[str, str],
+    copies: int,
+) -> sql.Composed:
+    """Составляет запрос копирования рядов таблицы.
+
+    Args:
+        table: таблица схемы content
+        columns: колонки и выражения их значений в копиях
+        copies: количество копий каждого ряда
+
+    Returns:
+        запрос INSERT ... SELECT
+    """
+    return sql.SQL(SCALE_QUERY).format(
+        table=sql.Identifier(table),
+        columns=sql.SQL(', ').join(map(sql.Identifier, columns)),
+        expressions=sql.SQL(', ').join(map(sql.SQL, columns.values())),
+        copies=sql.Literal(copies),
+    )
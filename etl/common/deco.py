@@ -1,8 +1,11 @@
+import asyncio
 import logging
 from functools import wraps
 from time import sleep
 from typing import Callable
 
+from common.metrics import backoff_retries
+
 default_logger = logging.getLogger(__name__)
 
 
@@ -44,6 +47,7 @@ def backoff(
                     func_result = func(*args, **kwargs)
                     is_done = True
                 except exceptions as e:
+                    backoff_retries.inc(func.__qualname__)
                     logger_func(
                         'Произошла ошибка в функции {0}: {1}'.format(
                             func.__name__, e.args[0]
@@ -59,3 +63,51 @@ def backoff(
         return inner
 
     return wrapper
+
+
+def async_backoff(
+    exceptions: [Exception | tuple[Exception]] = Exception,
+    start_sleep_time: float = 0.1,
+    factor: int = 2,
+    max_sleep_time: float = 10,
+    logger_func: Callable = default_logger.warning,
+):
+    """
+    Декоратор для повторного запуска корутины при ошибках.
+
+    Работает как backoff, но ожидает через asyncio.sleep, не блокируя
+    цикл событий.
+
+    Args:
+        exceptions: набор исключений для отслеживания, по умолчанию - все
+        start_sleep_time: начальное время ожидания
+        factor: во сколько раз нужно увеличивать время ожидания на каждой
+            итерации
+        max_sleep_time: максимальное время ожидания
+        logger_func: функция логирования с уровнем, по умолчанию -
+            logger.warning этого модуля
+    Returns:
+        результат выполнения корутины
+    """
+    def wrapper(func: Callable):
+        @wraps(func)
+        async def inner(*args, **kwargs):
+            sleep_time = start_sleep_time
+            while True:
+                try:
+                    return await func(*args, **kwargs)
+                except exceptions as e:
+                    backoff_retries.inc(func.__qualname__)
+                    logger_func(
+                        'Произошла ошибка в функции {0}: {1}'.format(
+                            func.__name__, e
+                        )
+                    )
+                    logger_func('Ожидаем {0} секунд...'.format(sleep_time))
+                    await asyncio.sleep(sleep_time)
+                    if sleep_time < max_sleep_time:
+                        sleep_time = min(sleep_time * factor, max_sleep_time)
+
+        return inner
+
+    return wrapper
@@ -0,0 +1,352 @@
+"""Метрики ETL в текстовом формате Prometheus.
+
+Счётчики и гистограммы обновляются в горячем цикле, поэтому обновление -
+это поиск значения по кортежу меток и изменение числа под блокировкой.
+Текст для Prometheus собирается только при запросе /metrics
+(см. common.metrics_server). Метрики хранятся в памяти процесса: у
+процессов переиндексации и пула сборки документов свои значения, которые
+не публикуются.
+"""
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from itertools import accumulate
+from time import perf_counter, time
+from typing import Iterator
+
+# границы гистограмм времени по умолчанию, в секундах
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+# экранирование значений меток
+_LABEL_ESCAPES = str.maketrans({'\\': r'\\', '"': r'\"', '\n': r'\n'})
+# имя метрики, метки и значение одного ряда
+Sample = tuple[str, dict[str, str], float]
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    """Форматирует метки ряда.
+
+    Args:
+        labels: значения меток по именам
+
+    Returns:
+        метки в фигурных скобках или пустая строка
+    """
+    if not labels:
+        return ''
+    escaped = (
+        '{0}="{1}"'.format(label, label_value.translate(_LABEL_ESCAPES))
+        for label, label_value in labels.items()
+    )
+    return '{{{0}}}'.format(','.join(escaped))
+
+
+class Registry:
+    """Набор метрик процесса."""
+
+    def __init__(self):
+        """Создаёт пустой набор."""
+        self._metrics: list['Metric'] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: 'Metric'):
+        """Добавляет метрику в набор.
+
+        Args:
+            metric: метрика
+        """
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        """Собирает текст всех метрик в формате Prometheus.
+
+        Returns:
+            текст ответа /metrics
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = [line for metric in metrics for line in metric.exposition()]
+        lines.append('')
+        return '\n'.join(lines)
+
+
+registry = Registry()
+
+
+class Metric:
+    """Метрика с набором рядов по значениям меток."""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, doc: str, labelnames: tuple = ()):
+        """Регистрирует метрику.
+
+        Args:
+            name: имя метрики
+            doc: описание метрики
+            labelnames: имена меток
+        """
+        self.name = name
+        self.doc = doc
+        self._labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def exposition(self) -> list[str]:
+        """Форматирует метрику для ответа /metrics.
+
+        Returns:
+            строки описания, типа и рядов метрики
+        """
+        lines = [
+            '# HELP {0} {1}'.format(self.name, self.doc),
+            '# TYPE {0} {1}'.format(self.name, self.kind),
+        ]
+        lines.extend(
+            '{0}{1} {2}'.format(name, _format_labels(labels), repr(value))
+            for name, labels, value in self.samples()
+        )
+        return lines
+
+    def samples(self) -> list[Sample]:
+        """Возвращает ряды метрики.
+
+        Returns:
+            имя, метки и значение каждого ряда
+        """
+        return [
+            (self.name, self._labels(key), sample_value)
+            for key, sample_value in self._snapshot()
+        ]
+
+    def _snapshot(self) -> list[tuple]:
+        """Копирует значения рядов под блокировкой.
+
+        Returns:
+            пары метки - значение
+        """
+        with self._lock:
+            return list(self._values.items())
+
+    def _labels(self, key: tuple) -> dict[str, str]:
+        """Сопоставляет значения меток ряда их именам.
+
+        Args:
+            key: значения меток
+
+        Returns:
+            метки ряда
+        """
+        return dict(zip(self._labelnames, key))
+
+
+class Counter(Metric):
+    """Монотонно растущий счётчик."""
+
+    kind = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1):
+        """Увеличивает счётчик.
+
+        Args:
+            labels: значения меток в порядке их имён
+            amount: приращение
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """Значение, которое может как расти, так и уменьшаться."""
+
+    kind = 'gauge'
+
+    def set(self, gauge_value: float, *labels: str):  # noqa: A003
+        """Устанавливает значение.
+
+        Args:
+            gauge_value: новое значение
+            labels: значения меток в порядке их имён
+        """
+        with self._lock:
+            self._values[labels] = gauge_value
+
+
+class LagGauge(Gauge):
+    """Возраст отметки времени, вычисляемый при чтении метрик."""
+
+    def advance(self, timestamp: float, *labels: str):
+        """Сдвигает отметку вперёд; более ранние отметки не учитываются.
+
+        Args:
+            timestamp: отметка времени unix
+            labels: значения меток в порядке их имён
+        """
+        with self._lock:
+            self._values[labels] = max(
+                self._values.get(labels, timestamp),
+                timestamp,
+            )
+
+    def samples(self) -> list[Sample]:
+        """Возвращает возраст отметок на момент запроса.
+
+        Returns:
+            имя, метки и возраст отметки в секундах для каждого ряда
+        """
+        now = time()
+        return [
+            (self.name, self._labels(key), max(now - timestamp, 0))
+            for key, timestamp in self._snapshot()
+        ]
+
+
+class Histogram(Metric):
+    """Распределение значений по корзинам с суммой и количеством."""
+
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        doc: str,
+        labelnames: tuple = (),
+        buckets: tuple = LATENCY_BUCKETS,
+    ):
+        """Регистрирует гистограмму.
+
+        Args:
+            name: имя метрики
+            doc: описание метрики
+            labelnames: имена меток
+            buckets: верхние границы корзин по возрастанию
+        """
+        super().__init__(name, doc, labelnames)
+        self._buckets = buckets
+        self._bounds = [*(repr(float(bound)) for bound in buckets), '+Inf']
+        self._sum_name = '{0}_sum'.format(name)
+        self._count_name = '{0}_count'.format(name)
+
+    def observe(self, observed: float, *labels: str):
+        """Учитывает значение.
+
+        Args:
+            observed: значение
+            labels: значения меток в порядке их имён
+        """
+        bucket = bisect_left(self._buckets, observed)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                # количество по корзинам, включая +Inf, и сумма значений
+                counts = [0 for _ in range(len(self._buckets) + 2)]
+                self._values[labels] = counts
+            counts[bucket] += 1
+            counts[-1] += observed
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """Учитывает время выполнения блока.
+
+        Args:
+            labels: значения меток в порядке их имён
+
+        Yields:
+            управление блоку
+        """
+        started_at = perf_counter()
+        try:  # noqa: WPS501
+            yield
+        finally:
+            self.observe(perf_counter() - started_at, *labels)
+
+    def samples(self) -> list[Sample]:
+        """Возвращает корзины нарастающим итогом, сумму и количество.
+
+        Returns:
+            имя, метки и значение каждого ряда
+        """
+        return [
+            sample
+            for key, counts in self._snapshot()
+            for sample in self._series(self._labels(key), counts)
+        ]
+
+    def _series(self, labels: dict[str, str], counts: list) -> list[Sample]:
+        """Составляет ряды гистограммы одного набора меток.
+
+        Args:
+            labels: метки набора
+            counts: количество по корзинам и сумма значений
+
+        Returns:
+            корзины, сумма и количество
+        """
+        cumulative = list(accumulate(counts[:-1]))
+        series = [
+            ('{0}_bucket'.format(self.name), dict(labels, le=bound), total)
+            for bound, total in zip(self._bounds, cumulative)
+        ]
+        series.append((self._sum_name, labels, counts[-1]))
+        series.append((self._count_name, labels, cumulative[-1]))
+        return series
+
+    def _snapshot(self) -> list[tuple]:
+        """Копирует значения рядов под блокировкой.
+
+        Returns:
+            пары метки - копия счётчиков корзин и суммы
+        """
+        with self._lock:
+            return [
+                (key, list(counts)) for key, counts in self._values.items()
+            ]
+
+
+pg_query_seconds = Histogram(
+    'etl_pg_query_seconds',
+    'Время запросов к Postgres',
+    labelnames=('query',),
+)
+pg_rows = Counter(
+    'etl_pg_rows_total',
+    'Ряды, полученные от Postgres',
+    labelnames=('query',),
+)
+transform_seconds = Histogram(
+    'etl_transform_seconds',
+    'Время сборки документов блока',
+)
+documents = Counter(
+    'etl_documents_total',
+    'Документы по этапам: built - собраны, skipped - не изменились, '
+    + 'sent - отправлены в elastic, failed - не приняты elastic',
+    labelnames=('stage',),
+)
+bulk_seconds = Histogram(
+    'etl_bulk_seconds',
+    'Время bulk-запросов к elastic',
+)
+bulk_requests = Counter(
+    'etl_bulk_requests_total',
+    'Bulk-запросы к elastic по коду ответа',
+    labelnames=('status',),
+)
+bulk_bytes = Counter(
+    'etl_bulk_bytes_total',
+    'Размер отправленных тел bulk-запросов',
+)
+backoff_retries = Counter(
+    'etl_backoff_retries_total',
+    'Повторы вызовов после ошибок',
+    labelnames=('function',),
+)
+table_lag = LagGauge(
+    'etl_table_lag_seconds',
+    'Время с последнего загруженного изменения таблицы или с начала '
+    + 'прохода, прочитавшего таблицу до конца',
+    labelnames=('table',),
+)
@@ -0,0 +1,62 @@
+"""HTTP-сервер с метриками процесса по адресу /metrics."""
+import logging
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+METRICS_PATH = '/metrics'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Отдаёт метрики в текстовом формате Prometheus."""
+
+    def do_GET(self):  # noqa: N802
+        """Отвечает на запрос метрик."""
+        if self.path.split('?')[0] != METRICS_PATH:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Отключает журнал запросов в stderr.
+
+        Args:
+            args: параметры сообщения
+        """
+
+
+def start_metrics_server(host: str, port: int) -> ThreadingHTTPServer:
+    """Запускает сервер метрик в фоновом потоке.
+
+    Args:
+        host: адрес, на котором принимаются запросы
+        port: порт
+
+    Returns:
+        запущенный сервер
+    """
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever,
+        name='metrics',
+        daemon=True,
+    ).start()
+    logger.info(
+        'Метрики доступны на http://{0}:{1}{2}'.format(
+            host,
+            server.server_port,
+            METRICS_PATH,
+        ),
+    )
+    return server
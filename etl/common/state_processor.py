@@ -4,12 +4,70 @@ import abc
 import collections
 import json
 import logging
-from typing import Any, Dict, Optional
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
 
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+# отметка отсутствия ключа в состоянии до начала транзакции
+_MISSING = object()
+# ожидание блокировки базы состояний другим процессом, в секундах
+_BUSY_TIMEOUT = 30
+
+CREATE_STATE_TABLE_QUERY = """
+    CREATE TABLE IF NOT EXISTS state (
+        name TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        PRIMARY KEY (name, key)
+    ) WITHOUT ROWID
+"""
+SELECT_STATE_QUERY = 'SELECT key, value FROM state WHERE name = ?'
+UPSERT_STATE_KEY_QUERY = """
+    INSERT INTO state (name, key, value) VALUES (?, ?, ?)
+    ON CONFLICT (name, key) DO UPDATE SET value = excluded.value
+"""
+DELETE_STATE_KEY_QUERY = 'DELETE FROM state WHERE name = ? AND key = ?'
+DELETE_STATE_QUERY = 'DELETE FROM state WHERE name = ?'
+
+# подключение к базе состояний и блокировка его запросов
+StateDatabase = collections.namedtuple(
+    'StateDatabase',
+    ['connection', 'lock'],
+)
+
+
+@lru_cache(maxsize=None)
+def open_state_database(file_path: Path) -> StateDatabase:
+    """Возвращает общее для процесса подключение к базе состояний.
+
+    Состояния всех этапов и потоков процесса работают с файлом через одно
+    подключение, открытое до завершения процесса.
+
+    Args:
+        file_path: путь к файлу SQLite
+
+    Returns:
+        подключение к базе, созданной при необходимости
+    """
+    connection = sqlite3.connect(
+        str(file_path),
+        timeout=_BUSY_TIMEOUT,
+        check_same_thread=False,
+    )
+    with connection:
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=FULL')
+        connection.execute(CREATE_STATE_TABLE_QUERY)
+    return StateDatabase(connection, threading.Lock())
+
 
 class BaseStorage(abc.ABC):
     """Абстрактное хранилище состояния.
@@ -32,6 +90,18 @@ class BaseStorage(abc.ABC):
     def retrieve_state(self) -> Dict[str, Any]:
         """Получить состояние из хранилища."""
 
+    def save_keys(self, state: Dict[str, Any], keys: Iterable[str]) -> None:
+        """Сохранить изменённые ключи состояния.
+
+        Хранилища, которые не умеют записывать ключи по отдельности,
+        сохраняют состояние целиком.
+
+        Args:
+            state: текущий словарь состояния
+            keys: ключи, изменённые с последнего сохранения
+        """
+        self.save_state(state)
+
 
 class JsonFileStorage(BaseStorage):
     """Реализация хранилища, использующего локальный файл.
@@ -55,11 +125,34 @@ class JsonFileStorage(BaseStorage):
     def save_state(self, state: Dict[str, Any]) -> None:
         """Сохранить состояние в хранилище.
 
+        Запись атомарна: состояние пишется во временный файл рядом
+        с основным, сбрасывается на диск и подменяет основной файл, так что
+        при сбое на диске остаётся либо старое, либо новое состояние.
+        У каждого потока свой временный файл: потоки загрузки конвейера
+        сохраняют состояние с одним именем одновременно.
+
         Args:
             state: текущий словарь состояния.
         """
-        with open(self.file_path, 'w') as json_file:
+        tmp_path = '{0}.{1}.tmp'.format(self.file_path, threading.get_ident())
+        with open(tmp_path, 'w') as json_file:
             json.dump(state, json_file)
+            json_file.flush()
+            os.fsync(json_file.fileno())
+        os.replace(tmp_path, self.file_path)
+        self._fsync_directory(Path(self.file_path).parent)
+
+    def _fsync_directory(self, directory: Path) -> None:
+        """Сбрасывает на диск запись каталога после переименования файла.
+
+        Args:
+            directory: каталог файла состояния
+        """
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:  # noqa: WPS501
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
 
     def retrieve_state(self) -> Dict[str, Any]:
         """Получить состояние из хранилища.
@@ -73,33 +166,178 @@ class JsonFileStorage(BaseStorage):
         except (FileNotFoundError, json.JSONDecodeError):
             return {}
 
+    def mark_migrated(self) -> None:
+        """Переименовывает файл после переноса состояния в другое хранилище.
+
+        Файл остаётся на диске для отката, но больше не читается.
+        """
+        os.replace(self.file_path, '{0}.migrated'.format(self.file_path))
+
+
+class SqliteStorage(BaseStorage):
+    """Хранилище состояний в базе SQLite.
+
+    Каждый ключ состояния хранится отдельной строкой в JSON, поэтому
+    сохранение записывает только изменённые ключи, а чтение разбирает
+    только ключи своего состояния. Одна база хранит состояния всех
+    этапов; несколько процессов работают с ней через журнал WAL, а
+    synchronous=FULL сбрасывает журнал на диск при каждой фиксации.
+    """
 
-class State(collections.UserDict):
+    def __init__(
+        self,
+        file_path: Path,
+        name: str,
+        legacy: Optional[JsonFileStorage] = None,
+    ) -> None:
+        """Подключается к общей базе состояний процесса.
+
+        Args:
+            file_path: путь к файлу SQLite
+            name: имя состояния
+            legacy: прежнее хранилище для переноса состояния в базу
+        """
+        self.file_path = file_path
+        self._name = name
+        self._legacy = legacy
+        self._db = open_state_database(file_path)
+
+    def __repr__(self):  # noqa: CCE001
+        return '{0}: <{1}:{2}>'.format(
+            self.__class__.__name__,
+            self.file_path,
+            self._name,
+        )
+
+    __str__ = __repr__
+
+    def save_state(self, state: Dict[str, Any]) -> None:
+        """Заменяет состояние в базе целиком.
+
+        Args:
+            state: текущий словарь состояния
+        """
+        with self._db.lock:
+            with self._db.connection:
+                self._db.connection.execute(DELETE_STATE_QUERY, (self._name,))
+                self._db.connection.executemany(
+                    UPSERT_STATE_KEY_QUERY,
+                    self._rows(state, state.keys()),
+                )
+
+    def save_keys(self, state: Dict[str, Any], keys: Iterable[str]) -> None:
+        """Записывает изменённые ключи одной транзакцией.
+
+        Ключи, которых больше нет в состоянии, удаляются.
+
+        Args:
+            state: текущий словарь состояния
+            keys: ключи, изменённые с последнего сохранения
+        """
+        keys = list(keys)
+        with self._db.lock:
+            with self._db.connection:
+                self._db.connection.executemany(
+                    DELETE_STATE_KEY_QUERY,
+                    [(self._name, key) for key in keys if key not in state],
+                )
+                self._db.connection.executemany(
+                    UPSERT_STATE_KEY_QUERY,
+                    self._rows(state, (key for key in keys if key in state)),
+                )
+
+    def retrieve_state(self) -> Dict[str, Any]:
+        """Читает ключи состояния из базы.
+
+        Состояние, которого ещё нет в базе, переносится из прежнего
+        хранилища один раз: после переноса его файл переименовывается.
+
+        Returns:
+            текущее сохранённое состояние (пустой словарь, если его нет)
+        """
+        with self._db.lock:
+            rows = self._db.connection.execute(
+                SELECT_STATE_QUERY,
+                (self._name,),
+            )
+            state = {key: json.loads(value) for key, value in rows}
+        if not state and self._legacy is not None:
+            state = self._legacy.retrieve_state()
+            if state:
+                self.save_state(state)
+                self._legacy.mark_migrated()
+        return state
+
+    def _rows(self, state: Dict[str, Any], keys: Iterable[str]) -> list:
+        """Формирует строки таблицы для ключей состояния.
+
+        Args:
+            state: текущий словарь состояния
+            keys: сохраняемые ключи
+
+        Returns:
+            строки имя состояния - ключ - значение в JSON
+        """
+        return [(self._name, key, json.dumps(state[key])) for key in keys]
+
+
+def create_storage(name: str) -> BaseStorage:
+    """Создаёт хранилище состояния по настройке state_storage.
+
+    Args:
+        name: имя состояния
+
+    Returns:
+        хранилище в файле JSON или в базе SQLite
+    """
+    json_storage = JsonFileStorage(
+        settings.storage_dir / '{0}.json'.format(name),
+    )
+    if settings.state_storage == 'json':
+        return json_storage
+    return SqliteStorage(
+        settings.storage_dir / settings.state_db_file,
+        name,
+        legacy=json_storage,
+    )
+
+
+class State(collections.UserDict):  # noqa: WPS214
     """Класс для работы с состояниями.
 
     Так как функционал практически совпадает со словарём, класс
     максимально приближен к словарю через наследование.
+
+    Изменённые ключи накапливаются и сохраняются в хранилище на контрольных
+    точках: вне транзакции каждое присваивание является отдельной
+    транзакцией, внутри transaction() все присваивания фиксируются вместе.
+    Запись в хранилище выполняется раз в flush_every зафиксированных
+    транзакций или явным вызовом checkpoint().
     """
 
     def __init__(
         self,
         name: str,
         storage: Optional[BaseStorage] = None,
+        flush_every: Optional[int] = None,
     ) -> None:
         """Задаёт параметры для json storage и инициализирует данные из файла.
 
         Args:
             name: имя хранилища
             storage: хранилище данных типа Storage.
+            flush_every: через сколько транзакций сохранять состояние
         """
         super().__init__()
         self.name = name
-        if not storage:
-            storage = JsonFileStorage(
-                settings.storage_dir / '{0}.json'.format(name),
-            )
-        self.storage = storage
+        self.storage = storage or create_storage(name)
         self.data: dict = self.storage.retrieve_state()  # noqa: WPS110
+        self._flush_every = flush_every or settings.state_flush_every
+        self._dirty_keys: set[str] = set()
+        self._undo: dict[str, Any] = {}
+        self._transaction_depth = 0
+        self._pending_commits = 0
+        self._lock = threading.RLock()
         logger.debug(
             'Инициализирован класс состояний: {0}, ключей: {1}'.format(
                 self,
@@ -126,8 +364,13 @@ class State(collections.UserDict):
             key: имя ключа
             value: значение для ключа.
         """
-        self.data[key] = value
-        self.storage.save_state(self.data)
+        with self._lock:
+            if self._transaction_depth and key not in self._undo:
+                self._undo[key] = self.data.get(key, _MISSING)
+            self.data[key] = value
+            self._dirty_keys.add(key)
+            if not self._transaction_depth:
+                self._commit()
 
     def get_state(self, key: str) -> Any:
         """Получить состояние по определённому ключу.
@@ -139,3 +382,61 @@ class State(collections.UserDict):
             значение, отвечающее ключу.
         """
         return self.data.get(key, None)
+
+    @contextmanager
+    def transaction(self) -> Iterator['State']:
+        """Объединяет присваивания в одну транзакцию.
+
+        При выходе из внешнего блока изменения фиксируются, при исключении -
+        откатываются к значениям на момент начала транзакции. На время
+        транзакции состояние блокируется для других потоков.
+
+        Yields:
+            текущий объект состояния
+        """
+        with self._lock:
+            self._transaction_depth += 1
+            is_committed = False
+            try:  # noqa: WPS229, WPS501
+                yield self
+                is_committed = True
+            finally:
+                self._transaction_depth -= 1
+                if not self._transaction_depth:
+                    self._finish_transaction(is_committed)
+
+    def checkpoint(self) -> None:
+        """Сохраняет накопленные изменения в хранилище."""
+        with self._lock:
+            self._pending_commits = 0
+            if not self._dirty_keys:
+                return
+            self.storage.save_keys(self.data, self._dirty_keys)
+            self._dirty_keys.clear()
+
+    def _commit(self) -> None:
+        """Фиксирует транзакцию и сохраняет состояние раз в flush_every."""
+        self._pending_commits += 1
+        if self._pending_commits >= self._flush_every:
+            self.checkpoint()
+
+    def _finish_transaction(self, is_committed: bool) -> None:
+        """Фиксирует или откатывает завершённую внешнюю транзакцию.
+
+        Args:
+            is_committed: транзакция завершилась без исключений
+        """
+        if is_committed:
+            self._undo = {}
+            self._commit()
+        else:
+            self._rollback()
+
+    def _rollback(self) -> None:
+        """Возвращает ключи незавершённой транзакции к прежним значениям."""
+        for key, old_value in self._undo.items():
+            if old_value is _MISSING:
+                self.data.pop(key, None)
+            else:
+                self.data[key] = old_value
+        self._undo = {}
@@ -1,6 +1,7 @@
 """Основные настройки проекта ETL."""
 
 from pathlib import Path
+from typing import Literal
 
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -27,16 +28,107 @@ class Settings(BaseSettings):
 
     initial_timestamp: float
     storage_subdir: str
+    # json - файл на каждое состояние, перезаписываемый целиком, sqlite -
+    # общая база state_db_file, в которую записываются только изменённые ключи
+    state_storage: Literal['json', 'sqlite'] = 'json'
+    state_db_file: str = 'state.sqlite3'
+    # через сколько транзакций сохранять состояние на диск
+    state_flush_every: int = 1
+    # payload - хранить в состоянии данные блоков, cursor - только их границы
+    state_recovery: Literal['payload', 'cursor'] = 'payload'
     chunk_size: int = 100
     request_interval: int  # seconds
+    # sequential - этапы по очереди, threaded - конвейер потоков,
+    # parallel - параллельное чтение каждой таблицы, async - asyncio
+    # с asyncpg и aiohttp
+    runner: Literal['sequential', 'threaded', 'parallel', 'async'] = (
+        'sequential'
+    )
+    # polling - проход раз в request_interval, notify - загрузка изменений
+    # по уведомлениям триггеров и сверочный проход раз в notify_sweep_interval,
+    # replication - загрузка изменений из слота логической репликации
+    change_capture: Literal['polling', 'notify', 'replication'] = 'polling'
+    notify_channel: str = 'etl_changes'
+    notify_install_triggers: bool = True
+    notify_sweep_interval: int = 600  # seconds
+    notify_batch_window: float = 0.1  # seconds
+    replication_slot: str = 'etl_movies'
+    replication_publication: str = 'etl_movies'
+    # размер очередей между этапами и количество потоков этапов конвейера
+    pipeline_queue_size: int = 4
+    pipeline_transform_workers: int = 1
+    pipeline_load_workers: int = 2
+    # потоки обогащения и размер общей очереди id при параллельном чтении
+    parallel_enrich_workers: int = 2
+    parallel_max_pending: int = 1000
+    # процессы сборки документов; 0 или 1 - сборка в процессе этапа
+    transform_processes: int = 0
+    # сколько блоков одновременно обрабатывает асинхронный проход
+    async_concurrency: int = 8
+    # полная переиндексация: процессы, диапазоны id film_work и размер блока
+    reindex_workers: int = 4
+    reindex_partitions: int = 16
+    reindex_chunk_size: int = 1000
 
     elastic_url: str
+    # алиас, через который используется текущая версия индекса
     elastic_index: str
+    # создавать при запуске индекс по схеме из schema и алиас к нему
+    elastic_manage_index: bool = True
+    elastic_schema_file: str = 'movies.json'
+    # пул соединений и таймауты HTTP-сессии elastic, в секундах
+    elastic_pool_size: int = 10
+    elastic_connect_timeout: float = 10
+    elastic_read_timeout: float = 10
+    # сжатие тел bulk-запросов
+    elastic_gzip: bool = False
+    elastic_gzip_level: int = 1
+    # целевой размер bulk-запроса в байтах подбирается между min и max
+    # по времени ответа elastic (bulk_target_latency, в секундах) и 429
+    bulk_initial_bytes: int = 5242880
+    bulk_min_bytes: int = 262144
+    bulk_max_bytes: int = 15728640
+    bulk_max_docs: int = 5000
+    bulk_target_latency: float = 2
+    # повторы документов, отклонённых из-за временных ошибок, в секундах
+    bulk_max_retries: int = 5
+    bulk_retry_start_sleep: float = 0.1
+    bulk_retry_max_sleep: float = 10
+    # файл в директории состояния для документов, не принятых elastic
+    dead_letter_file: str = 'dead_letter.jsonl'
+    # не отправлять документы, содержимое которых не изменилось с последней
+    # загрузки в индекс; хеши хранятся в файле SQLite в директории состояния
+    # и не учитывают изменения индекса в обход ETL, поэтому выключено
+    elastic_skip_unchanged: bool = False
+    hash_store_file: str = 'indexed_hashes.sqlite3'
+    # при изменении персоны обновлять её имя в документах действиями update
+    # со скриптом вместо полной сборки документов её film_work; выключено,
+    # так как меняет основной путь загрузки изменений персон
+    partial_person_updates: bool = False
 
     log_file: str
     log_format: str
+    # адрес и порт HTTP-сервера метрик Prometheus (/metrics), 0 - не запускать
+    metrics_host: str = '127.0.0.1'
+    metrics_port: int = 0
 
     pg_dsn: PostgresSettings
+    # отдавать расширенные данные генератором через серверный курсор
+    pg_stream_rows: bool = False
+    pg_itersize: int = 2000
+    # создавать при запуске индексы (updated_at, id) для чтения изменений;
+    # выключено по умолчанию: ETL не выполняет DDL без явного разрешения
+    pg_create_keyset_indexes: bool = False
+    # вести журнал удалений film_work и связей (таблица и триггеры
+    # создаются при запуске, поэтому выключено по умолчанию) и сколько дней
+    # хранить его записи
+    pg_track_deletes: bool = False
+    pg_tombstone_retention_days: int = 30
+    # join - ряд на каждую пару персона-жанр, aggregated - ряд на фильм,
+    # cached - ряд на фильм с id персон и жанров, имена которых берутся
+    # из LRU-кеша процесса размером dimension_cache_size записей
+    enrichment_engine: Literal['join', 'aggregated', 'cached'] = 'join'
+    dimension_cache_size: int = 50000
 
     base_dir: Path = Path(__file__).resolve().parent
 
@@ -49,5 +141,22 @@ class Settings(BaseSettings):
         """
         return self.base_dir / self.storage_subdir
 
+    @property
+    def keep_payload_in_state(self) -> bool:
+        """Сообщает, сохраняются ли данные блоков в состоянии этапов.
+
+        В потоковом режиме блоки не материализуются, а в конвейере
+        обрабатываются одновременно, поэтому для восстановления в них
+        всегда используются только границы блоков.
+
+        Returns:
+            флаг хранения данных блоков в состоянии
+        """
+        return (
+            self.state_recovery == 'payload'
+            and not self.pg_stream_rows
+            and self.runner == 'sequential'
+        )
+
 
 settings = Settings()
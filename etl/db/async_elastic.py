@@ -0,0 +1,114 @@
+"""Модуль асинхронных запросов к API elastic search через aiohttp."""
+import asyncio
+import gzip
+import json
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+from time import monotonic
+from typing import Any, Optional
+
+import aiohttp
+from common import metrics
+from common.deco import async_backoff
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# ошибки соединения, после которых запрос стоит повторить
+CONNECTION_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+@dataclass(frozen=True)
+class BulkAnswer:
+    """Ответ elastic на bulk-запрос с интерфейсом ответа requests.
+
+    Позволяет разбирать ответ тем же loader.failures.collect_failures.
+    """
+
+    status_code: int
+    text: str
+    elapsed: timedelta
+
+    def __str__(self):
+        return '<Response [{0}]>'.format(self.status_code)
+
+    def json(self) -> Any:
+        """Разбирает тело ответа.
+
+        Returns:
+            тело ответа в виде JSON
+        """
+        return json.loads(self.text)
+
+
+class AsyncElasticClient:
+    """Выполняет bulk-запросы к API Elastic Search.
+
+    Все запросы идут через одну сессию с пулом не больше
+    settings.elastic_pool_size соединений, поэтому одновременных
+    запросов не больше размера пула.
+    """
+
+    def __init__(self, url: str, compress: Optional[bool] = None):
+        """Задаёт базовые параметры подключения к API.
+
+        Args:
+            url: базовый url elastic search API
+            compress: сжимать тела запросов gzip, по умолчанию - из настроек
+        """
+        self._url = url
+        self._headers = {'Content-Type': 'application/json'}
+        if compress is None:
+            compress = settings.elastic_gzip
+        if compress:
+            self._headers['Content-Encoding'] = 'gzip'
+        self._compress = compress
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def connect(self):
+        """Открывает HTTP-сессию с пулом соединений."""
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=settings.elastic_pool_size),
+            timeout=aiohttp.ClientTimeout(
+                sock_connect=settings.elastic_connect_timeout,
+                sock_read=settings.elastic_read_timeout,
+            ),
+        )
+
+    async def close(self):
+        """Закрывает HTTP-сессию."""
+        if self._session:
+            await self._session.close()
+
+    @async_backoff(exceptions=CONNECTION_ERRORS, logger_func=logger.warning)
+    async def post_bulk(self, data_string: bytes) -> BulkAnswer:
+        """Отправляет набор данных в elastic search.
+
+        Args:
+            data_string: данные в формате NDJSON в UTF-8
+
+        Returns:
+            ответ elastic
+        """
+        body = data_string
+        if self._compress:
+            body = gzip.compress(
+                body,
+                compresslevel=settings.elastic_gzip_level,
+            )
+        started_at = monotonic()
+        async with self._session.post(
+            '{0}/_bulk/'.format(self._url),
+            data=body,
+            headers=self._headers,
+        ) as response:
+            answer = BulkAnswer(
+                response.status,
+                await response.text(),
+                timedelta(seconds=monotonic() - started_at),
+            )
+        metrics.bulk_seconds.observe(answer.elapsed.total_seconds())
+        metrics.bulk_requests.inc(str(answer.status_code))
+        metrics.bulk_bytes.inc(amount=len(body))
+        return answer
@@ -0,0 +1,345 @@
+"""Модуль асинхронных запросов к БД Postgres через asyncpg.
+
+Используются те же шаблоны запросов, что и в db.postgres: имена таблиц
+и колонок подставляются в текст, значения передаются параметрами $1,
+$2, ... asyncpg готовит выражения и кеширует их в каждом подключении
+пула, поэтому повторные запросы не планируются заново.
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Any, Optional
+
+import asyncpg
+from common import metrics
+from common.deco import async_backoff
+from config import settings
+from db import queries
+from db.dimensions import dimension_cache, resolve_links
+from db.postgres import MIN_ID, PostgresQueryWrapper, missing_film_works
+
+logger = logging.getLogger(__name__)
+
+# ошибки подключения, после которых запрос стоит повторить
+CONNECTION_ERRORS = (
+    OSError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+)
+
+
+def quote_identifier(name: str) -> str:
+    """Экранирует имя таблицы или колонки.
+
+    Args:
+        name: имя
+
+    Returns:
+        имя в двойных кавычках
+    """
+    return '"{0}"'.format(name.replace('"', '""'))
+
+
+async def init_connection(connection: asyncpg.Connection):
+    """Настраивает типы подключения как у psycopg2.
+
+    uuid возвращаются строками, json - разобранными объектами.
+
+    Args:
+        connection: новое подключение пула
+    """
+    await connection.set_type_codec(
+        'uuid',
+        schema='pg_catalog',
+        encoder=str,
+        decoder=str,
+        format='text',
+    )
+    await connection.set_type_codec(
+        'json',
+        schema='pg_catalog',
+        encoder=json.dumps,
+        decoder=json.loads,
+        format='text',
+    )
+
+
+class AsyncPostgresQueryWrapper:  # noqa: WPS214
+    """Передаёт предоформленные запросы к БД Postgres через пул asyncpg.
+
+    Запросы разных корутин выполняются одновременно на разных
+    подключениях пула.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int,
+        pool_size: int,
+        enrichment_engine: Optional[str] = None,
+    ):
+        """Задаёт параметры запросов и пула подключений.
+
+        Args:
+            chunk_size: размер блока данных для получения из БД
+            pool_size: максимальное количество подключений
+            enrichment_engine: движок расширенных данных
+        """
+        self._chunk_size = chunk_size
+        self._pool_size = pool_size
+        self._enrichment_engine = (
+            enrichment_engine or settings.enrichment_engine
+        )
+        self._pool: Optional[asyncpg.Pool] = None
+
+    @async_backoff(exceptions=CONNECTION_ERRORS, logger_func=logger.warning)
+    async def connect(self):
+        """Открывает пул подключений."""
+        dsn = settings.pg_dsn
+        self._pool = await asyncpg.create_pool(
+            database=dsn.dbname,
+            user=dsn.user,
+            password=dsn.password,
+            host=dsn.host,
+            port=dsn.port,
+            min_size=1,
+            max_size=self._pool_size,
+            init=init_connection,
+        )
+
+    async def close(self):
+        """Закрывает пул подключений."""
+        if self._pool:
+            await self._pool.close()
+
+    async def get_last_position(self, table: str, cross=False):
+        """Получает позицию последней модификации данных в таблице.
+
+        Args:
+            table: название таблицы
+            cross: является ли таблица кросс-таблицей
+
+        Returns:
+            Ряд updated_at, id последней изменённой записи или None, если
+            таблица пуста.
+        """
+        last_rows = await self.fetch(
+            queries.LAST_POSITION_QUERY.format(
+                table=quote_identifier(table),
+                time_field=quote_identifier(self._time_field(cross)),
+            ),
+        )
+        return last_rows[0] if last_rows else None
+
+    async def get_ids_after_time(
+        self,
+        table: str,
+        last_modified: datetime,
+        last_id: str,
+        cross=False,
+    ) -> list:
+        """Загружает id для обновленных записей в таблице.
+
+        Args:
+            table: название таблицы
+            last_modified: время обновления последней прочитанной записи
+            last_id: id последней прочитанной записи
+            cross: таблица является кросс-таблицей
+
+        Returns:
+            Ряды id, row_id, updated_at; для кросс-таблиц id - это
+            film_work_id, а row_id - id ряда.
+        """
+        if cross:
+            updated_ids_query = queries.UPDATED_CROSS_IDS_QUERY
+        else:
+            updated_ids_query = queries.UPDATED_IDS_QUERY
+        return await self.fetch(
+            updated_ids_query.format(
+                table=quote_identifier(table),
+                modified='$1',
+                last_id='$2',
+                chunk_size=int(self._chunk_size),
+            ),
+            last_modified,
+            last_id,
+        )
+
+    async def get_related_film_work_ids(
+        self,
+        table: str,
+        ids: list,
+    ) -> list[str]:
+        """Загружает id всех film_work, связанных с записями таблицы.
+
+        Args:
+            table: название вторичной таблицы
+            ids: набор id вторичной таблицы
+
+        Returns:
+            id film_work без повторов по возрастанию
+        """
+        query = queries.RELATED_FILM_WORK_QUERY.format(
+            cross_table=quote_identifier('{0}_film_work'.format(table)),
+            cross_id=quote_identifier('{0}_id'.format(table)),
+            chunk_size=int(self._chunk_size),
+        )
+        film_work_ids = []
+        page = await self.fetch(query, list(ids), MIN_ID)
+        while page:
+            film_work_ids.extend(row['id'] for row in page)
+            page = await self.fetch(query, list(ids), film_work_ids[-1])
+        return film_work_ids
+
+    async def get_person_roles(self, ids: list) -> list[dict[str, Any]]:
+        """Загружает связи персон с film_work вместе с именами персон.
+
+        Args:
+            ids: набор id персон
+
+        Returns:
+            ряды fw_id, p_id, p_full_name и p_role по возрастанию fw_id
+        """
+        query = queries.PERSON_ROLES_QUERY.format(
+            chunk_size=int(self._chunk_size),
+        )
+        roles = []
+        page = await self.fetch(query, list(ids), MIN_ID, MIN_ID)
+        while page:
+            roles.extend(dict(row) for row in page)
+            page = await self.fetch(
+                query,
+                list(ids),
+                page[-1]['fw_id'],
+                page[-1]['pfw_id'],
+            )
+        return roles
+
+    async def get_enriched_rows(self, fw_ids: list) -> list[dict[str, Any]]:
+        """Загружает расширенный набор данных для film_work.
+
+        Args:
+            fw_ids: набор id film_work для загрузки данных
+
+        Returns:
+            ряды данных в формате выбранного движка и ряды удаления для
+            film_work, которых нет в БД
+        """
+        enriched_rows = await self.fetch(
+            PostgresQueryWrapper.enrichment_queries[
+                self._enrichment_engine
+            ].format(ids='$1'),
+            [str(fw_id) for fw_id in fw_ids],
+        )
+        rows = [dict(row) for row in enriched_rows]
+        if self._enrichment_engine == 'cached':
+            rows = await self._resolve_names(rows)
+        deleted_rows = missing_film_works(
+            [str(fw_id) for fw_id in fw_ids],
+            {row['fw_id'] for row in rows},
+        )
+        return rows + [
+            deleted._asdict()  # noqa: WPS437
+            for deleted in deleted_rows
+        ]
+
+    async def get_dimension_names(
+        self,
+        table: str,
+        ids: list,
+    ) -> dict[str, str]:
+        """Загружает имена персон или жанров.
+
+        Args:
+            table: таблица записей, person или genre
+            ids: id записей
+
+        Returns:
+            имена по id
+        """
+        name_rows = await self.fetch(
+            queries.DIMENSION_NAMES_QUERY.format(
+                table=quote_identifier(table),
+                name_column=quote_identifier(
+                    PostgresQueryWrapper.name_columns[table],
+                ),
+            ),
+            list(ids),
+        )
+        return {row['id']: row['name'] for row in name_rows}
+
+    @async_backoff(exceptions=CONNECTION_ERRORS, logger_func=logger.warning)
+    async def fetch(self, query: str, *params: Any) -> list:
+        """Выполняет запрос на свободном подключении пула.
+
+        Args:
+            query: текст запроса с параметрами $1, $2, ...
+            params: значения параметров
+
+        Returns:
+            ряды ответа
+        """
+        with metrics.pg_query_seconds.time('async'):
+            async with self._pool.acquire() as connection:
+                rows = await connection.fetch(query, *params)
+        metrics.pg_rows.inc('async', amount=len(rows))
+        return rows
+
+    async def _names(self, table: str, ids: set) -> dict[str, str]:
+        """Возвращает имена записей из кеша, загружая отсутствующие.
+
+        Args:
+            table: таблица записей, person или genre
+            ids: id записей
+
+        Returns:
+            имена по id
+        """
+        names, missing, generation = dimension_cache.lookup(table, ids)
+        if missing:
+            loaded = await self.get_dimension_names(table, missing)
+            names.update(loaded)
+            dimension_cache.store(table, loaded, generation)
+        return names
+
+    async def _resolve_names(self, rows: list[dict]) -> list[dict]:
+        """Подставляет в ряды движка cached имена персон и жанров.
+
+        Args:
+            rows: ряды film_work с id персон (и их ролями) и id жанров
+
+        Returns:
+            ряды в формате движка aggregated
+        """
+        person_names = await self._names(
+            'person',
+            {person['id'] for row in rows for person in row['persons']},
+        )
+        genre_names = await self._names(
+            'genre',
+            {genre_id for row in rows for genre_id in row['genres']},
+        )
+        return [
+            dict(
+                row,
+                **resolve_links(
+                    row['persons'],
+                    row['genres'],
+                    person_names,
+                    genre_names,
+                ),
+            )
+            for row in rows
+        ]
+
+    def _time_field(self, cross: bool) -> str:
+        """Возвращает колонку времени изменения записей таблицы.
+
+        Args:
+            cross: является ли таблица кросс-таблицей
+
+        Returns:
+            created_at для кросс-таблиц, иначе updated_at
+        """
+        if cross:
+            return 'created_at'
+        return 'updated_at'
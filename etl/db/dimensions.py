@@ -0,0 +1,145 @@
+"""Кеш имён персон и жанров для движка расширенных данных cached.
+
+Одни и те же популярные персоны и жанры входят в тысячи фильмов, поэтому
+их имена хранятся в ограниченном LRU-кеше процесса, а из Postgres
+запрашиваются только отсутствующие в нём, одним запросом на таблицу.
+Записи сбрасываются, когда экстрактор получает изменения person и genre.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Iterable
+
+from config import settings
+
+# загрузка имён записей таблицы по их id
+NamesLoader = Callable[[str, list], dict]
+
+
+class DimensionCache:
+    """Ограниченный LRU-кеш имён записей по таблице и id.
+
+    Кеш общий для потоков процесса. Имена, запрошенные до сброса
+    записей таблицы, после сброса в кеш не попадают: иначе загрузка,
+    начатая до изменения, могла бы вернуть в кеш прежнее имя.
+    """
+
+    def __init__(self, max_size: int):
+        """Создаёт пустой кеш.
+
+        Args:
+            max_size: максимальное количество записей
+        """
+        self._max_size = max_size
+        self._names: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._generations: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get_many(
+        self,
+        table: str,
+        ids: Iterable[str],
+        load: NamesLoader,
+    ) -> dict[str, str]:
+        """Возвращает имена записей, загружая отсутствующие в кеше.
+
+        Args:
+            table: таблица записей, person или genre
+            ids: id записей
+            load: загрузка имён из БД по таблице и списку id
+
+        Returns:
+            имена по id; удалённых записей в ответе нет
+        """
+        names, missing, generation = self.lookup(table, set(ids))
+        if missing:
+            loaded = load(table, missing)
+            names.update(loaded)
+            self.store(table, loaded, generation)
+        return names
+
+    def invalidate(self, table: str, ids: Iterable[str]):
+        """Сбрасывает записи, изменённые в БД.
+
+        Args:
+            table: таблица записей
+            ids: id изменённых записей
+        """
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            for record_id in ids:
+                self._names.pop((table, str(record_id)), None)
+
+    def lookup(self, table: str, ids: set[str]) -> tuple[dict, list, int]:
+        """Ищет имена в кеше.
+
+        Args:
+            table: таблица записей
+            ids: id записей
+
+        Returns:
+            найденные имена по id, id отсутствующих записей и номер
+            сброса таблицы на момент поиска
+        """
+        names = {}
+        missing = []
+        with self._lock:
+            for record_id in ids:
+                name = self._names.get((table, record_id))
+                if name is None:
+                    missing.append(record_id)
+                else:
+                    self._names.move_to_end((table, record_id))
+                    names[record_id] = name
+            return names, missing, self._generations.get(table, 0)
+
+    def store(self, table: str, names: dict[str, str], generation: int):
+        """Сохраняет загруженные имена и вытесняет давно не используемые.
+
+        Args:
+            table: таблица записей
+            names: имена по id
+            generation: номер сброса таблицы на момент начала загрузки
+        """
+        with self._lock:
+            if self._generations.get(table, 0) != generation:
+                return
+            for record_id, name in names.items():
+                self._names[(table, record_id)] = name
+            while len(self._names) > self._max_size:
+                self._names.popitem(last=False)
+
+
+def resolve_links(
+    persons: list[dict],
+    genre_ids: list[str],
+    person_names: dict[str, str],
+    genre_names: dict[str, str],
+) -> dict[str, Any]:
+    """Подставляет имена в связи фильма с персонами и жанрами.
+
+    Связи с записями, которых уже нет в БД, отбрасываются.
+
+    Args:
+        persons: id и роли персон фильма
+        genre_ids: id жанров фильма
+        person_names: имена персон по id
+        genre_names: названия жанров по id
+
+    Returns:
+        поля persons и genres в формате движка aggregated
+    """
+    return {
+        'persons': [
+            dict(person, name=person_names[person['id']])
+            for person in persons
+            if person['id'] in person_names
+        ],
+        'genres': [
+            genre_names[genre_id]
+            for genre_id in genre_ids
+            if genre_id in genre_names
+        ],
+    }
+
+
+dimension_cache = DimensionCache(settings.dimension_cache_size)
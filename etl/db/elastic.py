@@ -1,44 +1,169 @@
 """Модуль, отвечающий за общение с API elastic search."""
+import gzip
 import logging
+from functools import lru_cache
+from http import HTTPStatus
+from typing import Any, Optional, Union
 
+from common import metrics
 from common.deco import backoff
+from config import settings
+from requests import Session
 from requests import exceptions as exc
-from requests import post
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
 
+class TemporaryHTTPError(exc.HTTPError):
+    """Elastic временно не может выполнить запрос: 429 или 5xx."""
+
+
+# ошибки, после которых запрос к elastic имеет смысл повторить; остальные
+# ответы 4xx при повторе не изменятся
+RETRYABLE_ERRORS = (TemporaryHTTPError, exc.Timeout, exc.ConnectionError)
+
+
+def is_temporary_status(status: int) -> bool:
+    """Проверяет, временная ли ошибка в ответе elastic.
+
+    Args:
+        status: код ответа
+
+    Returns:
+        флаг перегрузки или недоступности elastic
+    """
+    return (
+        status == HTTPStatus.TOO_MANY_REQUESTS
+        or status >= HTTPStatus.INTERNAL_SERVER_ERROR
+    )
+
+
+@lru_cache(maxsize=None)
+def get_session(pool_size: int) -> Session:
+    """Возвращает общую для процесса HTTP-сессию с пулом соединений.
+
+    Соединения переиспользуются между запросами и проходами ETL
+    (keep-alive), поэтому bulk-запросы не открывают новое TCP-соединение.
+
+    Args:
+        pool_size: максимальное количество соединений с одним хостом
+
+    Returns:
+        HTTP-сессия requests
+    """
+    session = Session()
+    adapter = HTTPAdapter(pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
 class ElasticClient:
     """Выполняет запросы к API Elastic Search."""
 
-    def __init__(self, url: str, index_name: str):
+    def __init__(
+        self,
+        url: str,
+        index_name: str,
+        compress: Optional[bool] = None,
+    ):
         """Задаёт базовые параметры подключения к API.
 
         Args:
             url: базовый url elastic search API
             index_name: наименование индекса
+            compress: сжимать тела запросов gzip, по умолчанию - из настроек
         """
         self._url = url
         self._index_name = index_name
         self._headers = {'Content-Type': 'application/json'}
+        if compress is None:
+            compress = settings.elastic_gzip
+        if compress:
+            self._headers['Content-Encoding'] = 'gzip'
+        self._compress = compress
+        self._session = get_session(settings.elastic_pool_size)
+        self._timeout = (
+            settings.elastic_connect_timeout,
+            settings.elastic_read_timeout,
+        )
 
     @backoff(
-        exceptions=(exc.HTTPError, exc.Timeout, exc.ConnectionError),
+        exceptions=(exc.Timeout, exc.ConnectionError),
         logger_func=logger.warning,
     )
-    def post_bulk(self, data_string: str):
+    def post_bulk(self, data_string: Union[str, bytes]):
         """Отправляет набор данных в индекс elastic search.
 
         Args:
-            data_string: строка с данными в специальном формате
+            data_string: данные в формате NDJSON, строкой или в UTF-8
 
         Returns:
             Результат обработки запроса (HTTP Response)
         """
         bulk_url = '{0}/_bulk/'.format(self._url)
-        return post(
-            bulk_url,
-            headers=self._headers,
-            data=data_string,
-            timeout=10,
+        body = self._encode_body(data_string)
+        with metrics.bulk_seconds.time():
+            answer = self._session.post(
+                bulk_url,
+                headers=self._headers,
+                data=body,
+                timeout=self._timeout,
+            )
+        metrics.bulk_requests.inc(str(answer.status_code))
+        metrics.bulk_bytes.inc(amount=len(body))
+        return answer
+
+    @backoff(exceptions=RETRYABLE_ERRORS, logger_func=logger.warning)
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[dict] = None,
+    ) -> Optional[Any]:
+        """Выполняет запрос к API управления индексами.
+
+        Args:
+            method: HTTP-метод
+            path: путь относительно базового url
+            body: тело запроса
+
+        Returns:
+            ответ в виде JSON или None, если объект не найден
+
+        Raises:
+            TemporaryHTTPError: elastic перегружен или недоступен, запрос
+                будет повторён
+        """
+        answer = self._session.request(
+            method,
+            '{0}/{1}'.format(self._url, path),
+            json=body,
+            timeout=self._timeout,
         )
+        if answer.status_code == HTTPStatus.NOT_FOUND:
+            return None
+        if is_temporary_status(answer.status_code):
+            raise TemporaryHTTPError(
+                '{0} {1}'.format(answer.status_code, answer.reason),
+                response=answer,
+            )
+        answer.raise_for_status()
+        return answer.json()
+
+    def _encode_body(self, data_string: Union[str, bytes]) -> bytes:
+        """Кодирует тело запроса, при необходимости сжимая его.
+
+        Args:
+            data_string: данные в формате NDJSON, строкой или в UTF-8
+
+        Returns:
+            байты тела запроса
+        """
+        body = data_string
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        if not self._compress:
+            return body
+        return gzip.compress(body, compresslevel=settings.elastic_gzip_level)
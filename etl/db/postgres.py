@@ -1,24 +1,52 @@
 """Модуль, работающий с БД Postgres."""
+import hashlib
 import logging
 from collections import namedtuple
 from datetime import datetime
-from typing import Any
+from itertools import count
+from typing import Any, Iterator, Optional
 
+from common import metrics
 from common.deco import backoff
 from config import settings
-from db import queries
+from db import dimensions, queries
 from psycopg2 import InterfaceError, OperationalError, connect, sql
 from psycopg2.extras import NamedTupleCursor
 
 logger = logging.getLogger(__name__)
 
+# id, меньший любого uuid, для чтения с начала
+MIN_ID = '00000000-0000-0000-0000-000000000000'
+# ряд film_work, которого нет в БД: его документ удаляется из индекса
+DeletedFilmWork = namedtuple(
+    'DeletedFilmWork',
+    ['fw_id', 'fw_deleted'],
+    defaults=[True],
+)
 
-class PostgresClient:
+
+def missing_film_works(fw_ids: list[str], found: set) -> list[namedtuple]:
+    """Возвращает ряды удаления для film_work, которых нет в выборке.
+
+    Args:
+        fw_ids: запрошенные id film_work
+        found: id film_work, для которых есть ряды расширенных данных
+
+    Returns:
+        ряды DeletedFilmWork
+    """
+    return [DeletedFilmWork(fw_id) for fw_id in fw_ids if fw_id not in found]
+
+
+class PostgresClient:  # noqa: WPS214
     """Выполняет запросы к БД Postgres и возвращает данные."""
 
     def __init__(self):
         """Инициализирует подключение к БД и размер блока данных."""
         self._connection = None
+        self._cursor_counter = count()
+        # запросы EXECUTE подготовленных в текущем подключении выражений
+        self._statements: dict[str, sql.Composed] = {}
 
     @property
     def connection(self):
@@ -34,11 +62,23 @@ class PostgresClient:
                 **settings.pg_dsn.dict(),
                 cursor_factory=NamedTupleCursor,
             )
+            self._statements = {}
         return self._connection
 
     def close(self):
-        """Закрывает подключение к Postgres."""
-        self._connection.close()
+        """Закрывает подключение к Postgres, если оно было открыто."""
+        if self._connection:
+            self._connection.close()
+
+    def end_transaction(self):
+        """Завершает открытую запросами на чтение транзакцию.
+
+        Подключение не остаётся в состоянии idle in transaction и не
+        удерживает блокировки таблиц. Подготовленные выражения живут до
+        конца сессии и откатом не удаляются.
+        """
+        if self._connection and not self._connection.closed:
+            self._connection.rollback()
 
     @backoff(
         exceptions=(OperationalError, InterfaceError),
@@ -55,18 +95,142 @@ class PostgresClient:
         Returns:
             набор рядов данных, соответствующих ответу сервера БД.
         """
-        with self.connection.cursor() as cursor:
-            cursor.execute(query)
-            # Ну, в данной реализации не применить fetchmany, так как
-            # данные возвращаются один раз для каждого запроса.
-            # Я понимаю, что последующие запросы в случаях других данных могут
-            # порождать очень много строк, и в целом нужна чуть более сложная
-            # архитектура, но боюсь, что не успею отладить больше генераторов.
-            # Впрочем, буду иметь в виду на будущее.
-            rows = cursor.fetchall()
+        with metrics.pg_query_seconds.time('plain'):
+            with self.connection.cursor() as cursor:
+                cursor.execute(query)
+                # для больших ответов предназначен stream_query_rows
+                rows = cursor.fetchall()
+
+        metrics.pg_rows.inc('plain', amount=len(rows))
+        return rows
+
+    @backoff(
+        exceptions=(OperationalError, InterfaceError),
+        logger_func=logger.warning,
+    )
+    def get_prepared_rows(self, query, params: tuple) -> list[namedtuple]:
+        """Выполняет запрос как подготовленное выражение.
+
+        Выражение подготавливается один раз на подключение, поэтому
+        Postgres не разбирает и не планирует запрос заново при каждом
+        вызове. Параметры передаются отдельно от текста запроса.
+
+        Args:
+            query: готовый sql-запрос с параметрами $1, $2, ...
+            params: значения параметров
+
+        Returns:
+            набор рядов данных, соответствующих ответу сервера БД.
+        """
+        with metrics.pg_query_seconds.time('prepared'):
+            with self.connection.cursor() as cursor:
+                cursor.execute(self._prepare(cursor, query), params)
+                rows = cursor.fetchall()
 
+        metrics.pg_rows.inc('prepared', amount=len(rows))
         return rows
 
+    @backoff(
+        exceptions=(OperationalError, InterfaceError),
+        logger_func=logger.warning,
+    )
+    def execute(self, query):
+        """Выполняет запрос, не возвращающий рядов, и фиксирует его.
+
+        Args:
+            query: готовый sql-запрос.
+        """
+        with self.connection as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query)
+
+    def stream_query_rows(
+        self,
+        query,
+        itersize: int,
+        params: tuple = (),
+    ) -> Iterator[namedtuple]:
+        """Обращается к БД через серверный (именованный) курсор.
+
+        Ряды забираются с сервера блоками по itersize, поэтому занимаемая
+        память зависит от размера блока, а не от размера всего ответа.
+        Повтор при проблемах с соединением возможен только до получения
+        первых рядов.
+
+        Args:
+            query: готовый sql-запрос
+            itersize: количество рядов, получаемых за одно обращение
+            params: значения параметров %s запроса
+
+        Yields:
+            ряды данных, соответствующие ответу сервера БД.
+        """
+        with metrics.pg_query_seconds.time('stream'):
+            cursor = self._open_named_cursor(query, itersize, params)
+        with cursor:
+            yield from cursor
+            metrics.pg_rows.inc('stream', amount=cursor.rownumber)
+
+    @backoff(
+        exceptions=(OperationalError, InterfaceError),
+        logger_func=logger.warning,
+    )
+    def _open_named_cursor(self, query, itersize: int, params: tuple):
+        """Открывает серверный курсор для запроса.
+
+        Args:
+            query: готовый sql-запрос
+            itersize: количество рядов, получаемых за одно обращение
+            params: значения параметров %s запроса
+
+        Returns:
+            именованный курсор с выполненным запросом
+        """
+        cursor = self.connection.cursor(
+            name='etl_stream_{0}'.format(next(self._cursor_counter)),
+        )
+        cursor.itersize = itersize
+        cursor.execute(query, params)
+        return cursor
+
+    def _prepare(self, cursor, query) -> sql.Composed:
+        """Подготавливает выражение запроса, если оно ещё не подготовлено.
+
+        Имя выражения - хеш текста запроса. Типы параметров Postgres
+        выводит при подготовке, они же указываются в EXECUTE, чтобы
+        массивы и строки приводились к нужным типам.
+
+        Args:
+            cursor: курсор текущего подключения
+            query: готовый sql-запрос с параметрами $1, $2, ...
+
+        Returns:
+            запрос EXECUTE с параметрами %s
+        """
+        query_text = query.as_string(cursor)
+        name = 'etl_{0}'.format(
+            hashlib.blake2b(query_text.encode(), digest_size=8).hexdigest(),
+        )
+        if name not in self._statements:
+            cursor.execute(
+                sql.SQL(queries.PREPARE_QUERY).format(
+                    name=sql.Identifier(name),
+                ) + sql.SQL(query_text),
+            )
+            cursor.execute(
+                sql.SQL(queries.PARAMETER_TYPES_QUERY).format(
+                    name=sql.Literal(name),
+                ),
+            )
+            self._statements[name] = sql.SQL(queries.EXECUTE_QUERY).format(
+                name=sql.Identifier(name),
+                params=sql.SQL(', ').join(
+                    sql.Placeholder() + sql.SQL('::{0}'.format(param_type))
+                    for param_type in cursor.fetchone().types
+                ),
+            )
+        return self._statements[name]
+
     def prepare_query(self, pattern: str, **query_params: Any):
         """Подготавливает sql-запрос через метод sql.SQL psycopg2.
 
@@ -82,55 +246,82 @@ class PostgresClient:
         )
 
 
-class PostgresQueryWrapper:
+class PostgresQueryWrapper:  # noqa: WPS214
     """Передаёт предоформленные запросы к БД Postgres."""
 
-    def __init__(self, chunk_size: int):
+    enrichment_queries: dict[str, str] = {
+        'join': queries.ENRICHED_DATA_QUERY,
+        'aggregated': queries.AGGREGATED_DATA_QUERY,
+        'cached': queries.FILM_WORK_LINKS_QUERY,
+    }
+    # колонки имён таблиц, которые движок cached берёт из кеша
+    name_columns: dict[str, str] = {
+        'person': 'full_name',
+        'genre': 'name',
+    }
+
+    def __init__(
+        self,
+        chunk_size: int,
+        enrichment_engine: Optional[str] = None,
+    ):
         """Инициализирует подключение к клиенту Postgres.
 
         Args:
             chunk_size: размер блока данных для получения из БД
+            enrichment_engine: движок расширенных данных (join/aggregated)
         """
         self.client = PostgresClient()
         self._chunk_size = chunk_size
+        self._enrichment_engine = (
+            enrichment_engine or settings.enrichment_engine
+        )
+        self._enrichment_query = self.enrichment_queries[
+            self._enrichment_engine
+        ]
 
-    def get_last_modified_time(self, table: str, cross=False) -> datetime:
-        """Получает время последней модификации данных в таблице.
+    def get_last_position(self, table: str, cross=False):
+        """Получает позицию последней модификации данных в таблице.
 
         Args:
             table: название таблицы
             cross: является ли таблица кросс-таблицей
 
         Returns:
-            время последнего обновления данных.
+            Ряд updated_at, id последней изменённой записи или None, если
+            таблица пуста.
         """
-        if cross:
-            time_field = 'created_at'
-        else:
-            time_field = 'updated_at'
         query = self.client.prepare_query(
-            queries.LAST_MODIFIED_QUERY,
+            queries.LAST_POSITION_QUERY,
             table=sql.Identifier(table),
-            time_field=sql.Identifier(time_field),
+            time_field=sql.Identifier(self._time_field(cross)),
         )
 
-        return self.client.get_query_rows(query)[0].updated_at
+        last_rows = self.client.get_query_rows(query)
+        return last_rows[0] if last_rows else None
 
     def get_ids_after_time(
         self,
         table: str,
         last_modified: datetime,
+        last_id: str,
         cross=False,
     ):
         """Загружает id для обновленных записей в таблице.
 
+        Записи упорядочены по (updated_at, id), поэтому блок начинается
+        строго после последней прочитанной записи, даже если у многих
+        записей одинаковое время обновления.
+
         Args:
             table: название таблицы,
-            last_modified: время последнего обновления данных,
+            last_modified: время обновления последней прочитанной записи,
+            last_id: id последней прочитанной записи,
             cross: таблица является кросс-таблицей
 
         Returns:
-            Ряды table.id, table.updated_at в виде списка именованных кортежей.
+            Ряды id, row_id, updated_at в виде списка именованных кортежей;
+            для кросс-таблиц id - это film_work_id, а row_id - id ряда.
         """
         if cross:
             updated_ids_query = queries.UPDATED_CROSS_IDS_QUERY
@@ -140,42 +331,416 @@ class PostgresQueryWrapper:
             updated_ids_query,
             table=sql.Identifier(table),
             modified=sql.Literal(last_modified),
+            last_id=sql.Literal(last_id),
             chunk_size=sql.Literal(self._chunk_size),
         )
 
         return self.client.get_query_rows(query)
 
-    def get_related_film_work_ids(self, table, ids: list[int]):
-        """Загружает связанные id film_work для обновленных записей.
+    def get_partition_bounds(self, partitions: int) -> list[str]:
+        """Делит film_work на диапазоны id примерно равного размера.
+
+        Args:
+            partitions: количество диапазонов
+
+        Returns:
+            верхние границы диапазонов (включительно) по возрастанию
+        """
+        query = self.client.prepare_query(
+            queries.PARTITION_BOUNDS_QUERY,
+            partitions=sql.Literal(partitions),
+        )
+        return [str(row.id) for row in self.client.get_query_rows(query)]
+
+    def get_film_work_count(self) -> int:
+        """Считает записи film_work.
+
+        Returns:
+            количество film_work
+        """
+        count_rows = self.client.get_query_rows(
+            self.client.prepare_query(queries.FILM_WORK_COUNT_QUERY),
+        )
+        return count_rows[0].count
+
+    def get_missing_ids(self, fw_ids: list[str]) -> list[str]:
+        """Находит id, которых уже нет в film_work.
+
+        Args:
+            fw_ids: проверяемые id film_work
+
+        Returns:
+            id удалённых film_work
+        """
+        query = self.client.prepare_query(
+            queries.MISSING_FILM_WORK_IDS_QUERY,
+            ids=sql.Literal(fw_ids),
+        )
+        return [str(row.id) for row in self.client.get_query_rows(query)]
+
+    def get_ids_in_range(self, last_id: str, upper_id: str) -> list[str]:
+        """Загружает блок id film_work из диапазона.
+
+        Args:
+            last_id: id, после которого начинается блок
+            upper_id: верхняя граница диапазона (включительно)
+
+        Returns:
+            id film_work по возрастанию, не больше chunk_size
+        """
+        query = self.client.prepare_query(
+            queries.RANGE_IDS_QUERY,
+            last_id=sql.Literal(last_id),
+            upper_id=sql.Literal(upper_id),
+            chunk_size=sql.Literal(self._chunk_size),
+        )
+        return [str(row.id) for row in self.client.get_query_rows(query)]
+
+    def create_keyset_index(self, table: str, cross=False):
+        """Создаёт индекс для постраничного чтения изменений, если его нет.
+
+        Args:
+            table: название таблицы
+            cross: является ли таблица кросс-таблицей
+        """
+        time_field = self._time_field(cross)
+        self.client.execute(
+            self.client.prepare_query(
+                queries.KEYSET_INDEX_QUERY,
+                index=sql.Identifier(
+                    '{0}_{1}_id_etl_idx'.format(table, time_field),
+                ),
+                table=sql.Identifier(table),
+                time_field=sql.Identifier(time_field),
+            ),
+        )
+
+    def get_related_film_work_ids(self, table: str, ids: list) -> list:
+        """Загружает id всех film_work, связанных с записями таблицы.
+
+        id читаются страницами по chunk_size по возрастанию film_work_id:
+        запрос каждой страницы подготовлен заранее, поэтому изменение
+        персоны, снявшейся в тысячах фильмов, доходит до каждого из них,
+        а стоимость планирования не зависит от количества id.
 
         Args:
             table: название вторичной таблицы
-            ids: набор id вторичной таблицы для загрузки данных.
+            ids: набор id вторичной таблицы
 
         Returns:
-            Ряды fw.id, fw.updated_at в виде списка именованных кортежей.
+            id film_work без повторов по возрастанию
         """
         query = self.client.prepare_query(
             queries.RELATED_FILM_WORK_QUERY,
             cross_table=sql.Identifier('{0}_film_work'.format(table)),
             cross_id=sql.Identifier('{0}_id'.format(table)),
-            ids=sql.SQL(', ').join(sql.Literal(id_) for id_ in ids),
+            chunk_size=sql.Literal(self._chunk_size),
         )
+        film_work_ids = []
+        page = self.client.get_prepared_rows(query, (list(ids), MIN_ID))
+        while page:
+            film_work_ids.extend(str(row.id) for row in page)
+            page = self.client.get_prepared_rows(
+                query,
+                (list(ids), film_work_ids[-1]),
+            )
+        return film_work_ids
 
-        return self.client.get_query_rows(query)
+    def get_person_roles(self, ids: list) -> list[dict[str, Any]]:
+        """Загружает связи персон с film_work вместе с именами персон.
+
+        Связи читаются страницами по chunk_size, как и в
+        get_related_film_work_ids.
+
+        Args:
+            ids: набор id персон
+
+        Returns:
+            ряды fw_id, p_id, p_full_name и p_role по возрастанию fw_id
+        """
+        query = self.client.prepare_query(
+            queries.PERSON_ROLES_QUERY,
+            chunk_size=sql.Literal(self._chunk_size),
+        )
+        roles = []
+        params = (list(ids), MIN_ID, MIN_ID)
+        page = self.client.get_prepared_rows(query, params)
+        while page:
+            roles.extend(row._asdict() for row in page)  # noqa: WPS437
+            params = (
+                params[0],
+                str(page[-1].fw_id),
+                str(page[-1].pfw_id),
+            )
+            page = self.client.get_prepared_rows(query, params)
+        return roles
+
+    def install_change_triggers(self, channel: str, id_columns: dict):
+        """Создаёт триггеры, сообщающие об изменениях через NOTIFY.
+
+        Триггеры пересоздаются, поэтому метод можно вызывать при каждом
+        запуске.
+
+        Args:
+            channel: канал уведомлений
+            id_columns: таблицы и колонки, id из которых попадает в сообщение
+        """
+        self.client.execute(
+            self.client.prepare_query(queries.NOTIFY_FUNCTION_QUERY),
+        )
+        for table, id_column in id_columns.items():
+            self.client.execute(
+                self.client.prepare_query(
+                    queries.NOTIFY_TRIGGER_QUERY,
+                    table=sql.Identifier(table),
+                    channel=sql.Literal(channel),
+                    id_column=sql.Literal(id_column),
+                ),
+            )
+
+    def prepare_replication(
+        self,
+        publication: str,
+        slot: str,
+        tables: list[str],
+        cross_tables: list[str],
+    ) -> bool:
+        """Создаёт публикацию таблиц и слот репликации, если их нет.
+
+        Кросс-таблицам включается REPLICA IDENTITY FULL, чтобы удаление
+        ряда передавало film_work_id, а не только первичный ключ.
+
+        Args:
+            publication: название публикации
+            slot: название слота репликации
+            tables: таблицы схемы content для публикации
+            cross_tables: кросс-таблицы среди них
+
+        Returns:
+            флаг, был ли слот создан сейчас
+        """
+        publication_exists = self.client.get_query_rows(
+            self.client.prepare_query(
+                queries.PUBLICATION_EXISTS_QUERY,
+                publication=sql.Literal(publication),
+            ),
+        )
+        if not publication_exists:
+            self.client.execute(
+                self.client.prepare_query(
+                    queries.CREATE_PUBLICATION_QUERY,
+                    publication=sql.Identifier(publication),
+                    tables=sql.SQL(', ').join(
+                        sql.Identifier('content', table) for table in tables
+                    ),
+                ),
+            )
+        for table in cross_tables:
+            self.client.execute(
+                self.client.prepare_query(
+                    queries.REPLICA_IDENTITY_FULL_QUERY,
+                    table=sql.Identifier(table),
+                ),
+            )
+        return self._create_slot(slot)
 
     def get_enriched_rows(self, fw_ids: list[int]):
         """Загружает расширенный набор данных для обновленных записей.
 
+        Движок join возвращает ряд на каждую комбинацию персоны и жанра
+        фильма, движок aggregated - один ряд на film_work с уже собранными
+        в Postgres списками persons и genres. Движок cached читает только
+        film_work и id связанных записей, а имена персон и жанров берёт
+        из кеша процесса, поэтому его ряды всегда отдаются списком.
+        В потоковом режиме (settings.pg_stream_rows) ряды отдаются
+        генератором через серверный курсор. Для film_work, которых нет
+        в БД (удалены), в конце отдаются ряды DeletedFilmWork.
+
         Args:
             fw_ids: набор id film_work для загрузки данных.
 
         Returns:
-            Ряды данных БД в виде списка именованных кортежей.
+            Ряды данных БД в виде списка (или генератора) именованных
+            кортежей.
         """
-        query = self.client.prepare_query(
-            queries.ENRICHED_DATA_QUERY,
-            ids=sql.SQL(', ').join(sql.Literal(f_id) for f_id in fw_ids),
+        params = ([str(fw_id) for fw_id in fw_ids],)
+        is_cached = self._enrichment_engine == 'cached'
+        if settings.pg_stream_rows and not is_cached:
+            return self._stream_with_deleted(
+                self.client.stream_query_rows(
+                    self.client.prepare_query(
+                        self._enrichment_query,
+                        ids=sql.Placeholder(),
+                    ),
+                    settings.pg_itersize,
+                    params,
+                ),
+                params[0],
+            )
+        enriched_rows = self.client.get_prepared_rows(
+            self.client.prepare_query(
+                self._enrichment_query,
+                ids=sql.SQL('$1'),
+            ),
+            params,
+        )
+        if is_cached:
+            enriched_rows = self._resolve_names(enriched_rows)
+        return enriched_rows + missing_film_works(
+            params[0],
+            {str(row.fw_id) for row in enriched_rows},
         )
 
-        return self.client.get_query_rows(query)
+    def get_dimension_names(self, table: str, ids: list) -> dict[str, str]:
+        """Загружает имена персон или жанров.
+
+        Args:
+            table: таблица записей, person или genre
+            ids: id записей
+
+        Returns:
+            имена по id
+        """
+        name_rows = self.client.get_prepared_rows(
+            self.client.prepare_query(
+                queries.DIMENSION_NAMES_QUERY,
+                table=sql.Identifier(table),
+                name_column=sql.Identifier(self.name_columns[table]),
+            ),
+            (list(ids),),
+        )
+        return {str(row.id): row.name for row in name_rows}
+
+    def _resolve_names(self, rows: list[namedtuple]) -> list[namedtuple]:
+        """Подставляет в ряды движка cached имена персон и жанров.
+
+        Args:
+            rows: ряды film_work с id персон (и их ролями) и id жанров
+
+        Returns:
+            ряды в формате движка aggregated
+        """
+        person_names = dimensions.dimension_cache.get_many(
+            'person',
+            (person['id'] for row in rows for person in row.persons),
+            self.get_dimension_names,
+        )
+        genre_names = dimensions.dimension_cache.get_many(
+            'genre',
+            (genre_id for row in rows for genre_id in row.genres),
+            self.get_dimension_names,
+        )
+        return [
+            row._replace(  # noqa: WPS437
+                **dimensions.resolve_links(
+                    row.persons,
+                    row.genres,
+                    person_names,
+                    genre_names,
+                ),
+            )
+            for row in rows
+        ]
+
+    def install_tombstone_triggers(
+        self,
+        primary_table: str,
+        cross_tables: list[str],
+        retention_days: int,
+    ):
+        """Создаёт журнал удалений и триггеры, которые его ведут.
+
+        Удаление film_work и удаление или изменение связи добавляют
+        в журнал id затронутого film_work. Записи старше retention_days
+        удаляются. Триггеры пересоздаются, поэтому метод можно вызывать
+        при каждом запуске.
+
+        Args:
+            primary_table: основная таблица
+            cross_tables: кросс-таблицы
+            retention_days: сколько дней хранить записи журнала
+        """
+        self.client.execute(
+            self.client.prepare_query(queries.TOMBSTONE_TABLE_QUERY),
+        )
+        self.client.execute(
+            self.client.prepare_query(queries.TOMBSTONE_FUNCTION_QUERY),
+        )
+        triggers = [(primary_table, 'DELETE', 'id')]
+        triggers.extend(
+            (table, 'DELETE OR UPDATE', 'film_work_id')
+            for table in cross_tables
+        )
+        for table, events, id_column in triggers:
+            self.client.execute(
+                self.client.prepare_query(
+                    queries.TOMBSTONE_TRIGGER_QUERY,
+                    table=sql.Identifier(table),
+                    events=sql.SQL(events),
+                    id_column=sql.Literal(id_column),
+                ),
+            )
+        self.client.execute(
+            self.client.prepare_query(
+                queries.TOMBSTONE_PRUNE_QUERY,
+                days=sql.Literal(retention_days),
+            ),
+        )
+
+    def _stream_with_deleted(
+        self,
+        enriched_rows: Iterator[namedtuple],
+        fw_ids: list[str],
+    ) -> Iterator[namedtuple]:
+        """Отдаёт ряды генератора и ряды удаления для отсутствующих film_work.
+
+        Args:
+            enriched_rows: ряды серверного курсора
+            fw_ids: запрошенные id film_work
+
+        Yields:
+            ряды расширенных данных, затем ряды DeletedFilmWork
+        """
+        found = set()
+        for row in enriched_rows:
+            found.add(str(row.fw_id))
+            yield row
+        yield from missing_film_works(fw_ids, found)
+
+    def _create_slot(self, slot: str) -> bool:
+        """Создаёт слот логической репликации с плагином pgoutput.
+
+        Args:
+            slot: название слота
+
+        Returns:
+            флаг, был ли слот создан сейчас
+        """
+        slot_exists = self.client.get_query_rows(
+            self.client.prepare_query(
+                queries.SLOT_EXISTS_QUERY,
+                slot=sql.Literal(slot),
+            ),
+        )
+        if slot_exists:
+            return False
+        self.client.execute(
+            self.client.prepare_query(
+                queries.CREATE_SLOT_QUERY,
+                slot=sql.Literal(slot),
+            ),
+        )
+        return True
+
+    def _time_field(self, cross: bool) -> str:
+        """Возвращает колонку времени изменения записей таблицы.
+
+        Args:
+            cross: является ли таблица кросс-таблицей
+
+        Returns:
+            created_at для кросс-таблиц, иначе updated_at
+        """
+        if cross:
+            return 'created_at'
+        return 'updated_at'
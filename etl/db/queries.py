@@ -1,32 +1,73 @@
 """Модуль содержит шаблоны запросов к БД Postgres."""
 
-LAST_MODIFIED_QUERY = """
-    SELECT {time_field} as updated_at
+LAST_POSITION_QUERY = """
+    SELECT {time_field} as updated_at, id
     FROM "content".{table}
-    ORDER BY updated_at DESC
+    ORDER BY {time_field} DESC, id DESC
     LIMIT 1;
 """
 UPDATED_IDS_QUERY = """
-    SELECT id, updated_at
+    SELECT id, id as row_id, updated_at
     FROM "content".{table}
-    WHERE updated_at > {modified}
+    WHERE (updated_at, id) > ({modified}, {last_id}::uuid)
     ORDER BY updated_at, id
     LIMIT {chunk_size};
     """
 UPDATED_CROSS_IDS_QUERY = """
-    SELECT film_work_id as id, created_at as updated_at
+    SELECT film_work_id as id, id as row_id, created_at as updated_at
     FROM "content".{table}
-    WHERE created_at > {modified}
-    ORDER BY updated_at, film_work_id
+    WHERE (created_at, id) > ({modified}, {last_id}::uuid)
+    ORDER BY created_at, row_id
     LIMIT {chunk_size};
     """
+PARTITION_BOUNDS_QUERY = """
+    SELECT DISTINCT ON (partition) id
+    FROM (
+        SELECT id, ntile({partitions}) OVER (ORDER BY id) as partition
+        FROM content.film_work
+    ) partitioned
+    ORDER BY partition, id DESC;
+    """
+FILM_WORK_COUNT_QUERY = """
+    SELECT count(*) as count FROM content.film_work;
+    """
+MISSING_FILM_WORK_IDS_QUERY = """
+    SELECT requested.id
+    FROM unnest({ids}::uuid[]) AS requested(id)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM content.film_work fw WHERE fw.id = requested.id
+    );
+    """
+RANGE_IDS_QUERY = """
+    SELECT id
+    FROM content.film_work
+    WHERE id > {last_id}::uuid AND id <= {upper_id}::uuid
+    ORDER BY id
+    LIMIT {chunk_size};
+    """
+KEYSET_INDEX_QUERY = """
+    CREATE INDEX IF NOT EXISTS {index}
+    ON "content".{table} ({time_field}, id);
+    """
 RELATED_FILM_WORK_QUERY = """
-    SELECT fw.id, fw.updated_at
-    FROM content.film_work fw
-    LEFT JOIN content.{cross_table} cross_fw
-        ON cross_fw.film_work_id = fw.id
-    WHERE cross_fw.{cross_id} in ({ids})
-    ORDER BY fw.updated_at, fw.id
+    SELECT DISTINCT film_work_id as id
+    FROM content.{cross_table}
+    WHERE {cross_id} = ANY($1::uuid[]) AND film_work_id > $2::uuid
+    ORDER BY film_work_id
+    LIMIT {chunk_size};
+    """
+PERSON_ROLES_QUERY = """
+    SELECT
+        pfw.id as pfw_id,
+        pfw.film_work_id as fw_id,
+        pfw.role as p_role,
+        p.id as p_id,
+        p.full_name as p_full_name
+    FROM content.person_film_work pfw
+    JOIN content.person p ON p.id = pfw.person_id
+    WHERE pfw.person_id = ANY($1::uuid[])
+        AND (pfw.film_work_id, pfw.id) > ($2::uuid, $3::uuid)
+    ORDER BY pfw.film_work_id, pfw.id
     LIMIT {chunk_size};
     """
 ENRICHED_DATA_QUERY = """
@@ -48,5 +89,151 @@ ENRICHED_DATA_QUERY = """
     LEFT JOIN content.genre_film_work gfw
         ON gfw.film_work_id = fw.id
     LEFT JOIN content.genre g on g.id = gfw.genre_id
-    WHERE fw.id IN ({ids});
+    WHERE fw.id = ANY({ids}::uuid[]);
+    """
+AGGREGATED_DATA_QUERY = """
+    SELECT
+        fw.id as fw_id,
+        fw.title as fw_title,
+        fw.description as fw_description,
+        fw.rating as fw_rating,
+        fw.type as fw_type,
+        COALESCE(fw_persons.persons, '[]'::json) as persons,
+        COALESCE(fw_genres.genres, '{{}}'::text[]) as genres
+    FROM content.film_work fw
+    LEFT JOIN LATERAL (
+        SELECT json_agg(
+            json_build_object(
+                'id', p.id,
+                'name', p.full_name,
+                'role', pfw.role
+            )
+        ) as persons
+        FROM content.person_film_work pfw
+        JOIN content.person p
+            ON p.id = pfw.person_id
+        WHERE pfw.film_work_id = fw.id
+    ) fw_persons ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT array_agg(DISTINCT g.name)::text[] as genres
+        FROM content.genre_film_work gfw
+        JOIN content.genre g
+            ON g.id = gfw.genre_id
+        WHERE gfw.film_work_id = fw.id
+    ) fw_genres ON TRUE
+    WHERE fw.id = ANY({ids}::uuid[]);
+    """
+FILM_WORK_LINKS_QUERY = """
+    SELECT
+        fw.id as fw_id,
+        fw.title as fw_title,
+        fw.description as fw_description,
+        fw.rating as fw_rating,
+        fw.type as fw_type,
+        COALESCE(fw_persons.persons, '[]'::json) as persons,
+        COALESCE(fw_genres.genres, '{{}}'::text[]) as genres
+    FROM content.film_work fw
+    LEFT JOIN LATERAL (
+        SELECT json_agg(
+            json_build_object('id', pfw.person_id, 'role', pfw.role)
+        ) as persons
+        FROM content.person_film_work pfw
+        WHERE pfw.film_work_id = fw.id
+    ) fw_persons ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT array_agg(DISTINCT gfw.genre_id::text)::text[] as genres
+        FROM content.genre_film_work gfw
+        WHERE gfw.film_work_id = fw.id
+    ) fw_genres ON TRUE
+    WHERE fw.id = ANY({ids}::uuid[]);
+    """
+DIMENSION_NAMES_QUERY = """
+    SELECT id, {name_column} as name
+    FROM content.{table}
+    WHERE id = ANY($1::uuid[]);
+    """
+NOTIFY_FUNCTION_QUERY = """
+    CREATE OR REPLACE FUNCTION content.etl_notify_change()
+    RETURNS trigger AS $$
+    DECLARE
+        changed_row record;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            changed_row := OLD;
+        ELSE
+            changed_row := NEW;
+        END IF;
+        PERFORM pg_notify(
+            TG_ARGV[0],
+            json_build_object(
+                'table', TG_TABLE_NAME,
+                'id', to_jsonb(changed_row) ->> TG_ARGV[1]
+            )::text
+        );
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+NOTIFY_TRIGGER_QUERY = """
+    DROP TRIGGER IF EXISTS etl_notify_change ON content.{table};
+    CREATE TRIGGER etl_notify_change
+        AFTER INSERT OR UPDATE OR DELETE ON content.{table}
+        FOR EACH ROW
+        EXECUTE FUNCTION content.etl_notify_change({channel}, {id_column});
+    """
+LISTEN_QUERY = 'LISTEN {channel};'
+PREPARE_QUERY = 'PREPARE {name} AS '
+PARAMETER_TYPES_QUERY = """
+    SELECT parameter_types::text[] as types
+    FROM pg_prepared_statements
+    WHERE name = {name};
+    """
+EXECUTE_QUERY = 'EXECUTE {name} ({params});'
+PUBLICATION_EXISTS_QUERY = """
+    SELECT 1 FROM pg_publication WHERE pubname = {publication};
+    """
+CREATE_PUBLICATION_QUERY = """
+    CREATE PUBLICATION {publication} FOR TABLE {tables};
+    """
+REPLICA_IDENTITY_FULL_QUERY = """
+    ALTER TABLE content.{table} REPLICA IDENTITY FULL;
+    """
+SLOT_EXISTS_QUERY = """
+    SELECT 1 FROM pg_replication_slots WHERE slot_name = {slot};
+    """
+CREATE_SLOT_QUERY = """
+    SELECT pg_create_logical_replication_slot({slot}, 'pgoutput');
+    """
+TOMBSTONE_TABLE_QUERY = """
+    CREATE TABLE IF NOT EXISTS content.etl_tombstone (
+        id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+        table_name text NOT NULL,
+        film_work_id uuid NOT NULL,
+        created_at timestamp with time zone NOT NULL DEFAULT now()
+    );
+    """
+TOMBSTONE_FUNCTION_QUERY = """
+    CREATE OR REPLACE FUNCTION content.etl_record_tombstone()
+    RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' THEN
+            INSERT INTO content.etl_tombstone (table_name, film_work_id)
+            VALUES (TG_TABLE_NAME, (to_jsonb(NEW) ->> TG_ARGV[0])::uuid);
+        END IF;
+        INSERT INTO content.etl_tombstone (table_name, film_work_id)
+        VALUES (TG_TABLE_NAME, (to_jsonb(OLD) ->> TG_ARGV[0])::uuid);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+TOMBSTONE_TRIGGER_QUERY = """
+    DROP TRIGGER IF EXISTS etl_record_tombstone ON content.{table};
+    CREATE TRIGGER etl_record_tombstone
+        AFTER {events} ON content.{table}
+        FOR EACH ROW
+        EXECUTE FUNCTION content.etl_record_tombstone({id_column});
+    """
+TOMBSTONE_PRUNE_QUERY = """
+    DELETE FROM content.etl_tombstone
+    WHERE created_at < now() - make_interval(days => {days});
     """
@@ -0,0 +1,41 @@
+"""Общий интерфейс источников изменений таблиц content."""
+import abc
+from typing import Optional
+
+
+class ChangeSource(abc.ABC):
+    """Абстрактный источник изменений.
+
+    Сообщает изменённые записи пачками: таблица и id записи (для
+    кросс-таблиц - film_work_id).
+    """
+
+    # интервал сверочных проходов в секундах или None, если источник
+    # не теряет изменений и сверки нужны только по требованию start и wait
+    sweep_interval: Optional[int] = None
+
+    @abc.abstractmethod
+    def start(self) -> bool:
+        """Подключается к источнику.
+
+        Возвращает флаг, нужен ли полный проход перед загрузкой изменений.
+        """
+
+    @abc.abstractmethod
+    def wait(self, timeout: float) -> Optional[list[dict]]:
+        """Ждёт изменений не дольше timeout секунд.
+
+        Возвращает изменённые записи (пустой список, если изменений не
+        было) или None, если изменения могли быть пропущены.
+
+        Args:
+            timeout: максимальное время ожидания, в секундах
+        """
+
+    @abc.abstractmethod
+    def acknowledge(self):
+        """Подтверждает загрузку полученных изменений."""
+
+    @abc.abstractmethod
+    def close(self):
+        """Закрывает подключение к источнику."""
@@ -0,0 +1,41 @@
+"""Модуль описывает границы блока изменений таблицы."""
+from dataclasses import asdict, dataclass
+from typing import Any, Optional
+
+
+@dataclass(frozen=True)
+class ChunkCursor:
+    """Верхняя граница блока изменений таблицы.
+
+    Вместо самих данных блока в состоянии хранится только эта граница:
+    нижней границей служит сохранённая позиция таблицы (last_modified и
+    last_id), поэтому после сбоя блок может быть повторно выгружен тем же
+    запросом. Время хранится строкой ISO 8601 с часовым поясом, чтобы не
+    терять микросекунды при сравнении в Postgres.
+    """
+
+    table: str
+    last_modified: str
+    last_id: str
+
+    @classmethod
+    def from_state(cls, state_value: Optional[dict[str, Any]]):
+        """Восстанавливает границу блока из значения состояния.
+
+        Args:
+            state_value: словарь из состояния или None
+
+        Returns:
+            граница блока или None, если блока в обработке нет
+        """
+        if not state_value:
+            return None
+        return cls(**state_value)
+
+    def to_state(self) -> dict[str, Any]:
+        """Возвращает представление границы блока для состояния.
+
+        Returns:
+            словарь с полями границы блока
+        """
+        return asdict(self)
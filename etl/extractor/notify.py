@@ -0,0 +1,148 @@
+"""Модуль получения уведомлений об изменениях через LISTEN/NOTIFY."""
+import json
+import logging
+import select
+from time import monotonic
+from typing import Optional
+
+from common.deco import backoff
+from config import settings
+from db import queries
+from db.postgres import PostgresQueryWrapper
+from extractor.change_source import ChangeSource
+from extractor.pg_extract import PostgresExtractor
+from psycopg2 import InterfaceError, OperationalError, connect, sql
+
+logger = logging.getLogger(__name__)
+
+
+def id_columns() -> dict[str, str]:
+    """Возвращает колонку id, которую сообщает триггер каждой таблицы.
+
+    Returns:
+        колонки по таблицам: film_work_id для кросс-таблиц, иначе id
+    """
+    return {
+        table: 'film_work_id' if table_role == 'cross' else 'id'
+        for table, table_role in PostgresExtractor.watched_tables.items()
+    }
+
+
+class ChangeListener(ChangeSource):  # noqa: WPS214
+    """Слушает канал уведомлений триггеров таблиц content.
+
+    Использует отдельное подключение в режиме autocommit: пока
+    уведомлений нет, ожидание не создаёт нагрузки на БД. Уведомления,
+    отправленные без подписчиков, теряются, поэтому нужны сверки.
+    """
+
+    sweep_interval = settings.notify_sweep_interval
+
+    def __init__(self):
+        """Задаёт канал уведомлений из настроек."""
+        self._channel = settings.notify_channel
+        self._connection = None
+
+    def start(self) -> bool:
+        """Создаёт триггеры, если нужно, и подписывается на канал.
+
+        Returns:
+            флаг, нужен ли полный проход - всегда, так как изменения до
+            подписки не были получены
+        """
+        if settings.notify_install_triggers:
+            db = PostgresQueryWrapper(settings.chunk_size)
+            db.install_change_triggers(self._channel, id_columns())
+            db.client.close()
+        self.listen()
+        return True
+
+    @backoff(
+        exceptions=(OperationalError, InterfaceError),
+        logger_func=logger.warning,
+    )
+    def listen(self):
+        """Открывает подключение и подписывается на канал."""
+        self._connection = connect(**settings.pg_dsn.dict())
+        self._connection.autocommit = True
+        with self._connection.cursor() as cursor:
+            cursor.execute(
+                sql.SQL(queries.LISTEN_QUERY).format(
+                    channel=sql.Identifier(self._channel),
+                ),
+            )
+        logger.info('Подписка на канал {0}'.format(self._channel))
+
+    def wait(self, timeout: float) -> Optional[list[dict]]:
+        """Ждёт уведомлений не дольше timeout секунд.
+
+        После первого уведомления ещё settings.notify_batch_window секунд
+        собирает следующие, чтобы обработать изменения одной пачкой.
+
+        Args:
+            timeout: максимальное время ожидания, в секундах
+
+        Returns:
+            сообщения триггеров (пустой список, если изменений не было)
+            или None, если подключение было потеряно и уведомления
+            за это время могли пропасть
+        """
+        try:
+            if self._poll(timeout):
+                self._collect_batch(settings.notify_batch_window)
+        except (OperationalError, InterfaceError) as error:
+            logger.warning(
+                'Потеряно подключение к каналу уведомлений: {0}'.format(error),
+            )
+            self.close()
+            self.listen()
+            return None
+        return self._take_payloads()
+
+    def acknowledge(self):
+        """Ничего не делает: уведомления не требуют подтверждения."""
+
+    def close(self):
+        """Закрывает подключение к каналу."""
+        if self._connection and not self._connection.closed:
+            self._connection.close()
+
+    def _poll(self, timeout: float) -> bool:
+        """Ждёт данных на подключении и забирает уведомления.
+
+        Args:
+            timeout: максимальное время ожидания, в секундах
+
+        Returns:
+            флаг, пришли ли новые уведомления
+        """
+        readable, _, _ = select.select([self._connection], [], [], timeout)
+        if not readable:
+            return False
+        self._connection.poll()
+        return bool(self._connection.notifies)
+
+    def _collect_batch(self, window: float):
+        """Забирает уведомления, приходящие в течение window секунд.
+
+        Args:
+            window: время сбора пачки, в секундах
+        """
+        deadline = monotonic() + window
+        remaining = window
+        while remaining > 0:
+            self._poll(remaining)
+            remaining = deadline - monotonic()
+
+    def _take_payloads(self) -> list[dict]:
+        """Забирает накопленные уведомления.
+
+        Returns:
+            сообщения триггеров
+        """
+        payloads = [
+            json.loads(notify.payload)
+            for notify in self._connection.notifies
+        ]
+        self._connection.notifies.clear()
+        return payloads
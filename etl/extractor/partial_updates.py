@@ -0,0 +1,112 @@
+"""Частичное обновление документов при изменении персон.
+
+Изменение персоны затрагивает в документах её film_work только имя в
+списках actors и writers и в полях actors_names и writers_names. Вместо
+получения расширенных данных и полной сборки этих документов в elastic
+отправляются действия update со скриптом, заменяющим имя по id персоны.
+Режиссёры хранятся в документе только именами, без id, поэтому film_work,
+где изменённая персона - режиссёр, собираются заново целиком.
+"""
+from typing import Any, Iterable, Mapping
+
+from config import settings
+from db.dimensions import dimension_cache
+from db.postgres import PostgresQueryWrapper
+
+# таблица, изменения которой загружаются частичными обновлениями
+PARTIAL_TABLE = 'person'
+# роли персон, которые хранятся в документе вместе с id
+RENAMED_ROLES = frozenset(('actor', 'writer'))
+# роли персон, которые хранятся в документе только именем
+REBUILT_ROLES = frozenset(('director',))
+# ряды частичного обновления документов
+PartialRows = list[dict[str, Any]]
+
+
+def uses_partial_updates(table: str) -> bool:
+    """Проверяет, загружаются ли изменения таблицы частичными обновлениями.
+
+    Args:
+        table: название таблицы
+
+    Returns:
+        флаг частичных обновлений
+    """
+    return settings.partial_person_updates and table == PARTIAL_TABLE
+
+
+def related_updates(
+    db: PostgresQueryWrapper,
+    table: str,
+    table_ids: list,
+) -> tuple[list, PartialRows]:
+    """Сводит изменённые записи связанной таблицы к затронутым film_work.
+
+    Имена изменённых записей сбрасываются в кеше измерений. Изменения
+    персон при partial_person_updates превращаются в ряды переименования.
+
+    Args:
+        db: обёртка запросов
+        table: название связанной таблицы
+        table_ids: id изменённых записей
+
+    Returns:
+        id film_work для полной сборки и ряды частичного обновления
+    """
+    dimension_cache.invalidate(table, table_ids)
+    if uses_partial_updates(table):
+        return split_person_roles(db.get_person_roles(table_ids))
+    return db.get_related_film_work_ids(table, table_ids), []
+
+
+def split_person_roles(
+    roles: Iterable[Mapping[str, Any]],
+) -> tuple[list[str], PartialRows]:
+    """Делит film_work изменённых персон на полную сборку и обновление имён.
+
+    Args:
+        roles: ряды fw_id, p_id, p_full_name и p_role связей изменённых
+            персон
+
+    Returns:
+        id film_work для полной сборки и ряды переименования персон
+        (p_renamed) в остальных film_work
+    """
+    roles = list(roles)
+    rebuilt_ids = {
+        str(role['fw_id'])
+        for role in roles
+        if role['p_role'] in REBUILT_ROLES
+    }
+    return sorted(rebuilt_ids), _renamed_rows(
+        role
+        for role in roles
+        if role['p_role'] in RENAMED_ROLES
+        and str(role['fw_id']) not in rebuilt_ids
+    )
+
+
+def _renamed_rows(roles: Iterable[Mapping[str, Any]]) -> PartialRows:
+    """Формирует ряды переименования, по одному на персону в film_work.
+
+    Персона может быть в film_work и актёром, и сценаристом.
+
+    Args:
+        roles: ряды связей изменённых персон
+
+    Returns:
+        ряды переименования персон
+    """
+    names = {
+        (str(role['fw_id']), str(role['p_id'])): role['p_full_name']
+        for role in roles
+    }
+    return [
+        {
+            'fw_id': fw_id,
+            'p_id': person_id,
+            'p_full_name': full_name,
+            'p_renamed': True,
+        }
+        for (fw_id, person_id), full_name in names.items()
+    ]
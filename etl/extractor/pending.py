@@ -0,0 +1,136 @@
+"""Модуль общей очереди id film_work, ожидающих получения полных данных."""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+# как часто ожидающие потоки проверяют, не остановлен ли проход, в секундах
+_POLL_TIMEOUT = 0.5
+
+
+@dataclass(eq=False)
+class ChunkToken:
+    """Отметка блока таблицы, ожидающего загрузки своих film_work.
+
+    Блок можно подтверждать, когда загружены все его film_work.
+    """
+
+    table: str
+    seq: int
+    remaining: int = 0
+
+
+# id film_work и блоки, ожидающие его загрузки
+PendingBatch = list[tuple[Any, list[ChunkToken]]]
+
+
+class PendingFilmWorks:
+    """Общая очередь id film_work, ожидающих получения полных данных.
+
+    Id, который уже ждёт в очереди, повторно не добавляется: к нему только
+    привязывается ещё один блок. Размер очереди ограничен - при заполнении
+    поставщики ждут, пока её не разберут.
+    """
+
+    def __init__(self, max_pending: int, failed: threading.Event):
+        """Создаёт пустую очередь.
+
+        Args:
+            max_pending: размер очереди, после которого поставщики ждут
+            failed: флаг остановки прохода из-за ошибки
+        """
+        self._max_pending = max_pending
+        self._failed = failed
+        self._pending: OrderedDict[Any, list[ChunkToken]] = OrderedDict()
+        self._condition = threading.Condition()
+        self._is_closed = False
+
+    def put(self, film_work_ids: Iterable, token: ChunkToken) -> bool:
+        """Добавляет id блока в очередь, ожидая свободного места.
+
+        Args:
+            film_work_ids: набор id film_work блока
+            token: отметка блока
+
+        Returns:
+            False, если проход остановлен из-за ошибки
+        """
+        with self._condition:
+            while self._is_full():
+                self._condition.wait(_POLL_TIMEOUT)
+            if self._failed.is_set():
+                return False
+            for film_work_id in set(film_work_ids):
+                self._pending.setdefault(film_work_id, []).append(token)
+                token.remaining += 1
+            self._condition.notify_all()
+        return True
+
+    def take(self, batch_size: int) -> Optional[PendingBatch]:
+        """Забирает из очереди набор id, ожидая их появления.
+
+        Args:
+            batch_size: максимальный размер набора
+
+        Returns:
+            набор id с их блоками или None, если очередь закрыта и пуста
+            или проход остановлен из-за ошибки
+        """
+        with self._condition:
+            while self._is_waiting():
+                self._condition.wait(_POLL_TIMEOUT)
+            if self._failed.is_set() or not self._pending:
+                return None
+            batch = [
+                self._pending.popitem(last=False)
+                for _ in range(min(batch_size, len(self._pending)))
+            ]
+            self._condition.notify_all()
+        return batch
+
+    def complete(self, batch: PendingBatch) -> list[ChunkToken]:
+        """Отмечает набор id загруженным.
+
+        Args:
+            batch: набор, полученный через take
+
+        Returns:
+            блоки, все film_work которых теперь загружены
+        """
+        batch_tokens = [token for _, tokens in batch for token in tokens]
+        finished_tokens = []
+        with self._condition:
+            for token in batch_tokens:
+                token.remaining -= 1
+                if not token.remaining:
+                    finished_tokens.append(token)
+        return finished_tokens
+
+    def close(self):
+        """Сообщает, что новых id больше не будет."""
+        with self._condition:
+            self._is_closed = True
+            self._condition.notify_all()
+
+    def _is_full(self) -> bool:
+        """Проверяет, нужно ли поставщику ждать места в очереди.
+
+        Returns:
+            флаг ожидания
+        """
+        return (
+            len(self._pending) >= self._max_pending
+            and not self._failed.is_set()
+        )
+
+    def _is_waiting(self) -> bool:
+        """Проверяет, нужно ли получателю ждать новых id.
+
+        Returns:
+            флаг ожидания
+        """
+        return (
+            not self._pending
+            and not self._is_closed
+            and not self._failed.is_set()
+        )
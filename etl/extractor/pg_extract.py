@@ -1,15 +1,121 @@
 """Модуль, отвечающий за последовательную выгрузку данных из БД Postgres."""
 import logging
 from collections import OrderedDict
-from datetime import datetime
-from typing import Any, Iterator, Optional
+from datetime import datetime, timezone
+from time import time
+from typing import Any, Iterable, Iterator, Optional, Union
 
+from common import metrics
 from common.state_processor import State
 from config import settings
-from db.postgres import PostgresQueryWrapper
+from db.postgres import MIN_ID, PostgresQueryWrapper
+from extractor import partial_updates
+from extractor.cursor import ChunkCursor
 
 logger = logging.getLogger(__name__)
 
+# граница блока и ряды его расширенных данных
+ExtractedChunk = tuple[ChunkCursor, Iterable[dict]]
+# граница блока, id film_work для полной сборки и ряды частичного обновления
+TableUpdates = tuple[ChunkCursor, list, partial_updates.PartialRows]
+# время обновления и id последней прочитанной записи таблицы
+ReadPosition = tuple[datetime, str]
+# last_modified (ISO 8601) и last_id по таблицам
+Positions = dict[str, list[str]]
+# журнал удалений film_work и связей, читается как кросс-таблица
+TOMBSTONE_TABLE = 'etl_tombstone'
+
+
+def to_datetime(modified: Union[str, float]) -> datetime:
+    """Преобразует last_modified из состояния во время с часовым поясом.
+
+    Args:
+        modified: строка ISO 8601 или unix timestamp (начальное значение
+            из настроек и состояние прежних версий)
+
+    Returns:
+        время последнего обновления
+    """
+    if isinstance(modified, str):
+        return datetime.fromisoformat(modified)
+    return datetime.fromtimestamp(modified, tz=timezone.utc)
+
+
+def modified_key(table: str) -> str:
+    """Возвращает ключ состояния с last_modified таблицы.
+
+    Args:
+        table: название таблицы
+
+    Returns:
+        имя ключа состояния
+    """
+    return 'last_modified_{0}'.format(table)
+
+
+def last_id_key(table: str) -> str:
+    """Возвращает ключ состояния с id последней прочитанной записи.
+
+    Args:
+        table: название таблицы
+
+    Returns:
+        имя ключа состояния
+    """
+    return 'last_id_{0}'.format(table)
+
+
+def read_positions(db: PostgresQueryWrapper) -> Positions:
+    """Читает позиции последних изменений всех отслеживаемых таблиц.
+
+    Args:
+        db: обёртка запросов
+
+    Returns:
+        last_modified (ISO 8601) и last_id по таблицам; пустые таблицы
+        не включаются
+    """
+    positions = {}
+    for table, table_role in PostgresExtractor.watched_tables.items():
+        last_row = db.get_last_position(table, cross=table_role == 'cross')
+        if last_row:
+            positions[table] = [
+                last_row.updated_at.isoformat(),
+                str(last_row.id),
+            ]
+    return positions
+
+
+def save_positions(
+    positions: Positions,
+    state_name: str = 'pg_extractor',
+):
+    """Записывает позиции таблиц в состояние экстрактора.
+
+    Следующий проход начнёт чтение каждой таблицы с этих позиций.
+
+    Args:
+        positions: last_modified и last_id по таблицам
+        state_name: имя состояния экстрактора
+    """
+    state = State(state_name)
+    with state.transaction():
+        for table, (last_modified, last_id) in positions.items():
+            state[modified_key(table)] = last_modified
+            state[last_id_key(table)] = last_id
+        state['current_table'] = None
+        state['chunk'] = None
+        state['data'] = None
+    state.checkpoint()
+
+
+def create_keyset_indexes():
+    """Создаёт индексы (updated_at, id) для чтения отслеживаемых таблиц."""
+    db = PostgresQueryWrapper(settings.chunk_size)
+    for table, table_role in PostgresExtractor.watched_tables.items():
+        db.create_keyset_index(table, cross=table_role == 'cross')
+    db.client.close()
+
 
 class PostgresExtractor:  # noqa: WPS214
     """Извлекает свежие данные из БД Postgres."""
@@ -20,18 +126,32 @@ class PostgresExtractor:  # noqa: WPS214
         'genre': 'related',
         'person_film_work': 'cross',
         'genre_film_work': 'cross',
+        # film_work_id удалённых film_work и удалённых или изменённых связей
+        **({TOMBSTONE_TABLE: 'cross'} if settings.pg_track_deletes else {}),
     }
 
-    def __init__(self, chunk_size: Optional[int] = None):
+    def __init__(
+        self,
+        chunk_size: Optional[int] = None,
+        state_name: str = 'pg_extractor',
+        keep_payload: Optional[bool] = None,
+    ):
         """Инициализирует текущее состояние и подключает адаптер БД.
 
         Args:
             chunk_size: размер блока данных.
+            state_name: имя состояния, в котором хранятся позиции таблиц
+            keep_payload: хранить данные блоков в состоянии, None - из настроек
         """
-        self._current_modified: Optional[datetime] = None
+        if keep_payload is None:
+            keep_payload = settings.keep_payload_in_state
+        self._keep_payload = keep_payload
+        self._read_positions: dict[str, ReadPosition] = {}
+        self._started_at = time()
         self._primary_table = self._get_primary_table()
         self._enriched_data: dict[str, Any] = {}
-        self._state = State('pg_extractor')
+        self._state = State(state_name)
+        self._chunk_size = chunk_size
         self._db = PostgresQueryWrapper(chunk_size)
 
         if self._state.data:
@@ -49,6 +169,7 @@ class PostgresExtractor:  # noqa: WPS214
         }
         self._current_table: Optional[str] = self.table_names[0]
         self._init_state()
+        self._report_lag(self.watched_tables)
 
     def _get_primary_table(self):
         """Возвращает название основной таблицы.
@@ -71,84 +192,243 @@ class PostgresExtractor:  # noqa: WPS214
 
         return primary_tables[0]
 
-    @property
-    def _last_modified(self):
-        """Возвращает last_modified из состояния или иницdиализирует его.
+    def _read_position(self, table: str) -> ReadPosition:
+        """Возвращает позицию чтения таблицы.
+
+        Позиция чтения совпадает с last_modified и last_id из состояния,
+        пока блоки не начинают выгружаться раньше, чем подтверждается их
+        обработка.
+
+        Args:
+            table: название таблицы
 
         Returns:
-            текущее значение last_modified для таблицы _current_table
+            время обновления и id последней прочитанной записи таблицы
         """
-        modified_key = 'last_modified_{0}'.format(self._current_table)
-        last_timestamp = self._state.get(
-            modified_key,
+        read_position = self._read_positions.get(table)
+        if read_position:
+            return read_position
+        last_modified = self._state.get(
+            modified_key(table),
             settings.initial_timestamp,
         )
-        return datetime.utcfromtimestamp(last_timestamp)
-
-    @_last_modified.setter
-    def _last_modified(self, modified_time):
-        modified_key = 'last_modified_{0}'.format(self._current_table)
-        self._state[modified_key] = datetime.timestamp(modified_time)
+        return (
+            to_datetime(last_modified),
+            self._state.get(last_id_key(table), MIN_ID),
+        )
 
-    def extract(self) -> Iterator[list[dict]]:
+    def extract(self) -> Iterator[Iterable[dict]]:
         """Метод запроса данных из БД.
 
         Yields:
             Набор данных, соответствующий всем выбранным изменениям.
         """
+        # если мы получили enriched data из состояния - сразу
+        # пытаемся отдать
+        if self._enriched_data:
+            yield self._enriched_data
+            self._enriched_data = None
+            self._state['data'] = None
+
+        for chunk_cursor, enriched_rows in self.extract_chunks():
+            if self._keep_payload:
+                yield from self._yield_rows(chunk_cursor, enriched_rows)
+            else:
+                yield from self._yield_cursor_chunk(
+                    chunk_cursor,
+                    enriched_rows,
+                )
+
+        self._reset_state()
+
+    def extract_chunks(self) -> Iterator[ExtractedChunk]:
+        """Выгружает блоки изменений вместе с их границами.
+
+        last_modified в состоянии при этом не сдвигается: блок нужно
+        подтвердить через commit_chunk после его обработки.
+
+        Yields:
+            Границу блока и его ряды (пустой набор, если изменённые записи
+            не связаны ни с одним film_work).
+        """
         while self._current_table:
-            # если мы получили enriched data из состояния - сразу
-            # пытаемся отдать
-            if self._enriched_data:
-                yield self._enriched_data
-                self._enriched_data = None
-                self._state['data'] = None
-
-            updated_fw = set()
             logger.info(
                 'Проверяем свежие записи в таблице {0}'.format(
                     self._current_table,
                 ),
             )
-            updated_fw.update(self._get_table_updates(self._current_table))
+            table_updates = self._get_table_updates(self._current_table)
             # если в таблице больше нет свежих данных, мы переходим к следующей
             # или None, если таблиц больше нет (это завершает работу extract)
-            if not updated_fw:
+            if table_updates is None:
                 logger.debug(
                     'Новых данных нет, переходим к следующей таблице...',
                 )
                 self._current_table = self._next_table.get(self._current_table)
                 continue
 
-            self._enriched_data = [
+            chunk_cursor, film_work_ids, partial_rows = table_updates
+            # изменённые записи не связаны ни с одним film_work
+            if not film_work_ids and not partial_rows:
+                yield chunk_cursor, []
+                continue
+            yield chunk_cursor, self._enriched_rows(
+                film_work_ids,
+                partial_rows,
+            )
+
+    def table_chunks(
+        self,
+        table: str,
+        db: PostgresQueryWrapper,
+    ) -> Iterator[TableUpdates]:
+        """Выгружает id film_work для всех свежих изменений одной таблицы.
+
+        Позволяет читать таблицы независимо друг от друга через отдельные
+        подключения.
+
+        Args:
+            table: название таблицы
+            db: обёртка запросов с отдельным подключением к БД
+
+        Yields:
+            Границу блока, набор id film_work, затронутых блоком, и ряды
+            частичного обновления документов.
+        """
+        table_updates = self._get_table_updates(table, db)
+        while table_updates:
+            yield table_updates
+            table_updates = self._get_table_updates(table, db)
+
+    def commit_chunk(self, chunk_cursor: ChunkCursor):
+        """Отмечает блок обработанным и сдвигает позицию таблицы.
+
+        Args:
+            chunk_cursor: граница обработанного блока
+        """
+        with self._state.transaction():
+            self._state[modified_key(chunk_cursor.table)] = (
+                chunk_cursor.last_modified
+            )
+            self._state[last_id_key(chunk_cursor.table)] = (
+                chunk_cursor.last_id
+            )
+            self._state['chunk'] = None
+        self._report_lag([chunk_cursor.table])
+
+    def finish(self):
+        """Завершает проход после подтверждения всех выгруженных блоков."""
+        self._reset_state()
+
+    def _enriched_rows(
+        self,
+        film_work_ids: list,
+        partial_rows: partial_updates.PartialRows,
+    ) -> Iterator[dict]:
+        """Запрашивает расширенные данные блоками по chunk_size film_work.
+
+        Изменение связанной записи может затронуть больше film_work, чем
+        помещается в один блок, поэтому запросов может быть несколько.
+        Ряды частичного обновления отдаются первыми.
+
+        Args:
+            film_work_ids: id film_work блока изменений
+            partial_rows: ряды частичного обновления блока
+
+        Yields:
+            ряды расширенных данных
+        """
+        yield from partial_rows
+        step = self._chunk_size or max(len(film_work_ids), 1)
+        for start in range(0, len(film_work_ids), step):
+            enriched_rows = self._db.get_enriched_rows(
+                film_work_ids[start:start + step],
+            )
+            yield from (
                 record._asdict()  # noqa: WPS437
-                for record in updated_fw
-            ]
+                for record in enriched_rows
+            )
+
+    def _yield_rows(
+        self,
+        chunk_cursor: ChunkCursor,
+        enriched_rows: Iterable[dict],
+    ) -> Iterator[list[dict]]:
+        """Отдаёт ряды блока, предварительно сохранив их в состоянии.
 
-            # после обработки мы сохраняем данные в хранилище и ожидаем
-            # корректной отдачи
+        Args:
+            chunk_cursor: граница блока
+            enriched_rows: ряды расширенных данных
+
+        Yields:
+            Список словарей с рядами данных блока.
+        """
+        self._enriched_data = list(enriched_rows)
+        if not self._enriched_data:
+            self.commit_chunk(chunk_cursor)
+            return
+
+        # после обработки мы сохраняем данные в хранилище и ожидаем
+        # корректной отдачи
+        with self._state.transaction():
             self._state['data'] = self._enriched_data
-            self._last_modified = self._current_modified
+            self.commit_chunk(chunk_cursor)
 
-            logger.debug(
-                'Отправка новых данных от таблицы {0}, записей: {1}.'.format(
-                    self._current_table,
-                    len(self._enriched_data),
-                ),
-            )
-            yield self._enriched_data
+        logger.debug(
+            'Отправка новых данных от таблицы {0}, записей: {1}.'.format(
+                chunk_cursor.table,
+                len(self._enriched_data),
+            ),
+        )
+        yield self._enriched_data
 
-            self._enriched_data = None
-            self._state['data'] = None
+        self._enriched_data = None
+        self._state['data'] = None
 
-        self._reset_state()
+    def _yield_cursor_chunk(
+        self,
+        chunk_cursor: ChunkCursor,
+        enriched_rows: Iterable[dict],
+    ) -> Iterator[Iterable[dict]]:
+        """Отдаёт ряды блока, сохраняя в состоянии только его границу.
+
+        last_modified сдвигается только после того, как блок полностью
+        обработан получателем, поэтому при сбое блок будет выгружен повторно.
+        В потоковом режиме ряды отдаются генератором.
+
+        Args:
+            chunk_cursor: граница блока
+            enriched_rows: ряды расширенных данных
+
+        Yields:
+            Набор словарей с рядами данных блока.
+        """
+        self._state['chunk'] = chunk_cursor.to_state()
+        logger.debug(
+            'Отправка новых данных от таблицы {0} до {1}.'.format(
+                chunk_cursor.table,
+                chunk_cursor.last_modified,
+            ),
+        )
+        if settings.pg_stream_rows:
+            yield enriched_rows
+        else:
+            rows = list(enriched_rows)
+            if rows:
+                yield rows
+        self.commit_chunk(chunk_cursor)
 
     def _reset_state(self):
         """Сбрасывает состояние для последующего повторного использования.
 
-        Сбрасывает ключ current_table, закрывает подключение к postgres
+        Сбрасывает ключ current_table, сохраняет накопленное состояние,
+        закрывает подключение к postgres
         """
         self._state['current_table'] = None
+        self._state.checkpoint()
+        # все таблицы прочитаны до конца: изменений до начала прохода нет
+        for table in self.watched_tables:
+            metrics.table_lag.advance(self._started_at, table)
         # чтобы не переоткрывать подключение каждый чанк данных
         self._db.client.close()
 
@@ -159,19 +439,39 @@ class PostgresExtractor:  # noqa: WPS214
             for name in self.watched_tables.keys()
             if name != self._primary_table
         ]
-        for table in table_list:
-            state_key = 'last_modified_{0}'.format(table)
-            modified_time = self._db.get_last_modified_time(
-                table,
-                cross=self._is_cross_table(table),
-            )
-            self._state[state_key] = modified_time.timestamp()
+        with self._state.transaction():
+            for table in table_list:
+                last_row = self._db.get_last_position(
+                    table,
+                    cross=self._is_cross_table(table),
+                )
+                # пустая таблица (журнал удалений) читается с начала
+                if last_row is None:
+                    continue
+                self._state[modified_key(table)] = (
+                    last_row.updated_at.isoformat()
+                )
+                self._state[last_id_key(table)] = str(last_row.id)
         logger.debug(
             'Обновлены данные последних модификаций для таблиц {0}'.format(
                 table_list,
             ),
         )
 
+    def _report_lag(self, tables: Iterable[str]):
+        """Обновляет отставание позиций таблиц для метрик.
+
+        Args:
+            tables: названия таблиц
+        """
+        for table in tables:
+            last_modified = self._state.get(modified_key(table))
+            if last_modified is not None:
+                metrics.table_lag.advance(
+                    to_datetime(last_modified).timestamp(),
+                    table,
+                )
+
     def _is_cross_table(self, table) -> bool:
         """Возвращает флаг, сообщающий, является ли таблица кросс-таблицей.
 
@@ -192,8 +492,23 @@ class PostgresExtractor:  # noqa: WPS214
             self._state['current_table'] = self._current_table
 
         current_data = self._state.get('data')
-        if current_data:
+        if current_data and self._keep_payload:
             self._enriched_data = current_data
+        elif current_data:
+            # данные блока, сохранённые прежним запуском в режиме payload:
+            # блок будет выгружен повторно по границе из состояния
+            self._state['data'] = None
+
+        chunk_cursor = ChunkCursor.from_state(self._state.get('chunk'))
+        if chunk_cursor and chunk_cursor.table in self.table_names:
+            # last_modified таблицы не сдвигался, поэтому незавершённый блок
+            # будет выгружен повторно тем же запросом
+            logger.info(
+                'Повторно выгружаем незавершённый блок таблицы {0}'.format(
+                    chunk_cursor.table,
+                ),
+            )
+            self._current_table = chunk_cursor.table
 
         logger.debug(
             'Инициализирован pg_extractor: таблица: {0}, данные: {1}'.format(
@@ -202,40 +517,80 @@ class PostgresExtractor:  # noqa: WPS214
             ),
         )
 
-    def _get_table_updates(self, table):
-        """Функция пытается получить чанк данных из очередной таблицы.
+    def _get_table_updates(
+        self,
+        table,
+        db: Optional[PostgresQueryWrapper] = None,
+    ) -> Optional[TableUpdates]:
+        """Функция пытается получить чанк изменений из очередной таблицы.
 
-        Получает актуальные записи, привязывает их к записям film_work
-        и в конце формирует набор строк для формирования полной информации
-        для elastic.
+        Получает актуальные записи и привязывает их к записям film_work,
+        для которых затем запрашивается полная информация для elastic.
+        Изменения персон при partial_person_updates вместо этого
+        превращаются в ряды переименования для частичного обновления.
+        Позиция чтения таблицы сдвигается на конец полученного чанка.
 
         Args:
             table: название таблицы БД
+            db: обёртка запросов, по умолчанию - подключение экстрактора
 
         Returns:
-            полный набор данных для формирования enriched data
+            границу чанка, набор id film_work для формирования enriched data
+            и ряды частичного обновления или None, если свежих записей в
+            таблице нет
         """
-        table_rows = self._db.get_ids_after_time(
-            table,
-            self._last_modified,
-            cross=self._is_cross_table(table),
-        )
+        db = db or self._db
+        table_rows = self._read_chunk(table, db)
         # если на этом шаге мы не получили id, то можем выходить
         if not table_rows:
-            return []
-        self._current_modified = table_rows[-1].updated_at
+            return None
+        chunk_cursor = self._advance_position(table, table_rows[-1])
         table_ids = [entry.id for entry in table_rows]
 
         # в случае related таблицы подтягиваем id film_work через M2M
         # в иных случаях мы уже имеем эти id
         if self.watched_tables[table] == 'related':
-            related_fw_rows = self._db.get_related_film_work_ids(
-                table,
-                table_ids,
+            return (
+                chunk_cursor,
+                *partial_updates.related_updates(db, table, table_ids),
             )
-            film_work_ids = [film_work.id for film_work in related_fw_rows]
-        else:
-            film_work_ids = table_ids
 
-        # возвращаем полные записи, соответствующие всей нужной информации
-        return self._db.get_enriched_rows(film_work_ids)
+        return chunk_cursor, table_ids, []
+
+    def _read_chunk(self, table: str, db: PostgresQueryWrapper) -> list:
+        """Читает записи таблицы после текущей позиции чтения.
+
+        Args:
+            table: название таблицы БД
+            db: обёртка запросов
+
+        Returns:
+            ряды id, row_id, updated_at
+        """
+        last_modified, last_id = self._read_position(table)
+        return db.get_ids_after_time(
+            table,
+            last_modified,
+            last_id,
+            cross=self._is_cross_table(table),
+        )
+
+    def _advance_position(self, table: str, last_row) -> ChunkCursor:
+        """Сдвигает позицию чтения таблицы на последнюю запись блока.
+
+        Args:
+            table: название таблицы БД
+            last_row: последняя запись блока
+
+        Returns:
+            граница блока
+        """
+        self._read_positions[table] = (
+            last_row.updated_at,
+            str(last_row.row_id),
+        )
+        return ChunkCursor(
+            table=table,
+            last_modified=last_row.updated_at.isoformat(),
+            last_id=str(last_row.row_id),
+        )
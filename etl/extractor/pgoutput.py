@@ -0,0 +1,205 @@
+"""Разбор сообщений протокола логической репликации pgoutput (версия 1).
+
+Из потока нужны только описания таблиц, изменения рядов и границы
+транзакций; значения колонок приходят в текстовом виде.
+"""
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+# текстовое значение колонки в TupleData (остальные - NULL и TOAST)
+_TEXT_VALUE = b't'
+# маркеры старой версии ряда в Update и Delete
+_OLD_ROW_MARKERS = frozenset((b'K', b'O'))
+_CHANGE_TYPES = frozenset((b'I', b'U', b'D'))
+
+Row = dict[str, Optional[str]]
+
+
+@dataclass(frozen=True)
+class Relation:
+    """Описание таблицы из сообщения Relation."""
+
+    schema: str
+    table: str
+    columns: list[str]
+
+
+@dataclass(frozen=True)
+class RowChange:
+    """Изменение ряда таблицы."""
+
+    schema: str
+    table: str
+    operation: str
+    new_row: Optional[Row] = None
+    old_row: Optional[Row] = None
+
+
+@dataclass(frozen=True)
+class Commit:
+    """Конец транзакции и позиция WAL после неё."""
+
+    end_lsn: int
+
+
+class _Reader:
+    """Последовательно читает поля сообщения."""
+
+    def __init__(self, payload: bytes):
+        self._payload = payload
+        self._offset = 0
+
+    def unpack(self, fmt: str) -> tuple:
+        """Читает поля фиксированного размера.
+
+        Args:
+            fmt: формат struct в сетевом порядке байт
+
+        Returns:
+            кортеж значений
+        """
+        fields = struct.unpack_from(fmt, self._payload, self._offset)
+        self._offset += struct.calcsize(fmt)
+        return fields
+
+    def number(self, fmt: str) -> int:
+        """Читает одно число.
+
+        Args:
+            fmt: формат struct в сетевом порядке байт
+
+        Returns:
+            число
+        """
+        return self.unpack(fmt)[0]
+
+    def byte(self) -> bytes:
+        """Читает один байт.
+
+        Returns:
+            байт
+        """
+        byte_value = self._payload[self._offset:self._offset + 1]
+        self._offset += 1
+        return byte_value
+
+    def string(self) -> str:
+        """Читает строку, завершённую нулевым байтом.
+
+        Returns:
+            строка
+        """
+        end = self._payload.index(b'\0', self._offset)
+        string_value = self._payload[self._offset:end].decode('utf-8')
+        self._offset = end + 1
+        return string_value
+
+    def text(self, length: int) -> str:
+        """Читает строку заданной длины.
+
+        Args:
+            length: длина в байтах
+
+        Returns:
+            строка
+        """
+        text_value = self._payload[self._offset:self._offset + length]
+        self._offset += length
+        return text_value.decode('utf-8')
+
+
+class PgOutputDecoder:
+    """Разбирает сообщения pgoutput, помня описания таблиц."""
+
+    def __init__(self):
+        """Создаёт декодер без известных таблиц."""
+        self._relations: dict[int, Relation] = {}
+
+    def decode(self, payload: bytes):
+        """Разбирает одно сообщение.
+
+        Args:
+            payload: сообщение pgoutput
+
+        Returns:
+            RowChange для изменений рядов, Commit для конца транзакции,
+            None для остальных сообщений
+        """
+        reader = _Reader(payload)
+        message_type = reader.byte()
+        if message_type == b'R':
+            self._read_relation(reader)
+        elif message_type == b'C':
+            _, _, end_lsn, _ = reader.unpack('!bqqq')
+            return Commit(end_lsn)
+        elif message_type in _CHANGE_TYPES:
+            return self._read_change(message_type.decode(), reader)
+        return None
+
+    def _read_relation(self, reader: _Reader):
+        """Запоминает описание таблицы.
+
+        Args:
+            reader: сообщение Relation после типа
+        """
+        relation_id = reader.number('!I')
+        schema = reader.string()
+        table = reader.string()
+        _, columns_count = reader.unpack('!bh')
+        columns = []
+        for _ in range(columns_count):
+            # флаги колонки, имя, oid типа и его модификатор
+            reader.byte()
+            columns.append(reader.string())
+            reader.unpack('!Ii')
+        self._relations[relation_id] = Relation(schema, table, columns)
+
+    def _read_change(self, operation: str, reader: _Reader) -> RowChange:
+        """Разбирает изменение ряда.
+
+        Args:
+            operation: I, U или D
+            reader: сообщение после типа
+
+        Returns:
+            изменение ряда
+        """
+        relation = self._relations[reader.number('!I')]
+        old_row = None
+        if reader.byte() in _OLD_ROW_MARKERS:
+            old_row = self._read_tuple(reader, relation.columns)
+            if operation == 'D':
+                return RowChange(
+                    relation.schema,
+                    relation.table,
+                    operation,
+                    old_row=old_row,
+                )
+            # маркер новой версии ряда
+            reader.byte()
+        return RowChange(
+            relation.schema,
+            relation.table,
+            operation,
+            new_row=self._read_tuple(reader, relation.columns),
+            old_row=old_row,
+        )
+
+    def _read_tuple(self, reader: _Reader, columns: list[str]) -> Row:
+        """Разбирает значения колонок ряда.
+
+        Args:
+            reader: сообщение, спозиционированное на TupleData
+            columns: колонки таблицы
+
+        Returns:
+            значения колонок (None для NULL и неизменённых TOAST)
+        """
+        values_count = reader.number('!h')
+        row: Row = {}
+        for column in columns[:values_count]:
+            row[column] = None
+            if reader.byte() == _TEXT_VALUE:
+                row[column] = reader.text(reader.number('!i'))
+        return row
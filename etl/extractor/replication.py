@@ -0,0 +1,219 @@
+"""Модуль получения изменений из слота логической репликации.
+
+Изменения таблиц content читаются из слота с плагином pgoutput (входит
+в Postgres, расширения не нужны) по публикации отслеживаемых таблиц.
+Позиция WAL после последней обработанной транзакции хранится в State и
+подтверждается серверу, поэтому после перезапуска чтение продолжается
+с неё, а изменения не теряются и не пропускаются.
+"""
+import logging
+import select
+from time import monotonic
+
+from common.deco import backoff
+from common.state_processor import State
+from config import settings
+from db.postgres import PostgresQueryWrapper
+from extractor.change_source import ChangeSource
+from extractor.pg_extract import PostgresExtractor
+from extractor.pgoutput import Commit, PgOutputDecoder, RowChange
+from psycopg2 import InterfaceError, OperationalError, connect
+from psycopg2.extras import LogicalReplicationConnection
+
+logger = logging.getLogger(__name__)
+
+# сколько ждать изменений до отправки серверу отметки активности, в секундах
+_IDLE_TIMEOUT = 10
+
+
+def cross_tables() -> list[str]:
+    """Возвращает кросс-таблицы среди отслеживаемых.
+
+    Returns:
+        названия кросс-таблиц
+    """
+    return [
+        table
+        for table, table_role in PostgresExtractor.watched_tables.items()
+        if table_role == 'cross'
+    ]
+
+
+def changed_ids(change: RowChange) -> list[dict]:
+    """Сводит изменение ряда к изменённым записям.
+
+    Для кросс-таблиц берётся film_work_id старой и новой версии ряда:
+    при смене связи затронуты оба фильма.
+
+    Args:
+        change: изменение ряда
+
+    Returns:
+        записи с таблицей и id
+    """
+    id_column = 'film_work_id' if change.table in cross_tables() else 'id'
+    row_ids = {
+        row[id_column]
+        for row in (change.old_row, change.new_row)
+        if row and row.get(id_column)
+    }
+    return [{'table': change.table, 'id': row_id} for row_id in row_ids]
+
+
+class ReplicationStream(ChangeSource):  # noqa: WPS214
+    """Читает изменения отслеживаемых таблиц из слота репликации.
+
+    Слот хранит изменения до подтверждения, поэтому полный проход нужен
+    только до первого подтверждённого чтения.
+    """
+
+    def __init__(self):
+        """Задаёт слот и публикацию из настроек."""
+        self._slot = settings.replication_slot
+        self._publication = settings.replication_publication
+        self._state = State('replication')
+        self._decoder = PgOutputDecoder()
+        self._connection = None
+        self._cursor = None
+        # изменения незавершённой транзакции, позиция после последней
+        # транзакции, переданной вызывающему, и после последней транзакции
+        # собираемой пачки
+        self._transaction_changes: list[dict] = []
+        self._received_lsn: int = self._state.get('lsn', 0)
+        self._batch_lsn: int = self._received_lsn
+
+    def start(self) -> bool:
+        """Готовит публикацию и слот и начинает чтение.
+
+        Returns:
+            флаг, нужен ли полный проход - слот только что создан, и
+            изменений до его создания в нём нет
+        """
+        db = PostgresQueryWrapper(settings.chunk_size)
+        is_new_slot = db.prepare_replication(
+            self._publication,
+            self._slot,
+            list(PostgresExtractor.watched_tables.keys()),
+            cross_tables(),
+        )
+        db.client.close()
+        self._start_replication()
+        return is_new_slot or not self._state.get('lsn')
+
+    def wait(self, timeout: float) -> list[dict]:
+        """Читает изменения завершённых транзакций.
+
+        После первого изменения ещё settings.notify_batch_window секунд
+        собирает следующие транзакции в ту же пачку.
+
+        Args:
+            timeout: максимальное время ожидания первого изменения
+
+        Returns:
+            изменённые записи: таблица и id (для кросс-таблиц -
+            film_work_id); пустой список, если изменений не было
+        """
+        try:
+            changes = self._read_changes(min(timeout, _IDLE_TIMEOUT))
+        except (OperationalError, InterfaceError) as error:
+            logger.warning(
+                'Потеряно подключение к слоту репликации: {0}'.format(error),
+            )
+            self.close()
+            self._start_replication()
+            return []
+        # пачка передана вызывающему, и её позицию можно подтверждать
+        self._received_lsn = self._batch_lsn
+        if not changes:
+            self._cursor.send_feedback()
+        return changes
+
+    def acknowledge(self):
+        """Подтверждает обработку всех полученных транзакций."""
+        if self._received_lsn == self._state.get('lsn', 0):
+            return
+        self._state['lsn'] = self._received_lsn
+        self._cursor.send_feedback(flush_lsn=self._received_lsn)
+
+    def close(self):
+        """Закрывает подключение репликации."""
+        if self._connection and not self._connection.closed:
+            self._connection.close()
+
+    @backoff(
+        exceptions=(OperationalError, InterfaceError),
+        logger_func=logger.warning,
+    )
+    def _start_replication(self):
+        """Открывает подключение репликации и начинает чтение слота.
+
+        Чтение продолжается с подтверждённой позиции: транзакции, которые
+        не были переданы вызывающему до разрыва, сервер отправит заново.
+        """
+        self._connection = connect(
+            **settings.pg_dsn.dict(),
+            connection_factory=LogicalReplicationConnection,
+        )
+        self._cursor = self._connection.cursor()
+        self._transaction_changes = []
+        self._received_lsn = self._state.get('lsn', 0)
+        self._batch_lsn = self._received_lsn
+        self._cursor.start_replication(
+            slot_name=self._slot,
+            decode=False,
+            start_lsn=self._state.get('lsn', 0),
+            options={
+                'proto_version': '1',
+                'publication_names': self._publication,
+            },
+        )
+        logger.info(
+            'Чтение слота {0} с позиции {1}'.format(
+                self._slot,
+                self._state.get('lsn', 0),
+            ),
+        )
+
+    def _read_changes(self, timeout: float) -> list[dict]:
+        """Читает сообщения слота, пока не истечёт время сбора пачки.
+
+        Args:
+            timeout: максимальное время ожидания первого изменения
+
+        Returns:
+            изменённые записи завершённых транзакций
+        """
+        changes: list[dict] = []
+        deadline = monotonic() + timeout
+        while monotonic() < deadline:
+            message = self._cursor.read_message()
+            if message is None:
+                select.select([self._cursor], [], [], deadline - monotonic())
+            elif self._apply_message(message.payload, changes):
+                # первая транзакция с изменениями открывает окно пачки
+                deadline = monotonic() + settings.notify_batch_window
+        return changes
+
+    def _apply_message(self, payload: bytes, changes: list[dict]) -> bool:
+        """Учитывает сообщение слота.
+
+        Изменения транзакции попадают в changes только после её Commit.
+
+        Args:
+            payload: сообщение pgoutput
+            changes: изменения завершённых транзакций пачки
+
+        Returns:
+            флаг, что это первая транзакция пачки с изменениями
+        """
+        decoded = self._decoder.decode(payload)
+        if isinstance(decoded, RowChange):
+            self._transaction_changes.extend(changed_ids(decoded))
+            return False
+        if not isinstance(decoded, Commit):
+            return False
+        self._batch_lsn = decoded.end_lsn
+        is_first = bool(self._transaction_changes) and not changes
+        changes.extend(self._transaction_changes)
+        self._transaction_changes = []
+        return is_first
@@ -0,0 +1,27 @@
+"""Журнал удалений film_work и связей для загрузки удалений в индекс.
+
+Опрос таблиц по updated_at не видит удалённых рядов, поэтому триггеры
+основной и кросс-таблиц записывают в журнал id film_work, затронутых
+удалением film_work или удалением и изменением связи. Журнал читается
+как кросс-таблица: film_work со связями загружаются заново, а для
+удалённых film_work получение расширенных данных возвращает ряды
+удаления, из которых собираются действия delete.
+"""
+from config import settings
+from db.postgres import PostgresQueryWrapper
+from extractor.pg_extract import TOMBSTONE_TABLE, PostgresExtractor
+
+
+def install_tombstones():
+    """Создаёт журнал удалений и триггеры основной и кросс-таблиц."""
+    db = PostgresQueryWrapper(settings.chunk_size)
+    db.install_tombstone_triggers(
+        'film_work',
+        [
+            table
+            for table, table_role in PostgresExtractor.watched_tables.items()
+            if table_role == 'cross' and table != TOMBSTONE_TABLE
+        ],
+        settings.pg_tombstone_retention_days,
+    )
+    db.client.close()
@@ -0,0 +1,118 @@
+"""Модуль асинхронной загрузки данных в elastic search."""
+import asyncio
+from typing import Any
+
+from config import settings
+from db.async_elastic import AsyncElasticClient, BulkAnswer
+from loader.batching import BulkEntry, split_bulk
+from loader.elastic_load import ElasticLoader
+
+
+class AsyncElasticLoader(ElasticLoader):
+    """Загружает документы в Elastic Search, не блокируя цикл событий.
+
+    Подбор размера запросов, повторы, журнал неустранимых ошибок и
+    пропуск неизменённых документов - те же, что у ElasticLoader, но
+    bulk-запросы одного набора документов отправляются одновременно, а
+    запросы к базе хешей выполняются в отдельном потоке.
+    """
+
+    def __init__(self, elastic: AsyncElasticClient, index_name: str):
+        """Настраивает загрузку через общий асинхронный клиент.
+
+        Синхронный клиент и состояние данных блоков не создаются.
+
+        Args:
+            elastic: асинхронный клиент elastic search
+            index_name: наименование индекса для сохранения данных
+        """
+        self.elastic = elastic
+        self._init_bulk(index_name)
+
+    async def load(self, elastic_data: list[dict[str, Any]]) -> list:
+        """Загружает документы в индекс.
+
+        Данные блоков в состоянии не сохраняются: восстановление идёт
+        по границам блоков.
+
+        Args:
+            elastic_data: данные, подготовленные к загрузке в elastic search
+
+        Returns:
+            ответы elastic на все отправленные запросы
+        """
+        changed = await asyncio.to_thread(self._changed_hashes, elastic_data)
+        pending = self._pending_entries(elastic_data, changed)
+        answers = []
+        rejected = await self._send_pending(pending, answers)
+        if changed:
+            await asyncio.to_thread(
+                self._remember_accepted,
+                changed,
+                rejected,
+            )
+        return answers
+
+    async def _send_pending(
+        self,
+        pending: list[BulkEntry],
+        answers: list,
+    ) -> set:
+        """Отправляет записи, пока остаются документы для повтора.
+
+        Args:
+            pending: записи для отправки
+            answers: список, в который добавляются ответы elastic
+
+        Returns:
+            id документов, которые elastic так и не принял
+        """
+        rejected = set()
+        attempt = 0
+        while pending:
+            failures = await self._send_entries(pending, answers)
+            pending = self._handle_failures(failures, attempt)
+            self._track_rejected(rejected, failures, pending)
+            if pending:
+                await asyncio.sleep(self._retry_delay(attempt))
+                attempt += 1
+        return rejected
+
+    async def _send_entries(
+        self,
+        entries: list[BulkEntry],
+        answers: list,
+    ) -> list:
+        """Отправляет записи одновременными запросами целевого размера.
+
+        Args:
+            entries: записи для отправки
+            answers: список, в который добавляются ответы elastic
+
+        Returns:
+            не принятые документы
+        """
+        batches = list(
+            split_bulk(entries, self._bulk_size, settings.bulk_max_docs),
+        )
+        batch_answers = await asyncio.gather(*(
+            self._post_batch(batch) for batch in batches
+        ))
+        answers.extend(batch_answers)
+        failures = []
+        for batch, answer in zip(batches, batch_answers):
+            failures.extend(self._check_answer(batch, answer))
+        return failures
+
+    async def _post_batch(self, batch: list[BulkEntry]) -> BulkAnswer:
+        """Отправляет один bulk-запрос.
+
+        Args:
+            batch: записи запроса
+
+        Returns:
+            ответ elastic
+        """
+        return await self.elastic.post_bulk(
+            b''.join(entry.lines for entry in batch),
+        )
@@ -0,0 +1,150 @@
+"""Разбиение документов на bulk-запросы по размеру в байтах."""
+import threading
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+# во сколько раз меняется целевой размер запроса при адаптации
+_GROW_FACTOR = 1.25
+_SHRINK_FACTOR = 0.75
+_THROTTLE_FACTOR = 0.5
+# запрос считается заполненным, если достиг этой доли целевого размера
+_FILLED_SHARE = 0.9
+
+
+@dataclass(frozen=True)
+class BulkEntry:
+    """Документ, обёрнутый в bulk-формат, и его размер в байтах."""
+
+    doc_id: str
+    lines: bytes
+    size: int
+
+    @classmethod
+    def from_lines(cls, doc_id: str, lines: bytes) -> 'BulkEntry':
+        """Создаёт запись с её размером.
+
+        Args:
+            doc_id: id документа
+            lines: строки действия и документа в bulk-формате
+
+        Returns:
+            запись bulk-запроса
+        """
+        return cls(doc_id, lines, len(lines))
+
+
+class AdaptiveBulkSize:
+    """Подбирает целевой размер bulk-запроса по откликам elastic.
+
+    Размер растёт, пока заполненные запросы обрабатываются быстрее
+    целевой задержки, уменьшается при медленных ответах и резко
+    уменьшается при отказах elastic из-за перегрузки (HTTP 429).
+    """
+
+    def __init__(
+        self,
+        initial_bytes: int,
+        min_bytes: int,
+        max_bytes: int,
+        target_latency: float,
+    ):
+        """Задаёт границы размера запроса.
+
+        Args:
+            initial_bytes: начальный целевой размер запроса в байтах
+            min_bytes: минимальный целевой размер запроса в байтах
+            max_bytes: максимальный целевой размер запроса в байтах
+            target_latency: желаемое время обработки запроса, в секундах
+        """
+        self._min_bytes = min_bytes
+        self._max_bytes = max_bytes
+        self._target_latency = target_latency
+        self._lock = threading.Lock()
+        self.target_bytes = self._clamp(initial_bytes)
+
+    def observe(self, body_bytes: int, latency: float):
+        """Учитывает успешно обработанный запрос.
+
+        Args:
+            body_bytes: размер отправленного запроса в байтах
+            latency: время обработки запроса, в секундах
+        """
+        with self._lock:
+            if latency > self._target_latency:
+                self._scale(_SHRINK_FACTOR)
+            elif self._is_filled(body_bytes):
+                self._scale(_GROW_FACTOR)
+
+    def throttle(self):
+        """Учитывает отказ elastic из-за перегрузки."""
+        with self._lock:
+            self._scale(_THROTTLE_FACTOR)
+
+    def _is_filled(self, body_bytes: int) -> bool:
+        """Проверяет, был ли запрос заполнен до целевого размера.
+
+        Незаполненные запросы ничего не говорят о том, справится ли
+        elastic с запросом большего размера.
+
+        Args:
+            body_bytes: размер отправленного запроса в байтах
+
+        Returns:
+            флаг заполненности
+        """
+        return body_bytes >= self.target_bytes * _FILLED_SHARE
+
+    def _scale(self, factor: float):
+        """Изменяет целевой размер в пределах границ.
+
+        Args:
+            factor: множитель целевого размера
+        """
+        self.target_bytes = self._clamp(int(self.target_bytes * factor))
+
+    def _clamp(self, body_bytes: int) -> int:
+        """Ограничивает размер границами.
+
+        Args:
+            body_bytes: размер в байтах
+
+        Returns:
+            размер в пределах [min_bytes, max_bytes]
+        """
+        return max(self._min_bytes, min(body_bytes, self._max_bytes))
+
+
+def split_bulk(
+    entries: Iterable[BulkEntry],
+    bulk_size: AdaptiveBulkSize,
+    max_docs: int,
+) -> Iterator[list[BulkEntry]]:
+    """Группирует записи bulk-формата в запросы ограниченного размера.
+
+    Целевой размер читается перед каждым запросом, поэтому его изменение
+    после ответа elastic сразу влияет на следующие запросы. Документ,
+    который сам по себе больше целевого размера, отправляется отдельно.
+
+    Args:
+        entries: документы, уже обёрнутые в bulk-формат
+        bulk_size: целевой размер запроса в байтах
+        max_docs: максимальное количество документов в запросе
+
+    Yields:
+        наборы записей для одного запроса
+    """
+    batch: list[BulkEntry] = []
+    batch_bytes = 0
+    for entry in entries:
+        is_full = (
+            batch_bytes + entry.size > bulk_size.target_bytes
+            or len(batch) >= max_docs
+        )
+        if batch and is_full:
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(entry)
+        batch_bytes += entry.size
+    if batch:
+        yield batch
@@ -0,0 +1,169 @@
+"""Сборка тел bulk-запросов в формате NDJSON.
+
+Если установлен orjson, документы сериализуются им сразу в bytes,
+иначе - стандартным json с настройками по умолчанию (самый быстрый путь
+его C-ускорителя).
+"""
+import json
+from typing import Any, Callable, Iterable
+
+from loader.batching import BulkEntry
+from transformer.pg_to_elastic import DELETED_FIELD, RENAMED_PERSONS_FIELD
+
+try:
+    import orjson  # noqa: WPS433
+except ImportError:
+    orjson = None  # noqa: WPS440
+
+JsonDumps = Callable[[Any], bytes]
+
+# заменяет имена персон по id в списках персон и пересобирает списки имён;
+# если имена не изменились, документ не переиндексируется
+RENAME_PERSONS_SCRIPT = """
+boolean changed = false;
+for (String field : params.fields) {
+  def persons = ctx._source[field];
+  if (persons == null) {
+    continue;
+  }
+  List names = new ArrayList();
+  for (def person : persons) {
+    String name = params.names[person.id];
+    if (name != null && !name.equals(person.name)) {
+      person.name = name;
+      changed = true;
+    }
+    names.add(person.name);
+  }
+  ctx._source[field + '_names'] = names;
+}
+if (!changed) {
+  ctx.op = 'noop';
+}
+"""
+# списки персон документа, в которых имена хранятся вместе с id
+RENAMED_FIELDS = ('actors', 'writers')
+# повторы скрипта при конфликте версий с одновременной записью документа
+RETRY_ON_CONFLICT = 3
+
+
+def dumps_stdlib(json_object: Any) -> bytes:
+    """Сериализует объект стандартным json.
+
+    Args:
+        json_object: сериализуемый объект
+
+    Returns:
+        JSON в байтах
+    """
+    return json.dumps(json_object).encode('utf-8')
+
+
+dumps_json: JsonDumps = dumps_stdlib if orjson is None else orjson.dumps
+
+
+class BulkBodyBuilder:
+    """Оборачивает документы индекса в действия bulk-формата.
+
+    Начала строк действий index, delete и update с наименованием индекса
+    собираются один раз, для каждого документа дописываются только его id
+    и тело.
+    """
+
+    def __init__(self, index_name: str, dumps: JsonDumps = dumps_json):
+        """Подготавливает заголовок действия для индекса.
+
+        Args:
+            index_name: наименование индекса
+            dumps: функция сериализации в JSON-байты
+        """
+        self._dumps = dumps
+        self._action_prefix = b''.join((
+            b'{"index":{"_index":',
+            dumps(index_name),
+            b',"_id":',
+        ))
+        self._delete_prefix = b''.join((
+            b'{"delete":{"_index":',
+            dumps(index_name),
+            b',"_id":',
+        ))
+        self._update_prefix = b''.join((
+            b'{"update":{"_index":',
+            dumps(index_name),
+            b',"retry_on_conflict":',
+            dumps(RETRY_ON_CONFLICT),
+            b',"_id":',
+        ))
+
+    def entry(self, document: dict[str, Any]) -> BulkEntry:
+        """Оборачивает документ в строки действия bulk-формата.
+
+        Документ удаления становится действием delete без тела, документ
+        частичного обновления - действием update со скриптом
+        переименования персон.
+
+        Args:
+            document: документ индекса
+
+        Returns:
+            запись bulk-запроса
+        """
+        doc_id = document.get('id')
+        if document.get(DELETED_FIELD):
+            return BulkEntry.from_lines(
+                doc_id,
+                b''.join((self._delete_prefix, self._dumps(doc_id), b'}}\n')),
+            )
+        renamed_persons = document.get(RENAMED_PERSONS_FIELD)
+        if renamed_persons is not None:
+            return self._update_entry(doc_id, renamed_persons)
+        return BulkEntry.from_lines(
+            doc_id,
+            b''.join((
+                self._action_prefix,
+                self._dumps(doc_id),
+                b'}}\n',
+                self._dumps(document),
+                b'\n',
+            )),
+        )
+
+    def _update_entry(self, doc_id: str, names: dict[str, str]) -> BulkEntry:
+        """Формирует действие update со скриптом переименования персон.
+
+        Args:
+            doc_id: id документа
+            names: новые имена персон по их id
+
+        Returns:
+            запись bulk-запроса
+        """
+        script = {
+            'script': {
+                'source': RENAME_PERSONS_SCRIPT,
+                'lang': 'painless',
+                'params': {'fields': RENAMED_FIELDS, 'names': names},
+            },
+        }
+        return BulkEntry.from_lines(
+            doc_id,
+            b''.join((
+                self._update_prefix,
+                self._dumps(doc_id),
+                b'}}\n',
+                self._dumps(script),
+                b'\n',
+            )),
+        )
+
+    def body(self, documents: Iterable[dict[str, Any]]) -> bytes:
+        """Собирает тело bulk-запроса из документов.
+
+        Args:
+            documents: документы индекса
+
+        Returns:
+            тело запроса в формате NDJSON
+        """
+        return b''.join(self.entry(document).lines for document in documents)
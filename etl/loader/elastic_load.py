@@ -1,27 +1,75 @@
 """Модуль, отвечающий за загрузку данных в elastic search."""
-import json
 import logging
-from typing import Any
+from time import sleep
+from typing import Any, Optional
 
+from common import metrics
 from common.state_processor import State
+from config import settings
 from db.elastic import ElasticClient
+from loader.batching import AdaptiveBulkSize, BulkEntry, split_bulk
+from loader.bulk_body import BulkBodyBuilder
+from loader.failures import BulkFailure, DeadLetterFile, collect_failures
+from loader.hashes import HashStore
+from transformer.pg_to_elastic import is_action_document
 
 logger = logging.getLogger(__name__)
 
 
-class ElasticLoader:
+class ElasticLoader:  # noqa: WPS214
     """Загружает чанк данных в Elastic Search."""
 
-    def __init__(self, url: str, index_name: str):
+    def __init__(
+        self,
+        url: str,
+        index_name: str,
+        keep_payload: Optional[bool] = None,
+    ):
         """Настраивает параметры работы с elastic.
 
         Args:
             url: базовый адрес доступа к elastic search API
             index_name: наименование индекса для сохранения данных
+            keep_payload: хранить документы в состоянии, None - из настроек
         """
+        if keep_payload is None:
+            keep_payload = settings.keep_payload_in_state
+        self._keep_payload = keep_payload
         self.elastic = ElasticClient(url, index_name)
-        self._index_name = index_name
         self._state = State('elastic_load')
+        if not settings.keep_payload_in_state and self._state.get('data'):
+            # документы, сохранённые прежним запуском в режиме payload;
+            # состояние общее с main.py, поэтому решают его настройки
+            self._state['data'] = None
+        self._init_bulk(index_name)
+
+    def close(self):
+        """Закрывает базу хешей загруженных документов."""
+        if self._hashes is not None:
+            self._hashes.close()
+
+    def _init_bulk(self, index_name: str):
+        """Готовит общие для клиентов elastic части загрузки.
+
+        Args:
+            index_name: наименование индекса для сохранения данных
+        """
+        self._index_name = index_name
+        self._bulk_body = BulkBodyBuilder(index_name)
+        self._bulk_size = AdaptiveBulkSize(
+            initial_bytes=settings.bulk_initial_bytes,
+            min_bytes=settings.bulk_min_bytes,
+            max_bytes=settings.bulk_max_bytes,
+            target_latency=settings.bulk_target_latency,
+        )
+        self._dead_letter = DeadLetterFile(
+            settings.storage_dir / settings.dead_letter_file,
+        )
+        self._hashes = None
+        if settings.elastic_skip_unchanged:
+            self._hashes = HashStore(
+                settings.storage_dir / settings.hash_store_file,
+            )
 
     def load(self, elastic_data: list[dict[str, Any]]) -> list[str]:
         """Метод пакетной загрузки в индекс elastic search.
@@ -32,42 +80,258 @@ class ElasticLoader:
         Returns:
             Ответы системы elastic search на размещение данных в индексе.
         """
-        answers = []
+        if not self._keep_payload:
+            return self._send_data(elastic_data)
 
+        answers = []
         cached_data = self._state.get('data')
         if cached_data:
-            answers.append(self._send_data(cached_data))
+            answers.extend(self._send_data(cached_data))
 
         self._state['data'] = elastic_data
-        answers.append(self._send_data(elastic_data))
+        answers.extend(self._send_data(elastic_data))
         self._state['data'] = None
 
         return answers
 
     def _send_data(self, elastic_data):
-        bulk_string = self._get_bulk_body(elastic_data)
-        answer = self.elastic.post_bulk(bulk_string)
+        """Отправляет документы, повторяя только не принятые elastic.
+
+        Документы, отклонённые из-за временных ошибок (перегрузка, 5xx),
+        отправляются повторно с растущим таймаутом, но не больше
+        bulk_max_retries раз. Остальные ошибки и исчерпанные повторы
+        записываются в журнал неустранимых ошибок.
+
+        Документы, уже загруженные в индекс с тем же содержимым, не
+        отправляются; хеши сохраняются только для принятых документов.
+
+        Args:
+            elastic_data: документы для индексации
+
+        Returns:
+            ответы elastic на все отправленные запросы
+        """
+        changed = self._changed_hashes(elastic_data)
+        pending = self._pending_entries(elastic_data, changed)
+        answers = []
+        rejected = self._send_pending(pending, answers)
+        if changed:
+            self._remember_accepted(changed, rejected)
+        return answers
+
+    def _pending_entries(
+        self,
+        elastic_data,
+        changed: Optional[dict[str, str]],
+    ) -> list[BulkEntry]:
+        """Оборачивает в bulk-формат документы, которые нужно отправить.
+
+        Args:
+            elastic_data: документы для индексации
+            changed: хеши изменённых документов, None - отправить все
+
+        Returns:
+            записи для отправки; документы удаления и частичного
+            обновления отправляются всегда
+        """
+        return [
+            self._bulk_body.entry(entry)
+            for entry in elastic_data
+            if changed is None
+            or is_action_document(entry)
+            or str(entry['id']) in changed
+        ]
+
+    def _send_pending(self, pending: list[BulkEntry], answers: list) -> set:
+        """Отправляет записи, пока остаются документы для повтора.
+
+        Args:
+            pending: записи для отправки
+            answers: список, в который добавляются ответы elastic
+
+        Returns:
+            id документов, которые elastic так и не принял
+        """
+        rejected = set()
+        attempt = 0
+        while pending:
+            failures = self._send_entries(pending, answers)
+            pending = self._handle_failures(failures, attempt)
+            self._track_rejected(rejected, failures, pending)
+            if pending:
+                sleep(self._retry_delay(attempt))
+                attempt += 1
+        return rejected
+
+    def _track_rejected(
+        self,
+        rejected: set,
+        failures: list[BulkFailure],
+        retry: list[BulkEntry],
+    ):
+        """Отмечает документы, которые elastic не принял после попытки.
+
+        Args:
+            rejected: id не принятых документов, дополняется
+            failures: не принятые в этой попытке документы
+            retry: документы, которые будут отправлены повторно
+        """
+        rejected.update(str(failure.entry.doc_id) for failure in failures)
+        rejected.difference_update(str(entry.doc_id) for entry in retry)
+
+    def _remember_accepted(self, changed: dict[str, str], rejected: set):
+        """Сохраняет хеши документов, принятых elastic.
+
+        Args:
+            changed: хеши отправленных документов по id
+            rejected: id документов, которые elastic не принял
+        """
+        self._hashes.remember(self._index_name, {
+            doc_id: doc_hash
+            for doc_id, doc_hash in changed.items()
+            if doc_id not in rejected
+        })
+
+    def _changed_hashes(self, elastic_data) -> Optional[dict[str, str]]:
+        """Отбирает документы, изменившиеся с последней загрузки.
+
+        Хеши считаются только для полных документов. После удаления или
+        частичного обновления сохранённый хеш уже не описывает документ
+        в индексе, поэтому он удаляется.
+
+        Args:
+            elastic_data: документы для индексации
+
+        Returns:
+            хеши изменённых полных документов по id или None, если пропуск
+            неизменённых документов выключен
+        """
+        if self._hashes is None:
+            return None
+        documents = []
+        action_ids = []
+        for document in elastic_data:
+            if is_action_document(document):
+                action_ids.append(str(document['id']))
+            else:
+                documents.append(document)
+        self._hashes.forget(self._index_name, action_ids)
+        changed = self._hashes.changed(self._index_name, documents)
+        skipped = len(documents) - len(changed)
+        metrics.documents.inc('skipped', amount=skipped)
+        if skipped:
+            logger.info(
+                'Пропущено неизменённых документов: {0}'.format(skipped),
+            )
+        return changed
+
+    def _send_entries(
+        self,
+        entries: list[BulkEntry],
+        answers: list,
+    ) -> list[BulkFailure]:
+        """Отправляет записи запросами целевого размера.
+
+        Args:
+            entries: записи для отправки
+            answers: список, в который добавляются ответы elastic
+
+        Returns:
+            не принятые документы
+        """
+        failures = []
+        batches = split_bulk(entries, self._bulk_size, settings.bulk_max_docs)
+        for batch in batches:
+            answers.append(self._send_batch(batch, failures))
+        return failures
+
+    def _send_batch(self, batch: list[BulkEntry], failures: list):
+        """Отправляет один bulk-запрос и собирает не принятые документы.
+
+        Args:
+            batch: записи запроса
+            failures: список, в который добавляются не принятые документы
+
+        Returns:
+            ответ elastic
+        """
+        answer = self.elastic.post_bulk(
+            b''.join(entry.lines for entry in batch),
+        )
+        failures.extend(self._check_answer(batch, answer))
+        return answer
+
+    def _check_answer(self, batch: list[BulkEntry], answer) -> list:
+        """Разбирает ответ на bulk-запрос и подстраивает размер запросов.
+
+        Args:
+            batch: записи запроса
+            answer: ответ elastic
+
+        Returns:
+            не принятые документы
+        """
+        batch_failures = collect_failures(batch, answer)
+        metrics.documents.inc('sent', amount=len(batch))
+        if any(failure.is_throttled for failure in batch_failures):
+            self._bulk_size.throttle()
+        elif not batch_failures:
+            self._bulk_size.observe(
+                sum(entry.size for entry in batch),
+                answer.elapsed.total_seconds(),
+            )
         logger.info(
-            'Отправлено в elastic: код {0}, размер {1}, ошибки: "{2}"'.format(
-                answer, len(elastic_data), answer.json().get('errors'),
+            'Отправлено в elastic: код {0}, размер {1}, ошибки: {2}'.format(
+                answer, len(batch), len(batch_failures),
             ),
         )
-        return answer
+        return batch_failures
+
+    def _handle_failures(
+        self,
+        failures: list[BulkFailure],
+        attempt: int,
+    ) -> list[BulkEntry]:
+        """Отбирает документы для повтора, остальные пишет в журнал.
 
-    def _get_bulk_body(self, data_object: list[dict]) -> str:
-        return '\n'.join(
-            [
-                self._wrap_bulk_entry(entry)
-                for entry in data_object
-            ],
-        ) + '\n'
-
-    def _wrap_bulk_entry(self, entry):
-        return (
-            '{{"index": {{"_index": "{index}", "_id": "{entry_id}"}}}}\n'
-            + '{entry_json}'
-        ).format(
-            index=self._index_name,
-            entry_id=entry.get('id'),
-            entry_json=json.dumps(entry),
+        Args:
+            failures: не принятые документы
+            attempt: номер завершённой попытки, начиная с 0
+
+        Returns:
+            документы для повторной отправки
+        """
+        can_retry = attempt < settings.bulk_max_retries
+        retry = [
+            failure.entry
+            for failure in failures
+            if failure.retryable and can_retry
+        ]
+        dead = [
+            failure
+            for failure in failures
+            if not (failure.retryable and can_retry)
+        ]
+        if dead:
+            logger.error(
+                'Документы не приняты elastic и записаны в журнал: {0}'.format(
+                    len(dead),
+                ),
+            )
+            self._dead_letter.write(dead)
+            metrics.documents.inc('failed', amount=len(dead))
+        return retry
+
+    def _retry_delay(self, attempt: int) -> float:
+        """Возвращает паузу перед повтором с экспоненциальным ростом.
+
+        Args:
+            attempt: номер завершённой попытки, начиная с 0
+
+        Returns:
+            время ожидания, в секундах
+        """
+        return min(
+            settings.bulk_retry_start_sleep * (2 ** attempt),
+            settings.bulk_retry_max_sleep,
         )
@@ -0,0 +1,197 @@
+"""Разбор ошибок bulk-запросов и журнал неустранимых ошибок."""
+import json
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http import HTTPStatus
+from pathlib import Path
+
+from loader.batching import BulkEntry
+from requests import Response
+
+# ошибки, после которых elastic может принять документ при повторе
+RETRYABLE_ERROR_TYPES = frozenset((
+    'es_rejected_execution_exception',
+    'circuit_breaking_exception',
+    'unavailable_shards_exception',
+))
+# коды ответа на запрос целиком, при которых повторяется каждый документ
+RETRYABLE_REQUEST_STATUSES = frozenset((
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT,
+))
+# update документа, которого ещё нет в индексе: film_work будет загружен
+# полностью по изменению своей записи, в которой уже есть новые данные
+MISSING_DOCUMENT_ERROR_TYPE = 'document_missing_exception'
+# журнал может дописываться загрузчиками нескольких потоков
+_write_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class BulkFailure:
+    """Документ, который elastic не принял."""
+
+    entry: BulkEntry
+    status: int
+    reason: str
+    retryable: bool
+
+    @property
+    def is_throttled(self) -> bool:
+        """Проверяет, отклонён ли документ из-за перегрузки elastic.
+
+        Returns:
+            флаг отказа из-за перегрузки
+        """
+        return self.status == HTTPStatus.TOO_MANY_REQUESTS
+
+
+def is_retryable(status: int, error_type: str = '') -> bool:
+    """Проверяет, имеет ли смысл повторять отправку документа.
+
+    Args:
+        status: код результата действия
+        error_type: тип ошибки elastic
+
+    Returns:
+        флаг временной ошибки
+    """
+    return (
+        status == HTTPStatus.TOO_MANY_REQUESTS
+        or status >= HTTPStatus.INTERNAL_SERVER_ERROR
+        or error_type in RETRYABLE_ERROR_TYPES
+    )
+
+
+def collect_failures(
+    batch: list[BulkEntry],
+    answer: Response,
+) -> list[BulkFailure]:
+    """Сопоставляет результаты действий из ответа с записями запроса.
+
+    Elastic возвращает результаты в порядке действий запроса. Частичное
+    обновление отсутствующего документа ошибкой не считается.
+
+    Args:
+        batch: записи отправленного запроса
+        answer: ответ elastic
+
+    Returns:
+        не принятые документы с причинами
+    """
+    if answer.status_code != HTTPStatus.OK:
+        return _collect_request_failures(batch, answer)
+
+    answer_json = answer.json()
+    if not answer_json.get('errors'):
+        return []
+    action_results = (
+        next(iter(item.values()))
+        for item in answer_json['items']
+    )
+    return [
+        _item_failure(entry, action_result)
+        for entry, action_result in zip(batch, action_results)
+        if _is_error(action_result)
+    ]
+
+
+def _is_error(action_result: dict) -> bool:
+    """Проверяет, не принял ли elastic действие.
+
+    Args:
+        action_result: результат действия из ответа elastic
+
+    Returns:
+        флаг ошибки
+    """
+    error = action_result.get('error')
+    if isinstance(error, dict):
+        return error.get('type') != MISSING_DOCUMENT_ERROR_TYPE
+    return bool(error)
+
+
+def _collect_request_failures(
+    batch: list[BulkEntry],
+    answer: Response,
+) -> list[BulkFailure]:
+    """Отмечает все записи не принятыми, если запрос отклонён целиком.
+
+    Args:
+        batch: записи отправленного запроса
+        answer: ответ elastic
+
+    Returns:
+        не принятые документы с причинами
+    """
+    retryable = answer.status_code in RETRYABLE_REQUEST_STATUSES
+    reason = 'HTTP {0}: {1}'.format(answer.status_code, answer.text)
+    return [
+        BulkFailure(entry, answer.status_code, reason, retryable)
+        for entry in batch
+    ]
+
+
+def _item_failure(entry: BulkEntry, action_result: dict) -> BulkFailure:
+    """Формирует ошибку отдельного действия.
+
+    Args:
+        entry: запись действия
+        action_result: результат действия из ответа elastic
+
+    Returns:
+        не принятый документ с причиной
+    """
+    status = action_result['status']
+    error = action_result['error']
+    if not isinstance(error, dict):
+        return BulkFailure(entry, status, str(error), is_retryable(status))
+    error_type = error.get('type', '')
+    reason = '{0}: {1}'.format(error_type, error.get('reason'))
+    return BulkFailure(
+        entry,
+        status,
+        reason,
+        is_retryable(status, error_type),
+    )
+
+
+class DeadLetterFile:
+    """Дописывает неустранимо не принятые документы в файл JSON Lines.
+
+    Каждая строка содержит причину отказа и исходные строки bulk-формата,
+    так что документы можно отправить повторно вручную.
+    """
+
+    def __init__(self, path: Path):
+        """Задаёт файл журнала.
+
+        Args:
+            path: путь к файлу журнала
+        """
+        self._path = path
+
+    def write(self, failures: list[BulkFailure]):
+        """Дописывает документы в журнал.
+
+        Args:
+            failures: не принятые документы с причинами
+        """
+        failed_at = datetime.now(timezone.utc).isoformat()
+        records = ''.join(
+            '{0}\n'.format(json.dumps({
+                'failed_at': failed_at,
+                'id': failure.entry.doc_id,
+                'status': failure.status,
+                'reason': failure.reason,
+                'bulk': failure.entry.lines.decode('utf-8'),
+            }))
+            for failure in failures
+        )
+        with _write_lock:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self._path, 'a') as dead_letter:
+                dead_letter.write(records)
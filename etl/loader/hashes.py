@@ -0,0 +1,218 @@
+"""Хеши проиндексированных документов для пропуска неизменённых.
+
+Хеш считается по каноническому JSON документа: ключи упорядочены,
+списки отсортированы (порядок жанров и персон в документе не значим и
+зависит от порядка рядов в выборке). Хеши хранятся в SQLite по паре
+индекс - id документа и записываются только после того, как elastic
+принял документ.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Iterable
+
+CREATE_TABLE_QUERY = """
+    CREATE TABLE IF NOT EXISTS document_hash (
+        index_name TEXT NOT NULL,
+        id TEXT NOT NULL,
+        hash TEXT NOT NULL,
+        PRIMARY KEY (index_name, id)
+    ) WITHOUT ROWID
+"""
+SELECT_HASHES_QUERY = """
+    SELECT id, hash FROM document_hash
+    WHERE index_name = ? AND id IN ({placeholders})
+"""
+UPSERT_HASH_QUERY = """
+    INSERT INTO document_hash (index_name, id, hash) VALUES (?, ?, ?)
+    ON CONFLICT (index_name, id) DO UPDATE SET hash = excluded.hash
+"""
+DELETE_HASHES_QUERY = """
+    DELETE FROM document_hash
+    WHERE index_name = ? AND id IN ({placeholders})
+"""
+DELETE_INDEX_QUERY = 'DELETE FROM document_hash WHERE index_name = ?'
+MOVE_INDEX_QUERY = """
+    UPDATE document_hash SET index_name = ? WHERE index_name = ?
+"""
+
+# ограничение SQLite на количество параметров запроса
+_MAX_PARAMS = 900
+# размер хеша в байтах: 128 бит достаточно, чтобы не было совпадений
+_DIGEST_SIZE = 16
+# ожидание блокировки базы другим процессом, в секундах
+_BUSY_TIMEOUT = 30
+
+
+def _canonical(json_value: Any) -> Any:
+    """Приводит значение к виду, не зависящему от порядка элементов.
+
+    Args:
+        json_value: значение документа
+
+    Returns:
+        значение с отсортированными списками
+    """
+    if isinstance(json_value, Mapping):
+        return {key: _canonical(item) for key, item in json_value.items()}
+    if isinstance(json_value, (list, tuple, set, frozenset)):
+        return sorted(
+            (_canonical(item) for item in json_value),
+            key=_dumps,
+        )
+    return json_value
+
+
+def _dumps(json_value: Any) -> str:
+    """Сериализует значение с упорядоченными ключами.
+
+    Args:
+        json_value: значение документа
+
+    Returns:
+        строка JSON
+    """
+    return json.dumps(
+        json_value,
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+
+
+def document_hash(document: dict[str, Any]) -> str:
+    """Считает хеш содержимого документа.
+
+    Args:
+        document: документ индекса
+
+    Returns:
+        шестнадцатеричный хеш
+    """
+    canonical = _dumps(_canonical(document)).encode('utf-8')
+    return hashlib.blake2b(canonical, digest_size=_DIGEST_SIZE).hexdigest()
+
+
+class HashStore:
+    """Хеши документов, принятых elastic, по индексам.
+
+    Подключение общее для потоков загрузчика и защищено блокировкой;
+    несколько процессов работают с базой через журнал WAL.
+    """
+
+    def __init__(self, file_path: Path):
+        """Открывает базу хешей, создавая её при необходимости.
+
+        Args:
+            file_path: путь к файлу SQLite
+        """
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            str(file_path),
+            timeout=_BUSY_TIMEOUT,
+            check_same_thread=False,
+        )
+        with self._connection:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(CREATE_TABLE_QUERY)
+
+    def changed(
+        self,
+        index_name: str,
+        documents: Iterable[dict[str, Any]],
+    ) -> dict[str, str]:
+        """Отбирает документы, содержимое которых отличается от индекса.
+
+        Args:
+            index_name: индекс, в который загружаются документы
+            documents: документы индекса
+
+        Returns:
+            хеши изменённых документов по их id
+        """
+        hashes = {
+            str(document['id']): document_hash(document)
+            for document in documents
+        }
+        stored = self._stored(index_name, list(hashes))
+        return {
+            doc_id: doc_hash
+            for doc_id, doc_hash in hashes.items()
+            if stored.get(doc_id) != doc_hash
+        }
+
+    def remember(self, index_name: str, hashes: dict[str, str]):
+        """Сохраняет хеши документов, принятых elastic.
+
+        Args:
+            index_name: индекс, в который загружены документы
+            hashes: хеши документов по их id
+        """
+        rows = [
+            (index_name, doc_id, doc_hash)
+            for doc_id, doc_hash in hashes.items()
+        ]
+        with self._lock:
+            with self._connection:
+                self._connection.executemany(UPSERT_HASH_QUERY, rows)
+
+    def forget(self, index_name: str, doc_ids: list[str]):
+        """Удаляет хеши документов, содержимое которых в индексе неизвестно.
+
+        Следующий полный документ с этим id будет отправлен в любом случае.
+
+        Args:
+            index_name: индекс документов
+            doc_ids: id документов
+        """
+        with self._lock:
+            with self._connection:
+                for start in range(0, len(doc_ids), _MAX_PARAMS):
+                    chunk = doc_ids[start:start + _MAX_PARAMS]
+                    query = DELETE_HASHES_QUERY.format(
+                        placeholders=', '.join('?' * len(chunk)),
+                    )
+                    self._connection.execute(query, (index_name, *chunk))
+
+    def move(self, source: str, target: str):
+        """Переносит хеши одного индекса на другое имя.
+
+        Прежние хеши target удаляются.
+
+        Args:
+            source: индекс, хеши которого переносятся
+            target: новое имя индекса, например алиас
+        """
+        with self._lock:
+            with self._connection:
+                self._connection.execute(DELETE_INDEX_QUERY, (target,))
+                self._connection.execute(MOVE_INDEX_QUERY, (target, source))
+
+    def close(self):
+        """Закрывает подключение к базе."""
+        self._connection.close()
+
+    def _stored(self, index_name: str, doc_ids: list[str]) -> dict[str, str]:
+        """Читает сохранённые хеши документов.
+
+        Args:
+            index_name: индекс документов
+            doc_ids: id документов
+
+        Returns:
+            хеши по id для документов, которые уже есть в базе
+        """
+        stored = {}
+        with self._lock:
+            for start in range(0, len(doc_ids), _MAX_PARAMS):
+                chunk = doc_ids[start:start + _MAX_PARAMS]
+                query = SELECT_HASHES_QUERY.format(
+                    placeholders=', '.join('?' * len(chunk)),
+                )
+                stored.update(
+                    self._connection.execute(query, (index_name, *chunk)),
+                )
+        return stored
@@ -0,0 +1,211 @@
+"""Управление версиями индекса и алиасом, через который он используется.
+
+Документы хранятся в версионированных индексах {alias}_v{n}, а поиск и
+инкрементальная загрузка обращаются к алиасу settings.elastic_index,
+который указывает ровно на одну версию. Новая версия строится рядом с
+текущей и подменяет её одним атомарным запросом _aliases.
+"""
+import json
+import logging
+import re
+from typing import Iterable, Iterator, Optional
+
+from config import settings
+from db.elastic import ElasticClient
+
+logger = logging.getLogger(__name__)
+
+# сколько предыдущих версий хранить после переключения для отката
+KEEP_PREVIOUS_VERSIONS = 1
+
+
+def load_schema() -> dict:
+    """Читает настройки и маппинг индекса.
+
+    Returns:
+        тело запроса создания индекса
+    """
+    schema_path = settings.base_dir / 'schema' / settings.elastic_schema_file
+    with open(schema_path) as schema_file:
+        return json.load(schema_file)
+
+
+class IndexManager:  # noqa: WPS214
+    """Создаёт версии индекса и переключает на них алиас."""
+
+    def __init__(self, alias: Optional[str] = None):
+        """Задаёт алиас индекса.
+
+        Args:
+            alias: алиас, по умолчанию - settings.elastic_index
+        """
+        self.alias = alias or settings.elastic_index
+        self._elastic = ElasticClient(settings.elastic_url, self.alias)
+        self._version_pattern = re.compile(
+            r'^{0}_v(\d+)$'.format(re.escape(self.alias)),
+        )
+
+    def ensure_alias(self):
+        """Создаёт первую версию индекса и алиас, если их ещё нет.
+
+        Индекс с именем алиаса, созданный прежними версиями ETL,
+        продолжает использоваться до первой переиндексации.
+        """
+        if self.alias_indices() or self._is_legacy_index():
+            return
+        index_name = self.create_version()
+        self.switch_alias(index_name)
+
+    def alias_indices(self) -> list[str]:
+        """Возвращает индексы, на которые указывает алиас.
+
+        Returns:
+            имена индексов
+        """
+        answer = self._elastic.request('GET', '_alias/{0}'.format(self.alias))
+        return sorted(answer or {})
+
+    def create_version(self, index_settings: Optional[dict] = None) -> str:
+        """Создаёт следующую версию индекса по схеме.
+
+        Args:
+            index_settings: настройки, заменяющие настройки схемы
+
+        Returns:
+            имя созданного индекса
+        """
+        version = max(self._versions(), default=0) + 1
+        index_name = '{0}_v{1}'.format(self.alias, version)
+        schema = load_schema()
+        schema['settings'].update(index_settings or {})
+        self._elastic.request('PUT', index_name, schema)
+        logger.info('Создан индекс {0}'.format(index_name))
+        return index_name
+
+    def finish_bulk_load(self, index_name: str, setting_names: Iterable[str]):
+        """Возвращает настройки из схемы и обновляет поиск по индексу.
+
+        Args:
+            index_name: имя индекса
+            setting_names: настройки, изменённые на время загрузки
+        """
+        schema_settings = load_schema()['settings']
+        self._elastic.request(
+            'PUT',
+            '{0}/_settings'.format(index_name),
+            {'index': {
+                setting: schema_settings.get(setting)
+                for setting in setting_names
+            }},
+        )
+        self.refresh(index_name)
+
+    def refresh(self, index_name: str):
+        """Делает загруженные документы доступными для поиска.
+
+        Args:
+            index_name: имя индекса
+        """
+        self._elastic.request('POST', '{0}/_refresh'.format(index_name))
+
+    def count(self, index_name: str) -> int:
+        """Считает документы индекса.
+
+        Args:
+            index_name: имя индекса
+
+        Returns:
+            количество документов
+        """
+        answer = self._elastic.request('GET', '{0}/_count'.format(index_name))
+        return answer['count']
+
+    def iter_ids(self, index_name: str, batch_size: int) -> Iterator[list]:
+        """Перебирает id документов индекса блоками по возрастанию.
+
+        Страницы читаются через search_after по полю id, поэтому удаление
+        уже прочитанных документов не сдвигает следующие страницы.
+
+        Args:
+            index_name: имя индекса
+            batch_size: количество id в блоке
+
+        Yields:
+            id документов блока
+        """
+        body: dict = {'size': batch_size, '_source': False, 'sort': ['id']}
+        while True:
+            answer = self._elastic.request(
+                'POST',
+                '{0}/_search'.format(index_name),
+                body,
+            )
+            hits = answer['hits']['hits']
+            if not hits:
+                return
+            yield [hit['_id'] for hit in hits]
+            body['search_after'] = hits[-1]['sort']
+
+    def switch_alias(self, index_name: str):
+        """Атомарно переключает алиас на индекс и удаляет старые версии.
+
+        Args:
+            index_name: имя индекса
+        """
+        actions: list[dict] = [
+            {'remove': {'index': old_index, 'alias': self.alias}}
+            for old_index in self.alias_indices()
+            if old_index != index_name
+        ]
+        if self._is_legacy_index():
+            # индекс с именем алиаса удаляется в том же запросе
+            actions.append({'remove_index': {'index': self.alias}})
+        actions.append({'add': {'index': index_name, 'alias': self.alias}})
+        self._elastic.request('POST', '_aliases', {'actions': actions})
+        logger.info('Алиас {0} переключён на {1}'.format(
+            self.alias,
+            index_name,
+        ))
+        self._delete_old_versions(index_name)
+
+    def _versions(self) -> dict[int, str]:
+        """Находит существующие версии индекса.
+
+        Returns:
+            имена индексов по номерам версий
+        """
+        answer = self._elastic.request(
+            'GET',
+            '_cat/indices/{0}_v*?format=json&h=index'.format(self.alias),
+        )
+        versions = {}
+        for index_row in answer or []:
+            version_match = self._version_pattern.match(index_row['index'])
+            if version_match:
+                versions[int(version_match.group(1))] = index_row['index']
+        return versions
+
+    def _is_legacy_index(self) -> bool:
+        """Проверяет, занято ли имя алиаса обычным индексом.
+
+        Returns:
+            флаг, существует ли индекс с именем алиаса
+        """
+        answer = self._elastic.request('GET', self.alias)
+        return bool(answer) and self.alias in answer
+
+    def _delete_old_versions(self, index_name: str):
+        """Удаляет версии старше KEEP_PREVIOUS_VERSIONS предыдущих.
+
+        Args:
+            index_name: имя текущей версии
+        """
+        old_versions = [
+            old_index
+            for _, old_index in sorted(self._versions().items())
+            if old_index != index_name
+        ]
+        stale_count = len(old_versions) - KEEP_PREVIOUS_VERSIONS
+        for old_index in old_versions[:max(stale_count, 0)]:
+            self._elastic.request('DELETE', old_index)
+            logger.info('Удалён индекс {0}'.format(old_index))
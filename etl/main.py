@@ -2,31 +2,45 @@
 import logging
 from time import sleep
 
+from common.metrics_server import start_metrics_server
 from config import settings
-from extractor.pg_extract import PostgresExtractor
-from loader.elastic_load import ElasticLoader
+from extractor.pg_extract import create_keyset_indexes
+from extractor.tombstones import install_tombstones
+from loader.indices import IndexManager
 from logger.log_config import setup_logging
-from transformer.pg_to_elastic import PostgresElasticTransformer
+from runner import async_pipeline, capture, parallel, sequential, threaded
 
 setup_logging()
 
 logger = logging.getLogger(__name__)
 
+runners = {
+    'sequential': sequential.run_pass,
+    'threaded': threaded.run_pass,
+    'parallel': parallel.run_pass,
+    'async': async_pipeline.run_pass,
+}
+
 
 if __name__ == '__main__':
     logger.info('Скрипт запущен')
+    if settings.metrics_port:
+        start_metrics_server(settings.metrics_host, settings.metrics_port)
+    if settings.elastic_manage_index:
+        IndexManager().ensure_alias()
+    if settings.pg_track_deletes:
+        install_tombstones()
+    if settings.pg_create_keyset_indexes:
+        create_keyset_indexes()
+    run_pass = runners[settings.runner]
+    if settings.change_capture != 'polling':
+        capture.run_forever(run_pass, settings.change_capture)
+    if settings.runner == 'async':
+        # подключения и цикл событий общие для всех проходов
+        async_pipeline.run_forever()
     while True:  # noqa: WPS457
         logger.info('Процесс обновления запущен...')
-        pg_extractor = PostgresExtractor(chunk_size=settings.chunk_size)
-        pg_elastic_transformer = PostgresElasticTransformer()
-        elastic_loader = ElasticLoader(
-            settings.elastic_url,
-            settings.elastic_index,
-        )
-        elastic_answers = []
-        for pg_data in pg_extractor.extract():
-            for elastic_data in pg_elastic_transformer.transform(pg_data):
-                elastic_answers.extend(elastic_loader.load(elastic_data))
+        run_pass()
         logger.info(
             'Обновление завершено, ожидаем {0} секунд...'.format(
                 settings.request_interval,
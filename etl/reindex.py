@@ -0,0 +1,19 @@
+"""Полная переиндексация film_work параллельными процессами."""
+import logging
+
+from config import settings
+from extractor.tombstones import install_tombstones
+from logger.log_config import setup_logging
+from runner import reindex
+
+setup_logging()
+
+logger = logging.getLogger(__name__)
+
+
+if __name__ == '__main__':
+    logger.info('Полная переиндексация запущена')
+    if settings.pg_track_deletes:
+        # позиции таблиц, с которых начнётся догрузка, включают журнал
+        install_tombstones()
+    reindex.run()
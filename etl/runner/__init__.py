@@ -0,0 +1 @@
+"""Модуль со способами выполнения одного прохода ETL."""
@@ -0,0 +1,399 @@
+"""Проход ETL на asyncio: asyncpg и aiohttp вместо psycopg2 и requests.
+
+Отслеживаемые таблицы читаются одновременно, каждая своей корутиной, а
+блоки изменений обрабатывают async_concurrency корутин: пока одни ждут
+ответа Postgres, другие ждут elastic. Запросы идут через общий пул
+подключений asyncpg и общую HTTP-сессию, документы собираются тем же
+PostgresElasticTransformer. Позиции таблиц хранятся в том же состоянии,
+что и у PostgresExtractor, и сдвигаются в порядке выгрузки блоков.
+
+Сборка документов и запись состояния выполняются в потоках
+asyncio.to_thread, чтобы не останавливать цикл событий и остальные
+корутины на время вычислений и fsync файла состояния.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from time import time
+
+from common import metrics
+from common.state_processor import State
+from config import settings
+from db import async_elastic, async_postgres, dimensions
+from extractor import cursor, partial_updates, pg_extract
+from loader.async_elastic_load import AsyncElasticLoader
+from runner.workers import ChunkCommitter
+from transformer.pg_to_elastic import PostgresElasticTransformer
+
+logger = logging.getLogger(__name__)
+
+# маркер завершения работы для корутин обработки блоков
+_STOP = object()
+
+
+@dataclass(frozen=True)
+class QueuedChunk:
+    """Блок изменений таблицы в очереди обработки."""
+
+    table: str
+    seq: int
+    film_work_ids: list
+    partial_rows: list
+
+
+class AsyncPipeline:  # noqa: WPS214
+    """Выполняет проходы ETL в цикле событий asyncio."""
+
+    def __init__(self):
+        """Подготавливает состояние, пул подключений и HTTP-сессию."""
+        self._state = State('pg_extractor')
+        watched_tables = pg_extract.PostgresExtractor.watched_tables
+        self._roles: dict[str, str] = dict(watched_tables)
+        self._db = async_postgres.AsyncPostgresQueryWrapper(
+            settings.chunk_size,
+            # подключения обработчиков блоков и читателей таблиц
+            settings.async_concurrency + len(watched_tables),
+        )
+        self._elastic = async_elastic.AsyncElasticClient(settings.elastic_url)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._committers: dict[str, ChunkCommitter] = {}
+
+    async def connect(self):
+        """Открывает подключения к Postgres и elastic."""
+        await self._db.connect()
+        await self._elastic.connect()
+
+    async def close(self):
+        """Закрывает подключения."""
+        await self._db.close()
+        await self._elastic.close()
+
+    async def run_pass(self):
+        """Выполняет проход по всем свежим изменениям."""
+        started_at = time()
+        tables = await self._pass_tables()
+        self._report_lag(list(self._roles))
+        self._committers = {
+            table: ChunkCommitter(self._commit_chunk)
+            for table in tables
+        }
+        self._queue = asyncio.Queue(maxsize=settings.async_concurrency)
+        tasks = [asyncio.create_task(self._read_tables(tables))]
+        tasks.extend(
+            asyncio.create_task(self._process_chunks())
+            for _ in range(settings.async_concurrency)
+        )
+        try:  # noqa: WPS501
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        self._state.checkpoint()
+        # все таблицы прочитаны до конца: изменений до начала прохода нет
+        for table in self._roles:
+            metrics.table_lag.advance(started_at, table)
+
+    async def _pass_tables(self) -> list[str]:
+        """Возвращает таблицы для чтения в этом проходе.
+
+        При первой синхронизации достаточно основной таблицы, а для
+        остальных запоминаются позиции последних изменений. Позиции
+        читаются до транзакции состояния: её блокировка не удерживается
+        на время ожидания запросов.
+
+        Returns:
+            названия таблиц
+        """
+        if self._state.data:
+            return list(self._roles)
+        primary_tables = [
+            table
+            for table, table_role in self._roles.items()
+            if table_role == 'primary'
+        ]
+        secondary_tables = [
+            table for table in self._roles if table not in primary_tables
+        ]
+        last_positions = await asyncio.gather(*(
+            self._last_position(table) for table in secondary_tables
+        ))
+        self._save_positions(dict(zip(secondary_tables, last_positions)))
+        return primary_tables
+
+    def _save_positions(self, positions: dict):
+        """Записывает позиции таблиц одной транзакцией состояния.
+
+        Args:
+            positions: last_modified и id последнего изменения по таблицам,
+                None для пустых таблиц
+        """
+        with self._state.transaction():
+            for table, position in positions.items():
+                # пустая таблица (журнал удалений) читается с начала
+                if position is not None:
+                    self._state[pg_extract.modified_key(table)] = position[0]
+                    self._state[pg_extract.last_id_key(table)] = position[1]
+
+    async def _last_position(self, table: str):
+        """Читает позицию последнего изменения таблицы.
+
+        Args:
+            table: название таблицы
+
+        Returns:
+            last_modified (ISO 8601) и id последнего изменения или None,
+            если таблица пуста
+        """
+        last_row = await self._db.get_last_position(
+            table,
+            cross=self._roles[table] == 'cross',
+        )
+        if last_row is None:
+            return None
+        return last_row['updated_at'].isoformat(), last_row['id']
+
+    async def _read_tables(self, tables: list[str]):
+        """Читает таблицы одновременно и завершает обработчики блоков.
+
+        Args:
+            tables: названия таблиц
+        """
+        await asyncio.gather(*(self._read_table(table) for table in tables))
+        for _ in range(settings.async_concurrency):
+            await self._queue.put(_STOP)
+
+    async def _read_table(self, table: str):
+        """Выгружает блоки изменений таблицы в очередь обработки.
+
+        Args:
+            table: название таблицы
+        """
+        last_modified = pg_extract.to_datetime(
+            self._state.get(
+                pg_extract.modified_key(table),
+                settings.initial_timestamp,
+            ),
+        )
+        chunk_cursor = cursor.ChunkCursor(
+            table=table,
+            last_modified=last_modified.isoformat(),
+            last_id=self._state.get(
+                pg_extract.last_id_key(table),
+                pg_extract.MIN_ID,
+            ),
+        )
+        seq = 0
+        while chunk_cursor:
+            chunk_cursor = await self._read_chunk(chunk_cursor, seq)
+            seq += 1
+
+    async def _read_chunk(self, position: cursor.ChunkCursor, seq: int):
+        """Читает блок изменений таблицы после позиции.
+
+        Args:
+            position: граница предыдущего блока
+            seq: порядковый номер блока в таблице
+
+        Returns:
+            граница прочитанного блока или None, если изменений больше нет
+        """
+        table_rows = await self._db.get_ids_after_time(
+            position.table,
+            pg_extract.to_datetime(position.last_modified),
+            position.last_id,
+            cross=self._roles[position.table] == 'cross',
+        )
+        if not table_rows:
+            return None
+        chunk_cursor = cursor.ChunkCursor(
+            table=position.table,
+            last_modified=table_rows[-1]['updated_at'].isoformat(),
+            last_id=table_rows[-1]['row_id'],
+        )
+        # блокировка подтверждений занята, пока другой поток пишет позицию
+        await asyncio.to_thread(
+            self._committers[position.table].register,
+            seq,
+            chunk_cursor,
+        )
+        await self._queue.put(
+            QueuedChunk(
+                position.table,
+                seq,
+                *await self._film_works(
+                    position.table,
+                    [row['id'] for row in table_rows],
+                ),
+            ),
+        )
+        return chunk_cursor
+
+    async def _film_works(
+        self,
+        table: str,
+        table_ids: list,
+    ) -> tuple[list, list[dict]]:
+        """Сводит изменённые записи таблицы к затронутым film_work.
+
+        Args:
+            table: название таблицы
+            table_ids: id изменённых записей
+
+        Returns:
+            id film_work для полной сборки и ряды частичного обновления
+        """
+        if self._roles[table] != 'related':
+            return table_ids, []
+        dimensions.dimension_cache.invalidate(table, table_ids)
+        if partial_updates.uses_partial_updates(table):
+            return partial_updates.split_person_roles(
+                await self._db.get_person_roles(table_ids),
+            )
+        return await self._db.get_related_film_work_ids(table, table_ids), []
+
+    async def _process_chunks(self):
+        """Загружает блоки из очереди и подтверждает их."""
+        transformer = PostgresElasticTransformer()
+        loader = AsyncElasticLoader(self._elastic, settings.elastic_index)
+        try:  # noqa: WPS501
+            await self._process_queue(transformer, loader)
+        finally:
+            loader.close()
+
+    async def _process_queue(
+        self,
+        transformer: PostgresElasticTransformer,
+        loader: AsyncElasticLoader,
+    ):
+        """Загружает блоки из очереди, пока не придёт маркер завершения.
+
+        Args:
+            transformer: преобразователь корутины
+            loader: загрузчик корутины
+        """
+        while True:  # noqa: WPS457
+            queue_item = await self._queue.get()
+            if queue_item is _STOP:
+                return
+            await self._load_chunk(transformer, loader, queue_item)
+            # подтверждение сохраняет позицию таблицы в состоянии
+            await asyncio.to_thread(
+                self._committers[queue_item.table].acknowledge,
+                queue_item.seq,
+            )
+
+    async def _load_chunk(
+        self,
+        transformer: PostgresElasticTransformer,
+        loader: AsyncElasticLoader,
+        chunk: QueuedChunk,
+    ):
+        """Загружает film_work блока запросами по chunk_size id.
+
+        Частичные обновления блока загружаются первыми.
+
+        Args:
+            transformer: преобразователь корутины
+            loader: загрузчик корутины
+            chunk: блок из очереди
+        """
+        await self._load_rows(transformer, loader, chunk.partial_rows)
+        chunk_size = settings.chunk_size
+        film_work_ids = chunk.film_work_ids
+        for start in range(0, len(film_work_ids), chunk_size):
+            await self._load_rows(
+                transformer,
+                loader,
+                await self._db.get_enriched_rows(
+                    film_work_ids[start:start + chunk_size],
+                ),
+            )
+
+    async def _load_rows(
+        self,
+        transformer: PostgresElasticTransformer,
+        loader: AsyncElasticLoader,
+        bd_data: list[dict],
+    ):
+        """Собирает документы из рядов и загружает их в elastic.
+
+        Наборы документов собираются в потоке по одному: преобразователь
+        между ними может сохранять данные блока в состоянии.
+
+        Args:
+            transformer: преобразователь корутины
+            loader: загрузчик корутины
+            bd_data: ряды расширенных данных или частичного обновления
+        """
+        documents = transformer.transform(bd_data)
+        elastic_data = await asyncio.to_thread(next, documents, None)
+        while elastic_data is not None:
+            await loader.load(elastic_data)
+            elastic_data = await asyncio.to_thread(next, documents, None)
+
+    def _commit_chunk(self, chunk_cursor: cursor.ChunkCursor):
+        """Сдвигает позицию таблицы на границу обработанного блока.
+
+        Args:
+            chunk_cursor: граница обработанного блока
+        """
+        with self._state.transaction():
+            self._state[pg_extract.modified_key(chunk_cursor.table)] = (
+                chunk_cursor.last_modified
+            )
+            self._state[pg_extract.last_id_key(chunk_cursor.table)] = (
+                chunk_cursor.last_id
+            )
+        self._report_lag([chunk_cursor.table])
+
+    def _report_lag(self, tables: list[str]):
+        """Обновляет отставание позиций таблиц для метрик.
+
+        Args:
+            tables: названия таблиц
+        """
+        for table in tables:
+            last_modified = self._state.get(pg_extract.modified_key(table))
+            if last_modified is not None:
+                metrics.table_lag.advance(
+                    pg_extract.to_datetime(last_modified).timestamp(),
+                    table,
+                )
+
+
+async def _run_once():
+    """Открывает подключения и выполняет один проход."""
+    pipeline = AsyncPipeline()
+    await pipeline.connect()
+    try:  # noqa: WPS501
+        await pipeline.run_pass()
+    finally:
+        await pipeline.close()
+
+
+async def _run_periodically():
+    """Выполняет проходы раз в request_interval на общих подключениях."""
+    pipeline = AsyncPipeline()
+    await pipeline.connect()
+    try:  # noqa: WPS501
+        while True:  # noqa: WPS457
+            logger.info('Процесс обновления запущен...')
+            await pipeline.run_pass()
+            logger.info(
+                'Обновление завершено, ожидаем {0} секунд...'.format(
+                    settings.request_interval,
+                ),
+            )
+            await asyncio.sleep(settings.request_interval)
+    finally:
+        await pipeline.close()
+
+
+def run_pass():
+    """Выполняет один проход в новом цикле событий."""
+    asyncio.run(_run_once())
+
+
+def run_forever():
+    """Выполняет проходы по интервалу, не выходя из цикла событий."""
+    asyncio.run(_run_periodically())
@@ -0,0 +1,222 @@
+"""Синхронизация по потоку изменений вместо опроса по интервалу.
+
+Источник изменений сообщает id изменённых записей таблиц content, ETL
+сразу загружает только затронутые film_work. Источник notify получает
+уведомления триггеров через LISTEN/NOTIFY, replication читает слот
+логической репликации с плагином pgoutput. Полный проход выбранным
+способом выполняется, когда источник не может гарантировать, что
+изменения не пропущены: при первом запуске, после потери уведомлений и
+раз в sweep_interval секунд источника.
+"""
+import logging
+from time import monotonic
+from typing import Callable, Iterable, Iterator
+
+from config import settings
+from db.postgres import PostgresQueryWrapper
+from extractor.change_source import ChangeSource
+from extractor.notify import ChangeListener
+from extractor.partial_updates import related_updates
+from extractor.pg_extract import PostgresExtractor
+from extractor.replication import ReplicationStream
+from loader.elastic_load import ElasticLoader
+from transformer.process_pool import create_transformer
+
+logger = logging.getLogger(__name__)
+
+# время одного ожидания изменений у источника без сверочных проходов
+_IDLE_TIMEOUT = 60
+
+sources: dict[str, Callable[[], ChangeSource]] = {
+    'notify': ChangeListener,
+    'replication': ReplicationStream,
+}
+
+
+def group_by_table(changes: list[dict]) -> dict[str, set]:
+    """Группирует id изменённых записей отслеживаемых таблиц.
+
+    Args:
+        changes: изменённые записи с таблицей и id
+
+    Returns:
+        id записей по таблицам
+    """
+    changed_ids: dict[str, set] = {}
+    for change in changes:
+        if change['table'] in PostgresExtractor.watched_tables:
+            changed_ids.setdefault(change['table'], set()).add(
+                change['id'],
+            )
+    return changed_ids
+
+
+def split_chunks(film_work_ids: list) -> Iterator[list]:
+    """Делит id на блоки размером settings.chunk_size.
+
+    Args:
+        film_work_ids: id film_work
+
+    Returns:
+        генератор блоков id
+    """
+    chunk_size = settings.chunk_size
+    return (
+        film_work_ids[start:start + chunk_size]
+        for start in range(0, len(film_work_ids), chunk_size)
+    )
+
+
+class ChangeCaptureRunner:  # noqa: WPS214
+    """Загружает изменения из источника и при необходимости сверяет всё."""
+
+    def __init__(self, sweep: Callable[[], None], source: ChangeSource):
+        """Подготавливает подключения и этапы обработки.
+
+        Args:
+            sweep: полный проход ETL выбранным способом
+            source: источник изменений
+        """
+        self._sweep = sweep
+        self._source = source
+        self._db = PostgresQueryWrapper(settings.chunk_size)
+        self._transformer = create_transformer()
+        self._loader = ElasticLoader(
+            settings.elastic_url,
+            settings.elastic_index,
+        )
+        self._next_sweep: float = 0
+
+    def run(self):
+        """Загружает изменения, пока процесс не будет остановлен.
+
+        Подключение к Postgres остаётся открытым между пакетами изменений,
+        чтобы не терять подготовленные в нём выражения, и закрывается при
+        ошибке или остановке.
+        """
+        try:  # noqa: WPS501
+            self._follow_changes()
+        finally:
+            self._db.client.close()
+            self._loader.close()
+
+    def _follow_changes(self):
+        """Ждёт изменения источника и загружает их."""
+        # подключение раньше прохода: изменения во время прохода не теряются
+        if self._source.start():
+            self._run_sweep()
+        while True:  # noqa: WPS457
+            changes = self._source.wait(self._timeout())
+            if changes is None or self._is_sweep_due():
+                self._run_sweep()
+            elif changes:
+                self._load_changes(changes)
+            self._source.acknowledge()
+
+    def _timeout(self) -> float:
+        """Возвращает время ожидания изменений до следующей сверки.
+
+        Returns:
+            время ожидания, в секундах
+        """
+        if self._source.sweep_interval is None:
+            return _IDLE_TIMEOUT
+        return max(self._next_sweep - monotonic(), 0)
+
+    def _is_sweep_due(self) -> bool:
+        """Проверяет, пора ли выполнить сверочный проход.
+
+        Returns:
+            флаг, наступило ли время сверки
+        """
+        if self._source.sweep_interval is None:
+            return False
+        return monotonic() >= self._next_sweep
+
+    def _run_sweep(self):
+        """Выполняет полный проход и назначает время следующего."""
+        logger.info('Сверочный проход запущен...')
+        self._sweep()
+        if self._source.sweep_interval is None:
+            logger.info('Сверочный проход завершён')
+            return
+        self._next_sweep = monotonic() + self._source.sweep_interval
+        logger.info(
+            'Сверочный проход завершён, следующий через {0} секунд'.format(
+                self._source.sweep_interval,
+            ),
+        )
+
+    def _load_changes(self, changes: list[dict]):
+        """Загружает film_work, затронутые изменениями.
+
+        Транзакция чтения завершается после загрузки, чтобы подключение
+        не простаивало с открытой транзакцией до следующих изменений.
+
+        Args:
+            changes: изменённые записи с таблицей и id
+        """
+        try:  # noqa: WPS501
+            self._load_film_works(changes)
+        finally:
+            self._db.client.end_transaction()
+
+    def _load_film_works(self, changes: list[dict]):
+        """Собирает и загружает документы film_work, затронутых изменениями.
+
+        Args:
+            changes: изменённые записи с таблицей и id
+        """
+        film_work_ids, partial_rows = self._film_work_ids(changes)
+        logger.info(
+            'Изменения: {0}, затронуто film_work: {1}'.format(
+                len(changes),
+                len(film_work_ids) + len(partial_rows),
+            ),
+        )
+        self._load_rows(partial_rows)
+        for ids_chunk in split_chunks(film_work_ids):
+            self._load_rows(
+                record._asdict()  # noqa: WPS437
+                for record in self._db.get_enriched_rows(ids_chunk)
+            )
+
+    def _load_rows(self, bd_data: Iterable[dict]):
+        """Собирает документы из рядов и загружает их в elastic.
+
+        Args:
+            bd_data: ряды расширенных данных или частичного обновления
+        """
+        for elastic_data in self._transformer.transform(bd_data):
+            self._loader.load(elastic_data)
+
+    def _film_work_ids(self, changes: list[dict]) -> tuple[list, list]:
+        """Сводит изменённые записи к id затронутых film_work.
+
+        Args:
+            changes: изменённые записи с таблицей и id
+
+        Returns:
+            id film_work без повторов для полной сборки и ряды частичного
+            обновления
+        """
+        film_work_ids = set()
+        partial_rows = []
+        for table, ids in group_by_table(changes).items():
+            if PostgresExtractor.watched_tables[table] != 'related':
+                film_work_ids.update(ids)
+                continue
+            table_updates = related_updates(self._db, table, list(ids))
+            film_work_ids.update(table_updates[0])
+            partial_rows.extend(table_updates[1])
+        return list(film_work_ids), partial_rows
+
+
+def run_forever(sweep: Callable[[], None], source_name: str):
+    """Запускает синхронизацию по потоку изменений.
+
+    Args:
+        sweep: полный проход ETL выбранным способом
+        source_name: источник изменений, notify или replication
+    """
+    ChangeCaptureRunner(sweep, sources[source_name]()).run()
@@ -0,0 +1,176 @@
+"""Проход ETL с независимым параллельным чтением каждой таблицы.
+
+У каждой отслеживаемой таблицы свой поток и своё подключение к Postgres:
+потоки таблиц выгружают id изменённых film_work в общую очередь без
+повторов, а потоки обогащения забирают из неё наборы id, получают полные
+данные и загружают их в elastic. Поэтому задержка синхронизации связанных
+и кросс-таблиц не зависит от объёма изменений в основной таблице.
+"""
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from config import settings
+from db.postgres import PostgresQueryWrapper
+from extractor.partial_updates import uses_partial_updates
+from extractor.pending import ChunkToken, PendingBatch, PendingFilmWorks
+from extractor.pg_extract import PostgresExtractor, TableUpdates
+from loader.elastic_load import ElasticLoader
+from runner.workers import ChunkCommitter, WorkerPool
+from transformer.pg_to_elastic import PostgresElasticTransformer
+from transformer.process_pool import create_transformer
+
+
+@dataclass(frozen=True)
+class PartialStages:
+    """Этапы потока таблицы, загружающие частичные обновления."""
+
+    transformer: PostgresElasticTransformer
+    loader: ElasticLoader
+
+
+class ParallelTablesRunner:  # noqa: WPS214
+    """Выполняет проход с параллельным чтением таблиц."""
+
+    def __init__(self):
+        """Подготавливает экстрактор и объекты подтверждения блоков."""
+        self._extractor = PostgresExtractor(chunk_size=settings.chunk_size)
+        # блоки подтверждаются в порядке выгрузки внутри каждой таблицы
+        self._committers = {
+            table: ChunkCommitter(self._extractor.commit_chunk)
+            for table in self._extractor.table_names
+        }
+        self._pending: PendingFilmWorks
+
+    def run(self):
+        """Запускает потоки таблиц и обогащения и ждёт конца прохода."""
+        tables = self._extractor.table_names
+        enrich_count = settings.parallel_enrich_workers
+        with WorkerPool(len(tables) + enrich_count) as pool:
+            self._pending = PendingFilmWorks(
+                settings.parallel_max_pending,
+                pool.failed,
+            )
+            table_futures = [
+                pool.submit(self._watch_table, table)
+                for table in tables
+            ]
+            for _ in range(enrich_count):
+                pool.submit(self._enrich)
+            pool.wait(table_futures)
+            self._pending.close()
+
+        self._extractor.finish()
+
+    def _watch_table(self, table: str):
+        """Выгружает изменения таблицы в общую очередь id film_work.
+
+        Args:
+            table: название таблицы
+        """
+        db = PostgresQueryWrapper(settings.chunk_size)
+        stages = None
+        if uses_partial_updates(table):
+            stages = PartialStages(
+                PostgresElasticTransformer(),
+                ElasticLoader(settings.elastic_url, settings.elastic_index),
+            )
+        self._put_chunks(
+            table,
+            self._extractor.table_chunks(table, db),
+            stages,
+        )
+        db.client.close()
+        if stages:
+            stages.loader.close()
+
+    def _put_chunks(
+        self,
+        table: str,
+        table_chunks: Iterable[TableUpdates],
+        stages: Optional[PartialStages],
+    ):
+        """Передаёт блоки изменений таблицы в общую очередь.
+
+        Частичные обновления не требуют обогащения и загружаются сразу
+        этапами потока таблицы.
+
+        Args:
+            table: название таблицы
+            table_chunks: блоки изменений таблицы
+            stages: этапы частичных обновлений, если они есть у таблицы
+        """
+        for seq, (chunk_cursor, fw_ids, renamed) in enumerate(table_chunks):
+            self._committers[table].register(seq, chunk_cursor)
+            if renamed:
+                self._load_partial(stages, renamed)
+            if not self._put_chunk(ChunkToken(table, seq), fw_ids):
+                return
+
+    def _load_partial(self, stages: PartialStages, partial_rows: list[dict]):
+        """Загружает в elastic частичные обновления документов блока.
+
+        Args:
+            stages: этапы частичных обновлений потока таблицы
+            partial_rows: ряды частичного обновления
+        """
+        for elastic_data in stages.transformer.transform(partial_rows):
+            stages.loader.load(elastic_data)
+
+    def _put_chunk(self, token: ChunkToken, film_work_ids: list) -> bool:
+        """Передаёт id блока в очередь или сразу подтверждает пустой блок.
+
+        Args:
+            token: отметка блока
+            film_work_ids: набор id film_work блока
+
+        Returns:
+            False, если проход остановлен из-за ошибки
+        """
+        if not film_work_ids:
+            self._committers[token.table].acknowledge(token.seq)
+            return True
+        return self._pending.put(film_work_ids, token)
+
+    def _enrich(self):
+        """Получает полные данные для id из очереди и загружает их."""
+        db = PostgresQueryWrapper(settings.chunk_size)
+        transformer = create_transformer()
+        loader = ElasticLoader(settings.elastic_url, settings.elastic_index)
+        batch = self._pending.take(settings.chunk_size)
+        while batch:
+            self._load_batch(db, transformer, loader, batch)
+            for token in self._pending.complete(batch):
+                self._committers[token.table].acknowledge(token.seq)
+            batch = self._pending.take(settings.chunk_size)
+        db.client.close()
+        loader.close()
+
+    def _load_batch(
+        self,
+        db: PostgresQueryWrapper,
+        transformer: PostgresElasticTransformer,
+        loader: ElasticLoader,
+        batch: PendingBatch,
+    ):
+        """Получает полные данные набора id и загружает их в elastic.
+
+        Args:
+            db: обёртка запросов потока обогащения
+            transformer: преобразователь потока обогащения
+            loader: загрузчик потока обогащения
+            batch: набор id из очереди
+        """
+        enriched_rows = db.get_enriched_rows(
+            [film_work_id for film_work_id, _ in batch],
+        )
+        bd_data = (
+            record._asdict()  # noqa: WPS437
+            for record in enriched_rows
+        )
+        for elastic_data in transformer.transform(bd_data):
+            loader.load(elastic_data)
+
+
+def run_pass():
+    """Выполняет проход с параллельным чтением таблиц."""
+    ParallelTablesRunner().run()
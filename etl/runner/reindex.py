@@ -0,0 +1,251 @@
+"""Полная переиндексация film_work в новую версию индекса.
+
+Новая версия индекса {alias}_v{n} создаётся рядом с текущей, поэтому
+поиск и инкрементальная загрузка продолжают работать с текущей версией
+через алиас. Таблица film_work делится на диапазоны id примерно равного
+размера, диапазоны обрабатываются в reindex_workers процессах, у каждого
+из которых свои подключения к Postgres и elastic. На время загрузки у
+новой версии отключены обновление поиска и реплики. Позиция каждого
+диапазона хранится в своём состоянии, поэтому прерванная переиндексация
+продолжается с места остановки.
+
+Изменения, сделанные во время загрузки, догружаются в новую версию с
+позиций таблиц, прочитанных до её начала. film_work, удалённые за это
+время, без pg_track_deletes не видны догрузке, поэтому лишние документы
+удаляются сверкой id индекса с film_work. Алиас переключается, когда
+количество документов совпадает с количеством film_work, после чего
+догрузка повторяется: она подхватывает изменения, которые успели попасть
+только в прежнюю версию. Если количество так и не совпало, состояние
+очищается, и следующий запуск строит новую версию заново.
+"""
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from common.state_processor import State
+from config import settings
+from db.postgres import PostgresQueryWrapper
+from extractor import pg_extract
+from frozendict import frozendict
+from loader.hashes import HashStore
+from loader.indices import IndexManager
+from runner import reindex_worker, sequential
+
+logger = logging.getLogger(__name__)
+
+# настройки новой версии индекса на время загрузки
+BULK_INDEX_SETTINGS = frozendict(refresh_interval='-1', number_of_replicas=0)
+# состояние экстрактора, догружающего изменения в новую версию
+CATCH_UP_STATE = 'reindex_catch_up'
+# сколько раз догружать изменения, пока количество документов не совпадёт
+SWITCH_ATTEMPTS = 3
+
+
+def make_partitions(upper_ids: list[str]) -> list[tuple[str, str]]:
+    """Составляет диапазоны по их верхним границам.
+
+    Args:
+        upper_ids: верхние границы диапазонов по возрастанию
+
+    Returns:
+        нижняя (не включительно) и верхняя граница каждого диапазона
+    """
+    lower_ids = [pg_extract.MIN_ID, *upper_ids[:-1]]
+    return list(zip(lower_ids, upper_ids))
+
+
+class ReindexRunner:  # noqa: WPS214
+    """Строит новую версию индекса и переключает на неё алиас."""
+
+    def __init__(self):
+        """Подготавливает состояние переиндексации и управление индексом."""
+        self._state = State('reindex')
+        self._indices = IndexManager()
+
+    def run(self):
+        """Выполняет или продолжает полную переиндексацию."""
+        if self._state.get('partitions'):
+            logger.info('Продолжаем прерванную переиндексацию')
+        else:
+            self._plan()
+        target_index = self._state['target_index']
+        loaded = self._run_partitions(target_index)
+        self._finish(target_index)
+        logger.info(
+            'Переиндексация в {0} завершена, film_work: {1}'.format(
+                target_index,
+                loaded,
+            ),
+        )
+
+    def _plan(self):
+        """Создаёт новую версию индекса и делит film_work на диапазоны.
+
+        Позиции таблиц читаются до диапазонов: с них начнётся догрузка
+        изменений, сделанных во время загрузки.
+        """
+        db = PostgresQueryWrapper(settings.chunk_size)
+        pg_extract.save_positions(
+            pg_extract.read_positions(db),
+            CATCH_UP_STATE,
+        )
+        partitions = make_partitions(
+            db.get_partition_bounds(settings.reindex_partitions),
+        )
+        db.client.close()
+        for partition, _ in enumerate(partitions):
+            reindex_worker.reset_partition(partition)
+        target_index = self._indices.create_version(dict(BULK_INDEX_SETTINGS))
+        with self._state.transaction():
+            self._state['target_index'] = target_index
+            self._state['partitions'] = partitions
+        logger.info(
+            'Переиндексация: диапазонов {0}, процессов {1}'.format(
+                len(partitions),
+                settings.reindex_workers,
+            ),
+        )
+
+    def _run_partitions(self, target_index: str) -> int:
+        """Загружает диапазоны в пуле процессов.
+
+        Args:
+            target_index: новая версия индекса
+
+        Returns:
+            количество загруженных film_work
+        """
+        partitions = enumerate(self._state['partitions'])
+        with ProcessPoolExecutor(
+            max_workers=settings.reindex_workers,
+            # новые процессы не наследуют соединения родителя
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=reindex_worker.init_worker,
+        ) as executor:
+            load_partition = partial(
+                reindex_worker.reindex_partition,
+                target_index,
+            )
+            return sum(executor.map(load_partition, partitions))
+
+    def _finish(self, target_index: str):
+        """Догружает изменения, переключает алиас и очищает состояние.
+
+        Args:
+            target_index: новая версия индекса
+        """
+        self._indices.finish_bulk_load(target_index, BULK_INDEX_SETTINGS)
+        self._catch_up_until_complete(target_index)
+        seed_positions = self._seed_positions()
+        self._indices.switch_alias(target_index)
+        # изменения, загруженные в прежнюю версию до переключения алиаса
+        self._catch_up(target_index)
+        self._move_hashes(target_index)
+        if seed_positions:
+            pg_extract.save_positions(seed_positions)
+        self._clear_state()
+
+    def _move_hashes(self, target_index: str):
+        """Передаёт алиасу хеши документов новой версии индекса.
+
+        Инкрементальная загрузка идёт через алиас, и её хеши должны
+        описывать документы версии, на которую алиас теперь указывает.
+
+        Args:
+            target_index: новая версия индекса
+        """
+        if not settings.elastic_skip_unchanged:
+            return
+        hashes = HashStore(settings.storage_dir / settings.hash_store_file)
+        hashes.move(target_index, self._indices.alias)
+        hashes.close()
+
+    def _catch_up(self, target_index: str):
+        """Догружает в новую версию изменения с позиций догрузки.
+
+        Данные блоков не хранятся в общих с main.py файлах состояния:
+        восстановление идёт по границам блоков.
+
+        Args:
+            target_index: новая версия индекса
+        """
+        sequential.run_pass(target_index, CATCH_UP_STATE, keep_payload=False)
+
+    def _catch_up_until_complete(self, target_index: str):
+        """Догружает изменения, пока количество документов не совпадёт.
+
+        Args:
+            target_index: новая версия индекса
+
+        Raises:
+            RuntimeError: количество документов так и не совпало
+        """
+        for _ in range(SWITCH_ATTEMPTS):
+            self._catch_up(target_index)
+            self._indices.refresh(target_index)
+            expected = self._film_work_count()
+            if self._indices.count(target_index) > expected:
+                self._delete_missing(target_index)
+            if self._indices.count(target_index) == expected:
+                return
+        # повторный запуск с теми же диапазонами завершился бы так же
+        self._clear_state()
+        raise RuntimeError(
+            'Количество документов в {0} не совпало с film_work'.format(
+                target_index,
+            ),
+        )
+
+    def _delete_missing(self, target_index: str):
+        """Удаляет документы film_work, удалённых во время загрузки.
+
+        Args:
+            target_index: новая версия индекса
+        """
+        deleted = sequential.delete_missing(
+            target_index,
+            self._indices.iter_ids(target_index, settings.chunk_size),
+        )
+        self._indices.refresh(target_index)
+        logger.info(
+            'Удалено документов film_work, которых нет в БД: {0}'.format(
+                deleted,
+            ),
+        )
+
+    def _film_work_count(self) -> int:
+        """Считает film_work в БД.
+
+        Returns:
+            количество film_work
+        """
+        db = PostgresQueryWrapper(settings.chunk_size)
+        film_work_count = db.get_film_work_count()
+        db.client.close()
+        return film_work_count
+
+    def _clear_state(self):
+        """Очищает состояние переиндексации."""
+        with self._state.transaction():
+            self._state['target_index'] = None
+            self._state['partitions'] = None
+        self._state.checkpoint()
+
+    def _seed_positions(self) -> pg_extract.Positions:
+        """Читает позиции таблиц для первого запуска main.py.
+
+        Returns:
+            позиции таблиц или пустой словарь, если экстрактор уже работает
+        """
+        if State('pg_extractor').data:
+            return {}
+        db = PostgresQueryWrapper(settings.chunk_size)
+        positions = pg_extract.read_positions(db)
+        db.client.close()
+        return positions
+
+
+def run():
+    """Выполняет полную переиндексацию."""
+    ReindexRunner().run()
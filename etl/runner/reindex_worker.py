@@ -0,0 +1,111 @@
+"""Загрузка одного диапазона film_work в процессе переиндексации."""
+from common.state_processor import State
+from config import settings
+from db.postgres import PostgresQueryWrapper
+from loader.elastic_load import ElasticLoader
+from logger.log_config import setup_logging
+from transformer.process_pool import create_transformer
+
+
+def partition_state(partition: int) -> State:
+    """Возвращает состояние диапазона.
+
+    Args:
+        partition: номер диапазона
+
+    Returns:
+        состояние с last_id и флагом done
+    """
+    return State('reindex_{0}'.format(partition))
+
+
+def reset_partition(partition: int):
+    """Сбрасывает позицию диапазона перед новой переиндексацией.
+
+    Args:
+        partition: номер диапазона
+    """
+    state = partition_state(partition)
+    with state.transaction():
+        state['last_id'] = None
+        state['done'] = False
+    state.checkpoint()
+
+
+class PartitionReindexer:
+    """Загружает в elastic все film_work одного диапазона id."""
+
+    def __init__(self, partition: int, bounds: list[str], index_name: str):
+        """Подключается к Postgres и elastic.
+
+        Args:
+            partition: номер диапазона
+            bounds: нижняя (не включительно) и верхняя граница диапазона
+            index_name: индекс, в который загружаются документы
+        """
+        self._lower_id = bounds[0]
+        self._upper_id = bounds[1]
+        self._state = partition_state(partition)
+        self._db = PostgresQueryWrapper(settings.reindex_chunk_size)
+        # восстановление идёт по позициям диапазонов, поэтому этапы не
+        # хранят данные блоков в общих с main.py файлах состояния
+        self._transformer = create_transformer(keep_payload=False)
+        self._loader = ElasticLoader(
+            settings.elastic_url,
+            index_name,
+            keep_payload=False,
+        )
+
+    def run(self) -> int:
+        """Загружает диапазон, начиная с сохранённой позиции.
+
+        Returns:
+            количество загруженных film_work
+        """
+        loaded = 0
+        film_work_ids = self._next_ids()
+        while film_work_ids:
+            bd_data = (
+                record._asdict()  # noqa: WPS437
+                for record in self._db.get_enriched_rows(film_work_ids)
+            )
+            for elastic_data in self._transformer.transform(bd_data):
+                self._loader.load(elastic_data)
+            self._state['last_id'] = film_work_ids[-1]
+            loaded += len(film_work_ids)
+            film_work_ids = self._next_ids()
+        self._state['done'] = True
+        self._state.checkpoint()
+        self._db.client.close()
+        return loaded
+
+    def _next_ids(self) -> list[str]:
+        """Загружает следующий блок id диапазона.
+
+        Returns:
+            id film_work или пустой список, если диапазон загружен
+        """
+        if self._state.get('done'):
+            return []
+        return self._db.get_ids_in_range(
+            self._state.get('last_id') or self._lower_id,
+            self._upper_id,
+        )
+
+
+def init_worker():
+    """Настраивает логирование процесса переиндексации."""
+    setup_logging()
+
+
+def reindex_partition(index_name: str, numbered_bounds: tuple) -> int:
+    """Загружает диапазон id в отдельном процессе.
+
+    Args:
+        index_name: индекс, в который загружаются документы
+        numbered_bounds: номер диапазона и его границы
+
+    Returns:
+        количество загруженных film_work
+    """
+    return PartitionReindexer(*numbered_bounds, index_name).run()
@@ -0,0 +1,84 @@
+"""Последовательное выполнение прохода ETL цепочкой генераторов."""
+from typing import Iterable, Iterator, Optional
+
+from config import settings
+from db.postgres import DeletedFilmWork, PostgresQueryWrapper
+from extractor.pg_extract import PostgresExtractor
+from loader.elastic_load import ElasticLoader
+from transformer.process_pool import create_transformer
+
+
+def run_pass(
+    index_name: Optional[str] = None,
+    state_name: str = 'pg_extractor',
+    keep_payload: Optional[bool] = None,
+):
+    """Выполняет проход: каждый блок проходит все этапы по очереди.
+
+    Args:
+        index_name: индекс для загрузки, по умолчанию - settings.elastic_index
+        state_name: имя состояния экстрактора с позициями таблиц
+        keep_payload: хранить данные блоков в состоянии, None - из настроек
+    """
+    pg_extractor = PostgresExtractor(
+        chunk_size=settings.chunk_size,
+        state_name=state_name,
+        keep_payload=keep_payload,
+    )
+    pg_elastic_transformer = create_transformer(keep_payload)
+    elastic_loader = ElasticLoader(
+        settings.elastic_url,
+        index_name or settings.elastic_index,
+        keep_payload,
+    )
+    for pg_data in pg_extractor.extract():
+        for elastic_data in pg_elastic_transformer.transform(pg_data):
+            elastic_loader.load(elastic_data)
+
+
+def delete_missing(index_name: str, id_batches: Iterable[list]) -> int:
+    """Удаляет из индекса документы film_work, которых уже нет в БД.
+
+    Документы удаления проходят те же этапы, что и документы прохода,
+    данные блоков в состоянии не хранятся.
+
+    Args:
+        index_name: индекс, из которого удаляются документы
+        id_batches: блоки id документов индекса
+
+    Returns:
+        количество удалённых документов
+    """
+    pg_elastic_transformer = create_transformer(keep_payload=False)
+    elastic_loader = ElasticLoader(
+        settings.elastic_url,
+        index_name,
+        keep_payload=False,
+    )
+    deleted = 0
+    for deleted_rows in _missing_rows(id_batches):
+        for elastic_data in pg_elastic_transformer.transform(deleted_rows):
+            elastic_loader.load(elastic_data)
+        deleted += len(deleted_rows)
+    elastic_loader.close()
+    return deleted
+
+
+def _missing_rows(id_batches: Iterable[list]) -> Iterator[list[dict]]:
+    """Находит в блоках id документов film_work, которых нет в БД.
+
+    Args:
+        id_batches: блоки id документов индекса
+
+    Yields:
+        непустые блоки рядов удаления
+    """
+    db = PostgresQueryWrapper(settings.chunk_size)
+    for index_ids in id_batches:
+        deleted_rows = [
+            DeletedFilmWork(fw_id)._asdict()  # noqa: WPS437
+            for fw_id in db.get_missing_ids(index_ids)
+        ]
+        if deleted_rows:
+            yield deleted_rows
+    db.client.close()
@@ -0,0 +1,163 @@
+"""Конвейерное выполнение прохода ETL: этапы работают в отдельных потоках.
+
+Экстрактор, преобразователи и загрузчики связаны очередями ограниченного
+размера: если elastic не успевает принимать данные, очереди заполняются
+и экстрактор ждёт их освобождения. Пока загрузчик ожидает ответа elastic,
+экстрактор уже выполняет запросы к Postgres для следующих блоков.
+"""
+import threading
+from concurrent.futures import Future, wait
+from contextlib import suppress
+from queue import Empty, Full, Queue
+from typing import Any, Optional
+
+from config import settings
+from extractor.pg_extract import PostgresExtractor
+from loader.elastic_load import ElasticLoader
+from runner.workers import POLL_TIMEOUT, ChunkCommitter, WorkerPool
+from transformer.pg_to_elastic import PostgresElasticTransformer
+from transformer.process_pool import create_transformer
+
+# маркер завершения работы для потоков этапов
+_STOP = object()
+
+
+class ThreadedPipeline:  # noqa: WPS214
+    """Выполняет проход ETL конвейером потоков."""
+
+    def __init__(self):
+        """Создаёт очереди между этапами."""
+        self._chunks: Queue = Queue(maxsize=settings.pipeline_queue_size)
+        self._documents: Queue = Queue(maxsize=settings.pipeline_queue_size)
+        self._failed = threading.Event()
+        self._committer: Optional[ChunkCommitter] = None
+
+    def run(self):
+        """Запускает этапы и дожидается обработки всех блоков прохода."""
+        extractor = PostgresExtractor(chunk_size=settings.chunk_size)
+        self._committer = ChunkCommitter(extractor.commit_chunk)
+        with WorkerPool(
+            1
+            + settings.pipeline_transform_workers
+            + settings.pipeline_load_workers,
+        ) as pool:
+            self._failed = pool.failed
+            extract_future = pool.submit(self._extract, extractor)
+            transform_futures = [
+                pool.submit(self._transform, create_transformer())
+                for _ in range(settings.pipeline_transform_workers)
+            ]
+            load_futures = [
+                pool.submit(self._load, self._create_loader())
+                for _ in range(settings.pipeline_load_workers)
+            ]
+            pool.wait([extract_future])
+            self._stop_workers(self._chunks, transform_futures)
+            self._stop_workers(self._documents, load_futures)
+
+        extractor.finish()
+
+    def _create_loader(self) -> ElasticLoader:
+        """Создаёт загрузчик для отдельного потока.
+
+        Returns:
+            загрузчик в индекс elastic search
+        """
+        return ElasticLoader(settings.elastic_url, settings.elastic_index)
+
+    def _extract(self, extractor: PostgresExtractor):
+        """Выгружает блоки и передаёт их преобразователям.
+
+        Args:
+            extractor: экстрактор Postgres
+        """
+        chunks = enumerate(extractor.extract_chunks())
+        for seq, (chunk_cursor, enriched_rows) in chunks:
+            self._committer.register(seq, chunk_cursor)
+            # ряды забираются здесь, так как подключение экстрактора
+            # используется только в его потоке
+            rows = list(enriched_rows)
+            if not rows:
+                self._committer.acknowledge(seq)
+            elif not self._put(self._chunks, (seq, rows)):
+                return
+
+    def _transform(self, transformer: PostgresElasticTransformer):
+        """Преобразует блоки в документы elastic.
+
+        Args:
+            transformer: преобразователь этого потока
+        """
+        while True:  # noqa: WPS457
+            queue_item = self._get(self._chunks)
+            if queue_item is _STOP:
+                return
+            seq, rows = queue_item
+            documents = [
+                document
+                for elastic_data in transformer.transform(rows)
+                for document in elastic_data
+            ]
+            if not self._put(self._documents, (seq, documents)):
+                return
+
+    def _load(self, loader: ElasticLoader):
+        """Загружает документы в elastic и подтверждает блоки.
+
+        Args:
+            loader: загрузчик этого потока
+        """
+        while True:  # noqa: WPS457
+            queue_item = self._get(self._documents)
+            if queue_item is _STOP:
+                return
+            seq, documents = queue_item
+            if documents:
+                loader.load(documents)
+            self._committer.acknowledge(seq)
+
+    def _stop_workers(self, queue: Queue, futures: list[Future]):
+        """Передаёт потокам этапа маркер завершения и ждёт их окончания.
+
+        Args:
+            queue: входная очередь этапа
+            futures: потоки этапа
+        """
+        for _ in futures:
+            self._put(queue, _STOP)
+        wait(futures)
+
+    def _put(self, queue: Queue, queue_item: Any) -> bool:
+        """Кладёт элемент в очередь, ожидая свободного места.
+
+        Args:
+            queue: очередь этапа
+            queue_item: элемент очереди
+
+        Returns:
+            False, если конвейер остановлен из-за ошибки
+        """
+        while not self._failed.is_set():
+            with suppress(Full):
+                queue.put(queue_item, timeout=POLL_TIMEOUT)
+                return True
+        return False
+
+    def _get(self, queue: Queue) -> Any:
+        """Забирает элемент из очереди, ожидая его появления.
+
+        Args:
+            queue: очередь этапа
+
+        Returns:
+            элемент очереди или маркер завершения, если конвейер остановлен
+        """
+        while not self._failed.is_set():
+            with suppress(Empty):
+                return queue.get(timeout=POLL_TIMEOUT)
+        return _STOP
+
+
+def run_pass():
+    """Выполняет проход конвейером потоков."""
+    ThreadedPipeline().run()
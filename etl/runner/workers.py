@@ -0,0 +1,121 @@
+"""Общие средства для выполнения этапов ETL в потоках."""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable
+
+from extractor.cursor import ChunkCursor
+
+logger = logging.getLogger(__name__)
+
+# как часто потоки проверяют, не остановлен ли проход, в секундах
+POLL_TIMEOUT = 0.5
+
+
+class ChunkCommitter:
+    """Подтверждает блоки в порядке их выгрузки.
+
+    Блоки могут быть загружены в elastic в любом порядке, но last_modified
+    таблицы сдвигается только тогда, когда подтверждены все предыдущие блоки.
+    """
+
+    def __init__(self, commit: Callable[[ChunkCursor], None]):
+        """Задаёт функцию сохранения границы подтверждённого блока.
+
+        Args:
+            commit: функция, сдвигающая last_modified по границе блока
+        """
+        self._commit = commit
+        self._cursors: dict[int, ChunkCursor] = {}
+        self._acknowledged: set[int] = set()
+        self._next_seq = 0
+        self._lock = threading.Lock()
+
+    def register(self, seq: int, chunk_cursor: ChunkCursor):
+        """Регистрирует выгруженный блок.
+
+        Args:
+            seq: порядковый номер блока
+            chunk_cursor: граница блока
+        """
+        with self._lock:
+            self._cursors[seq] = chunk_cursor
+
+    def acknowledge(self, seq: int):
+        """Подтверждает обработку блока и сохраняет непрерывный префикс.
+
+        Args:
+            seq: порядковый номер обработанного блока
+        """
+        with self._lock:
+            self._acknowledged.add(seq)
+            while self._next_seq in self._acknowledged:
+                self._acknowledged.remove(self._next_seq)
+                self._commit(self._cursors.pop(self._next_seq))
+                self._next_seq += 1
+
+
+class WorkerPool:
+    """Пул потоков этапов, останавливаемый при ошибке любого из них.
+
+    Потоки должны сами проверять флаг failed и завершаться, когда он
+    установлен. После выхода из пула исключение упавшего потока
+    поднимается повторно.
+    """
+
+    def __init__(self, max_workers: int):
+        """Создаёт пул потоков.
+
+        Args:
+            max_workers: количество потоков пула
+        """
+        self.failed = threading.Event()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='etl-worker',
+        )
+        self._futures: list[Future] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._executor.shutdown(wait=True)
+        if exc_type is None:
+            # повторно поднимает исключение упавшего потока, если оно было
+            for future in self._futures:
+                future.result()
+
+    def submit(self, func: Callable, *args) -> Future:
+        """Запускает поток этапа.
+
+        Args:
+            func: функция потока
+            args: аргументы функции
+
+        Returns:
+            запущенный поток
+        """
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(self._check_worker)
+        self._futures.append(future)
+        return future
+
+    def wait(self, futures: list[Future]):
+        """Ожидает завершения потоков.
+
+        Args:
+            futures: потоки, завершения которых нужно дождаться
+        """
+        wait(futures)
+
+    def _check_worker(self, future: Future):
+        """Останавливает проход, если поток этапа завершился с ошибкой.
+
+        Args:
+            future: завершившийся поток этапа
+        """
+        error = future.exception()
+        if error:
+            logger.error('Ошибка в потоке этапа: {0}'.format(error))
+            self.failed.set()
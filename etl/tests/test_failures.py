@@ -0,0 +1,148 @@
+"""Разбор ответов elastic на bulk-запросы."""
+import json
+from http import HTTPStatus
+
+from loader.batching import BulkEntry
+from loader.failures import DeadLetterFile, collect_failures
+from requests import Response
+
+# записи запроса: index, index, index, update, delete
+BATCH = tuple(
+    BulkEntry.from_lines(doc_id, doc_id.encode())
+    for doc_id in ('loaded', 'rejected', 'broken', 'missing', 'absent')
+)
+# результаты действий в порядке записей запроса
+ITEMS = (
+    {'index': {'_id': 'loaded', 'status': 201}},
+    {'index': {
+        '_id': 'rejected',
+        'status': 429,
+        'error': {
+            'type': 'es_rejected_execution_exception',
+            'reason': 'rejected execution',
+        },
+    }},
+    {'index': {
+        '_id': 'broken',
+        'status': 400,
+        'error': {
+            'type': 'mapper_parsing_exception',
+            'reason': 'failed to parse field [imdb_rating]',
+        },
+    }},
+    {'update': {
+        '_id': 'missing',
+        'status': 404,
+        'error': {
+            'type': 'document_missing_exception',
+            'reason': 'document missing',
+        },
+    }},
+    {'delete': {'_id': 'absent', 'status': 404, 'result': 'not_found'}},
+)
+
+
+def bulk_response(status: int, answer: dict) -> Response:
+    """Собирает ответ elastic на bulk-запрос.
+
+    Args:
+        status: код ответа
+        answer: тело ответа
+
+    Returns:
+        HTTP-ответ
+    """
+    response = Response()
+    response.status_code = status
+    response._content = json.dumps(answer).encode()  # noqa: WPS437
+    return response
+
+
+class TestCollectFailures:
+    """Сопоставление результатов действий с записями запроса."""
+
+    def test_no_errors(self):
+        """Ответ без ошибок не содержит отказов."""
+        answer = bulk_response(
+            HTTPStatus.OK,
+            {'errors': False, 'items': list(ITEMS[:1])},
+        )
+        assert not collect_failures(list(BATCH[:1]), answer)
+
+    def test_item_failures(self):
+        """Отказы сопоставляются с записями и делятся на временные и нет.
+
+        Обновление отсутствующего документа и удаление отсутствующего
+        документа отказами не считаются.
+        """
+        failures = collect_failures(
+            list(BATCH),
+            bulk_response(
+                HTTPStatus.OK,
+                {'errors': True, 'items': list(ITEMS)},
+            ),
+        )
+        assert [
+            (failure.entry, failure.status, failure.retryable)
+            for failure in failures
+        ] == [(BATCH[1], 429, True), (BATCH[2], 400, False)]
+        assert failures[0].is_throttled
+        assert failures[1].reason == (
+            'mapper_parsing_exception: failed to parse field [imdb_rating]'
+        )
+
+    def test_server_error_item_is_retryable(self):
+        """Ошибка сервера при обработке действия временная."""
+        failures = collect_failures(
+            list(BATCH[:1]),
+            bulk_response(
+                HTTPStatus.OK,
+                {'errors': True, 'items': [{'index': {
+                    'status': 503,
+                    'error': 'unavailable',
+                }}]},
+            ),
+        )
+        assert [failure.retryable for failure in failures] == [True]
+
+    def test_throttled_request(self):
+        """Запрос, отклонённый целиком из-за перегрузки, повторяется."""
+        failures = collect_failures(
+            list(BATCH),
+            bulk_response(HTTPStatus.TOO_MANY_REQUESTS, {}),
+        )
+        assert tuple(failure.entry for failure in failures) == BATCH
+        assert all(failure.retryable for failure in failures)
+
+    def test_rejected_request(self):
+        """Запрос, отклонённый целиком как неверный, не повторяется."""
+        failures = collect_failures(
+            list(BATCH),
+            bulk_response(HTTPStatus.BAD_REQUEST, {}),
+        )
+        assert tuple(failure.entry for failure in failures) == BATCH
+        assert not any(failure.retryable for failure in failures)
+
+
+class TestDeadLetterFile:
+    """Журнал неустранимо не принятых документов."""
+
+    def test_write(self, tmp_path):
+        """Документ журнала содержит причину отказа и строки bulk-формата."""
+        failures = collect_failures(
+            list(BATCH),
+            bulk_response(
+                HTTPStatus.OK,
+                {'errors': True, 'items': list(ITEMS)},
+            ),
+        )
+        dead_letter_path = tmp_path / 'dead_letter.jsonl'
+        DeadLetterFile(dead_letter_path).write(
+            [failure for failure in failures if not failure.retryable],
+        )
+        with open(dead_letter_path) as dead_letter:
+            records = [json.loads(line) for line in dead_letter]
+        assert [
+            (record['id'], record['status'], record['bulk'])
+            for record in records
+        ] == [('broken', 400, 'broken')]
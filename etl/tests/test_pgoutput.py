@@ -0,0 +1,118 @@
+"""Разбор сообщений pgoutput, записанных из слота Postgres."""
+import pytest
+from extractor.pgoutput import Commit, PgOutputDecoder, RowChange
+
+GENRE_ID = '11111111-1111-1111-1111-111111111111'
+CREATED_AT = '2026-10-17 05:54:01.395297+00'
+GENRE_COLUMNS = ('created_at', 'updated_at', 'id', 'name', 'description')
+
+# транзакция insert, update и delete ряда content.genre из
+# pg_logical_slot_get_binary_changes с proto_version 1
+BEGIN = ('42000000000e6a2f0800030101ad21bcfe00000871',)
+RELATION = (
+    '5200005110636f6e74656e740067656e726500640005006372656174',
+    '65645f617400000004a0ffffffff00757064617465645f6174000000',
+    '04a0ffffffff0169640000000b86ffffffff006e616d650000000413',
+    '00000103006465736372697074696f6e0000000019ffffffff',
+)
+INSERT = (
+    '49000051104e0005740000001d323032362d31302d31372030353a35',
+    '343a30312e3339353239372b3030740000001d323032362d31302d31',
+    '372030353a35343a30312e3339353239372b30307400000024313131',
+    '31313131312d313131312d313131312d313131312d31313131313131',
+    '313131313174000000044e6f69726e',
+)
+UPDATE = (
+    '55000051104e0005740000001d323032362d31302d31372030353a35',
+    '343a30312e3339353239372b3030740000001d323032362d31302d31',
+    '372030353a35343a30312e3339353239372b30307400000024313131',
+    '31313131312d313131312d313131312d313131312d31313131313131',
+    '313131313174000000084e656f2d6e6f69726e',
+)
+DELETE = (
+    '44000051104b00056e6e740000002431313131313131312d31313131',
+    '2d313131312d313131312d3131313131313131313131316e6e',
+)
+COMMIT = ('4300000000000e6a2f08000000000e6a2f3800030101ad21bcfe',)
+# позиция WAL после транзакции из сообщения COMMIT
+COMMIT_END_LSN = 0xE6A2F38
+
+
+def payload(chunks: tuple[str, ...]) -> bytes:
+    """Собирает сообщение из частей шестнадцатеричной записи.
+
+    Args:
+        chunks: части шестнадцатеричной записи сообщения
+
+    Returns:
+        сообщение pgoutput
+    """
+    return bytes.fromhex(''.join(chunks))
+
+
+def genre_row(name: str) -> dict:
+    """Возвращает ожидаемый ряд content.genre.
+
+    Args:
+        name: название жанра
+
+    Returns:
+        значения колонок ряда
+    """
+    return {
+        'created_at': CREATED_AT,
+        'updated_at': CREATED_AT,
+        'id': GENRE_ID,
+        'name': name,
+        'description': None,
+    }
+
+
+@pytest.fixture()
+def decoder() -> PgOutputDecoder:
+    """Декодер, которому уже известно описание content.genre.
+
+    Returns:
+        декодер после сообщений Begin и Relation
+    """
+    pg_decoder = PgOutputDecoder()
+    assert pg_decoder.decode(payload(BEGIN)) is None
+    assert pg_decoder.decode(payload(RELATION)) is None
+    return pg_decoder
+
+
+def test_insert(decoder):
+    """Insert передаёт новую версию ряда."""
+    assert decoder.decode(payload(INSERT)) == RowChange(
+        'content',
+        'genre',
+        'I',
+        new_row=genre_row('Noir'),
+    )
+
+
+def test_update(decoder):
+    """Update без REPLICA IDENTITY FULL передаёт только новую версию."""
+    assert decoder.decode(payload(UPDATE)) == RowChange(
+        'content',
+        'genre',
+        'U',
+        new_row=genre_row('Neo-noir'),
+    )
+
+
+def test_delete(decoder):
+    """Delete передаёт ключ ряда, остальные колонки - NULL."""
+    old_row = dict.fromkeys(GENRE_COLUMNS)
+    old_row['id'] = GENRE_ID
+    assert decoder.decode(payload(DELETE)) == RowChange(
+        'content',
+        'genre',
+        'D',
+        old_row=old_row,
+    )
+
+
+def test_commit(decoder):
+    """Commit передаёт позицию WAL после транзакции."""
+    assert decoder.decode(payload(COMMIT)) == Commit(COMMIT_END_LSN)
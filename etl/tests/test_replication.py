@@ -0,0 +1,211 @@
+"""Чтение изменений из слота логической репликации Postgres.
+
+Тесты создают отдельные слот и публикацию и пропускаются, если настройки
+подключения не заданы или Postgres недоступен.
+"""
+import importlib
+import threading
+import time
+import uuid
+
+import pytest
+from psycopg2 import OperationalError, connect, sql
+from pydantic import ValidationError
+
+TEST_SLOT = 'etl_test_slot'
+TEST_PUBLICATION = 'etl_test_publication'
+# время ожидания изменений слота, в секундах
+WAIT_TIMEOUT = 5
+# время сбора пачки, за которое тест успевает разорвать подключение
+BATCH_WINDOW = 3
+# сколько раз с паузой SLOT_RELEASE_PAUSE проверять, что слот освободился
+SLOT_RELEASE_ATTEMPTS = 50
+SLOT_RELEASE_PAUSE = 0.1
+
+ACTIVE_SLOT_QUERY = """
+    SELECT active_pid FROM pg_replication_slots
+    WHERE slot_name = {slot} AND active;
+"""
+TERMINATE_SLOT_READER_QUERY = """
+    SELECT pg_terminate_backend(active_pid) FROM pg_replication_slots
+    WHERE slot_name = {slot} AND active;
+"""
+DROP_SLOT_QUERY = """
+    SELECT pg_drop_replication_slot(slot_name) FROM pg_replication_slots
+    WHERE slot_name = {slot};
+"""
+INSERT_GENRE_QUERY = """
+    INSERT INTO content.genre (id, name, created_at, updated_at)
+    VALUES ({genre_id}, {name}, now(), now());
+"""
+DROP_PUBLICATION_QUERY = sql.SQL('DROP PUBLICATION IF EXISTS {0}').format(
+    sql.Identifier(TEST_PUBLICATION),
+)
+
+
+@pytest.fixture()
+def settings(monkeypatch, tmp_path):
+    """Настройки со своими слотом, публикацией и каталогом состояний.
+
+    Returns:
+        настройки ETL
+    """
+    try:
+        config = importlib.import_module('config')
+    except ValidationError:
+        pytest.skip('Не заданы настройки подключения к Postgres')
+    monkeypatch.setattr(config.settings, 'storage_subdir', str(tmp_path))
+    monkeypatch.setattr(config.settings, 'replication_slot', TEST_SLOT)
+    monkeypatch.setattr(
+        config.settings,
+        'replication_publication',
+        TEST_PUBLICATION,
+    )
+    return config.settings
+
+
+@pytest.fixture()
+def pg_connection(settings):
+    """Подключение к Postgres, удаляющее после теста слот и публикацию.
+
+    Yields:
+        подключение в режиме autocommit
+    """
+    try:
+        connection = connect(**settings.pg_dsn.dict())
+    except OperationalError:
+        pytest.skip('Postgres недоступен')
+    connection.autocommit = True
+    yield connection
+    # подключение репликации завершается на сервере не сразу после закрытия
+    for _ in range(SLOT_RELEASE_ATTEMPTS):
+        if not run_slot_query(connection, ACTIVE_SLOT_QUERY):
+            break
+        time.sleep(SLOT_RELEASE_PAUSE)
+    run_slot_query(connection, DROP_SLOT_QUERY)
+    with connection.cursor() as cursor:
+        cursor.execute(DROP_PUBLICATION_QUERY)
+    connection.close()
+
+
+@pytest.fixture()
+def create_stream(pg_connection):
+    """Создаёт потоки изменений и закрывает их после теста.
+
+    Yields:
+        функция создания потока изменений
+    """
+    replication = importlib.import_module('extractor.replication')
+    streams = []
+
+    def factory():
+        stream = replication.ReplicationStream()
+        streams.append(stream)
+        return stream
+
+    yield factory
+    for stream in streams:
+        stream.close()
+
+
+@pytest.fixture()
+def genre_change(pg_connection):
+    """Добавляет жанры и удаляет их после теста.
+
+    Yields:
+        функция, добавляющая жанр и возвращающая ожидаемое изменение
+    """
+    genre_ids = []
+
+    def factory() -> dict:
+        genre_id = str(uuid.uuid4())
+        genre_ids.append(genre_id)
+        with pg_connection.cursor() as cursor:
+            cursor.execute(
+                sql.SQL(INSERT_GENRE_QUERY).format(
+                    genre_id=sql.Literal(genre_id),
+                    name=sql.Literal('ETL test {0}'.format(genre_id)),
+                ),
+            )
+        return {'table': 'genre', 'id': genre_id}
+
+    yield factory
+    with pg_connection.cursor() as cursor:
+        cursor.execute(
+            sql.SQL('DELETE FROM content.genre WHERE id IN ({0})').format(
+                sql.SQL(', ').join(map(sql.Literal, genre_ids or [None])),
+            ),
+        )
+
+
+def run_slot_query(pg_connection, query: str):
+    """Выполняет запрос о тестовом слоте.
+
+    Args:
+        pg_connection: подключение к Postgres
+        query: шаблон запроса с {slot}
+
+    Returns:
+        первый ряд ответа или None
+    """
+    with pg_connection.cursor() as cursor:
+        cursor.execute(
+            sql.SQL(query).format(slot=sql.Literal(TEST_SLOT)),
+        )
+        return cursor.fetchone()
+
+
+class TestReplicationStream:
+    """Подтверждение прочитанных из слота изменений."""
+
+    def test_unacknowledged_read_again(self, create_stream, genre_change):
+        """Без подтверждения изменения приходят снова после перезапуска."""
+        stream = create_stream()
+        assert stream.start()
+        change = genre_change()
+        assert change in stream.wait(WAIT_TIMEOUT)
+        stream.close()
+
+        restarted = create_stream()
+        assert restarted.start()
+        assert change in restarted.wait(WAIT_TIMEOUT)
+
+    def test_acknowledged_not_read_again(self, create_stream, genre_change):
+        """Подтверждённые изменения после перезапуска не приходят."""
+        stream = create_stream()
+        assert stream.start()
+        change = genre_change()
+        assert change in stream.wait(WAIT_TIMEOUT)
+        stream.acknowledge()
+        stream.close()
+
+        restarted = create_stream()
+        assert not restarted.start()
+        next_change = genre_change()
+        changes = restarted.wait(WAIT_TIMEOUT)
+        assert next_change in changes
+        assert change not in changes
+
+    def test_interrupted_batch_not_acknowledged(  # noqa: WPS211
+        self,
+        monkeypatch,
+        settings,
+        pg_connection,
+        create_stream,
+        genre_change,
+    ):
+        """Изменения пачки, прерванной разрывом, не подтверждаются."""
+        monkeypatch.setattr(settings, 'notify_batch_window', BATCH_WINDOW)
+        stream = create_stream()
+        assert stream.start()
+        change = genre_change()
+        # разрыв во время сбора пачки, когда транзакция уже получена
+        terminate_args = (pg_connection, TERMINATE_SLOT_READER_QUERY)
+        threading.Timer(1, run_slot_query, terminate_args).start()
+        assert not stream.wait(WAIT_TIMEOUT)
+        stream.acknowledge()
+        stream.close()
+
+        restarted = create_stream()
+        assert restarted.start()
+        assert change in restarted.wait(WAIT_TIMEOUT)
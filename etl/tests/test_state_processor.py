@@ -0,0 +1,196 @@
+"""Транзакции состояния, атомарная запись его файла и перенос в SQLite.
+
+Модуль состояний читает настройки ETL при импорте, поэтому тесты
+пропускаются, если переменные окружения не заданы.
+"""
+import importlib
+import os
+from contextlib import nullcontext
+from functools import partial
+from unittest import mock
+
+import pytest
+from frozendict import frozendict
+from pydantic import ValidationError
+
+STATE_NAME = 'test'
+# значения позиции до транзакции, в транзакции и после неё
+SAVED = frozendict(last_id='a')
+CHANGED = frozendict(last_id='b', data='payload')
+NEXT = frozendict(last_id='c')
+
+
+@pytest.fixture()
+def state_processor():
+    """Модуль состояний.
+
+    Returns:
+        модуль common.state_processor
+    """
+    try:
+        return importlib.import_module('common.state_processor')
+    except ValidationError:
+        pytest.skip('Не заданы настройки ETL')
+
+
+@pytest.fixture()
+def storage(state_processor, tmp_path):
+    """Хранилище состояния в json-файле во временном каталоге.
+
+    Returns:
+        хранилище JsonFileStorage
+    """
+    return state_processor.JsonFileStorage(
+        tmp_path / '{0}.json'.format(STATE_NAME),
+    )
+
+
+@pytest.fixture()
+def create_state(state_processor, storage):
+    """Создаёт состояния, сохраняемые в общее хранилище.
+
+    Returns:
+        функция создания состояния с заданным flush_every
+    """
+    def factory(flush_every: int = 1):
+        return state_processor.State(
+            STATE_NAME,
+            storage=storage,
+            flush_every=flush_every,
+        )
+    return factory
+
+
+def fail_transaction(state, new_values: dict, nested: bool = False):
+    """Присваивает значения в транзакции и прерывает её исключением.
+
+    Args:
+        state: состояние
+        new_values: присваиваемые значения
+        nested: присваивать во вложенной транзакции
+
+    Raises:
+        RuntimeError: после присваиваний
+    """
+    with state.transaction():
+        with state.transaction() if nested else nullcontext():
+            state.update(new_values)
+        raise RuntimeError('transaction failed')
+
+
+class TestState:
+    """Фиксация, откат и сохранение транзакций состояния."""
+
+    def test_commit_saves_all_keys(self, create_state, storage):
+        """Присваивания транзакции сохраняются вместе при выходе."""
+        state = create_state()
+        with state.transaction():
+            state.update(CHANGED)
+            assert not storage.retrieve_state()
+        assert storage.retrieve_state() == CHANGED
+
+    def test_rollback_on_exception(self, create_state, storage):
+        """При исключении ключи возвращаются к прежним значениям."""
+        state = create_state()
+        state.update(SAVED)
+        with pytest.raises(RuntimeError):
+            fail_transaction(state, CHANGED)
+        assert state.data == SAVED
+        assert storage.retrieve_state() == SAVED
+        assert create_state().data == SAVED
+
+    def test_nested_commit_waits_for_outer(self, create_state, storage):
+        """Вложенная транзакция фиксируется вместе с внешней."""
+        state = create_state()
+        with state.transaction():
+            with state.transaction():
+                state.update(CHANGED)
+            assert not storage.retrieve_state()
+        assert storage.retrieve_state() == CHANGED
+
+    def test_outer_rollback_undoes_nested(self, create_state, storage):
+        """Откат внешней транзакции отменяет и завершённую вложенную."""
+        state = create_state()
+        state.update(SAVED)
+        with pytest.raises(RuntimeError):
+            fail_transaction(state, CHANGED, nested=True)
+        assert state.data == SAVED
+        assert storage.retrieve_state() == SAVED
+
+    def test_flush_every(self, create_state, storage):
+        """Состояние записывается после flush_every транзакций."""
+        state = create_state(flush_every=3)
+        state.update(SAVED)
+        with state.transaction():
+            state.update(CHANGED)
+        assert not storage.retrieve_state()
+        state.update(NEXT)
+        assert storage.retrieve_state() == dict(CHANGED, **NEXT)
+
+    def test_checkpoint(self, create_state, storage):
+        """Контрольная точка записывает накопленные изменения сразу."""
+        state = create_state(flush_every=3)
+        state.update(SAVED)
+        state.checkpoint()
+        assert storage.retrieve_state() == SAVED
+        # счётчик транзакций сбрасывается контрольной точкой
+        state.update(CHANGED)
+        assert storage.retrieve_state() == SAVED
+
+
+class TestJsonFileStorage:
+    """Атомарная замена json-файла состояния."""
+
+    def test_no_temporary_files(self, storage):
+        """После записи в каталоге остаётся только файл состояния."""
+        storage.save_state(SAVED)
+        storage.save_state(NEXT)
+        assert os.listdir(storage.file_path.parent) == [
+            storage.file_path.name,
+        ]
+        assert storage.retrieve_state() == NEXT
+
+    def test_failed_replace_keeps_old_state(self, monkeypatch, storage):
+        """Сбой до замены файла оставляет прежнее состояние целым."""
+        storage.save_state(SAVED)
+        monkeypatch.setattr(
+            os,
+            'replace',
+            mock.Mock(side_effect=OSError('disk full')),
+        )
+        with pytest.raises(OSError, match='disk full'):
+            storage.save_state(NEXT)
+        monkeypatch.undo()
+        assert storage.retrieve_state() == SAVED
+
+
+class TestSqliteStorage:
+    """Перенос состояния из json-файла в базу SQLite."""
+
+    def test_legacy_migration(self, state_processor, storage):
+        """Состояние переносится один раз, json-файл переименовывается."""
+        storage.save_state(CHANGED)
+        database_path = storage.file_path.parent / 'state.sqlite3'
+
+        open_storage = partial(
+            state_processor.SqliteStorage,
+            database_path,
+            STATE_NAME,
+            legacy=storage,
+        )
+
+        assert open_storage().retrieve_state() == CHANGED
+        assert not storage.file_path.exists()
+        migrated_path = storage.file_path.with_name(
+            '{0}.migrated'.format(storage.file_path.name),
+        )
+        assert state_processor.JsonFileStorage(
+            migrated_path,
+        ).retrieve_state() == CHANGED
+
+        # повторно появившийся json-файл больше не читается
+        storage.save_state(NEXT)
+        state = state_processor.State(STATE_NAME, storage=open_storage())
+        assert state.data == CHANGED
+        state.update(SAVED)
+        assert open_storage().retrieve_state() == dict(CHANGED, **SAVED)
@@ -0,0 +1,40 @@
+"""Подтверждение блоков в порядке их выгрузки."""
+from extractor.cursor import ChunkCursor
+from runner.workers import ChunkCommitter
+
+TABLE = 'film_work'
+CHUNKS = 4
+
+
+def chunk_cursor(seq: int) -> ChunkCursor:
+    """Возвращает границу блока с номером seq.
+
+    Args:
+        seq: порядковый номер блока
+
+    Returns:
+        граница блока
+    """
+    return ChunkCursor(
+        table=TABLE,
+        last_modified='2021-06-16T20:14:0{0}+00:00'.format(seq),
+        last_id=str(seq),
+    )
+
+
+def test_commits_contiguous_prefix():
+    """Сохраняется только непрерывный префикс подтверждённых блоков."""
+    committed = []
+    committer = ChunkCommitter(committed.append)
+    for seq in range(CHUNKS):
+        committer.register(seq, chunk_cursor(seq))
+
+    committer.acknowledge(2)
+    committer.acknowledge(1)
+    assert not committed
+
+    committer.acknowledge(0)
+    assert committed == [chunk_cursor(0), chunk_cursor(1), chunk_cursor(2)]
+
+    committer.acknowledge(3)
+    assert committed == list(map(chunk_cursor, range(CHUNKS)))
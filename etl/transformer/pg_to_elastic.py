@@ -1,54 +1,90 @@
 """Модуль, отвечающий за конвертацию из формата Postgres в elastic."""
 import logging
 from collections import defaultdict
-from typing import Any, Iterator
+from typing import Any, Iterable, Iterator, Optional
 
+from common import metrics
 from common.state_processor import State
+from config import settings
 from frozendict import frozendict
 
 logger = logging.getLogger(__name__)
 
+# признак документа, который нужно удалить из индекса
+DELETED_FIELD = '_deleted'
+# новые имена персон по id для частичного обновления документа
+RENAMED_PERSONS_FIELD = '_renamed_persons'
+# поля документов, которые описывают действие над документом индекса
+ACTION_FIELDS = (DELETED_FIELD, RENAMED_PERSONS_FIELD)
 
-class PostgresElasticTransformer:
-    """Конвертирует данные, полученные от Postgres, в формат Elastic search."""
 
-    def __init__(self):
-        """Инициализирует словарь для данных преобразования."""
-        self.film_work_data = {}
-        self._state = State('pg_to_elastic')
+def deletion_document(film_work_id: str) -> dict[str, Any]:
+    """Формирует документ удаления film_work из индекса.
 
-    def transform(
-        self,
-        bd_data: list[dict[str, Any]],
-    ) -> Iterator[list[dict]]:
-        """Метод преобразования к формату elastic search.
+    Args:
+        film_work_id: id удалённого film_work
 
-        Args:
-            bd_data: Данные, полученные от БД Postgres.
+    Returns:
+        документ с id и признаком удаления
+    """
+    return {'id': film_work_id, DELETED_FIELD: True}
 
-        Yields:
-            Наборы словарей с отформатированными данными для elastic.
-        """
-        cached_data = self._state.get('data')
-        if cached_data:
-            yield cached_data
 
-        state_data = self._process_bd_data(bd_data)
-        self._state['data'] = state_data
+def renaming_document(
+    film_work_id: str,
+    names: dict[str, str],
+) -> dict[str, Any]:
+    """Формирует документ частичного обновления имён персон film_work.
 
-        if state_data:
-            yield state_data
-        self._state['data'] = None
+    Args:
+        film_work_id: id film_work
+        names: новые имена персон по их id
+
+    Returns:
+        документ с id и новыми именами персон
+    """
+    return {'id': film_work_id, RENAMED_PERSONS_FIELD: names}
+
+
+def is_action_document(document: dict[str, Any]) -> bool:
+    """Проверяет, описывает ли документ действие над документом индекса.
+
+    Args:
+        document: документ преобразователя
+
+    Returns:
+        флаг документа удаления или частичного обновления
+    """
+    return any(field in document for field in ACTION_FIELDS)
+
+
+class DocumentBuilder:  # noqa: WPS214
+    """Собирает документы elastic из рядов Postgres.
+
+    Не обращается к состоянию ETL, поэтому используется и в процессах
+    пула преобразования.
+    """
+
+    def __init__(self):
+        """Инициализирует словарь для собираемых документов."""
         self.film_work_data = {}
+        self._deleted_ids: list[str] = []
+        self._renamed_persons: dict[str, dict[str, str]] = {}
 
-    def _process_bd_data(
+    def build(
         self,
-        bd_data: list[dict[str, Any]],
+        bd_data: Iterable[dict[str, Any]],
     ) -> list[dict[str, Any]]:
         """Метод строит готовый объект, соответствующий структуре индекса.
 
         Получается словарь по ключу id записей film_work, содержащий структуры
             для передачи в elastic search.
+        Принимаются как ряды движка join (персона и жанр в каждом ряду),
+            так и ряды движка aggregated (списки persons и genres).
+        Для рядов удалённых film_work (fw_deleted) в конец добавляются
+            документы удаления, для рядов переименования персон
+            (p_renamed) - документы частичного обновления, по одному на
+            film_work.
 
         Args:
             bd_data: набор рядов данных из pg_extractor.
@@ -57,38 +93,117 @@ class PostgresElasticTransformer:
             Список словарей с данными film_work.
         """
         for record in bd_data:
-            film_work_id = record['fw_id']
-            if film_work_id not in self.film_work_data:
-                self.film_work_data[film_work_id] = defaultdict(set)
-                self.film_work_data[film_work_id].update(
-                    {
-                        'id': record['fw_id'],
-                        'title': record['fw_title'],
-                        'description': record['fw_description'],
-                        'imdb_rating': record['fw_rating'],
-                    },
-                )
-
-            film_work_entry = self.film_work_data[film_work_id]
-            film_work_entry['genre'].add(record['g_genre'])
-
-            person = frozendict(
-                id=record['p_id'],
-                name=record['p_full_name'],
-            )
-            if record['p_role'] == 'actor':
-                film_work_entry['actors'].add(person)
-            elif record['p_role'] == 'writer':
-                film_work_entry['writers'].add(person)
-            elif record['p_role'] == 'director':
-                film_work_entry['director'].add(record['p_full_name'])
+            self._add_record(record)
 
         self._prepare()
 
-        new_data = list(self.film_work_data.values())
-        self._state['data'] = new_data
+        documents = list(self.film_work_data.values())
+        documents.extend(map(deletion_document, self._deleted_ids))
+        documents.extend(
+            renaming_document(film_work_id, names)
+            for film_work_id, names in self._renamed_persons.items()
+        )
+        self.film_work_data = {}
+        self._deleted_ids = []
+        self._renamed_persons = {}
+        return documents
+
+    def _add_record(self, record: dict[str, Any]):
+        """Добавляет ряд данных к собираемым документам.
+
+        Args:
+            record: ряд данных из pg_extractor
+        """
+        if record.get('fw_deleted'):
+            self._deleted_ids.append(record['fw_id'])
+        elif record.get('p_renamed'):
+            self._add_renamed_person(record)
+        elif 'persons' in record:
+            self._add_aggregated_record(
+                self._get_film_work_entry(record),
+                record,
+            )
+        else:
+            self._add_joined_record(self._get_film_work_entry(record), record)
+
+    def _add_renamed_person(self, record: dict[str, Any]):
+        """Запоминает новое имя персоны для частичного обновления film_work.
+
+        Args:
+            record: ряд переименования персоны
+        """
+        film_work_names = self._renamed_persons.setdefault(record['fw_id'], {})
+        film_work_names[record['p_id']] = record['p_full_name']
+
+    def _get_film_work_entry(self, record: dict[str, Any]) -> dict:
+        """Возвращает собираемый объект film_work для ряда данных.
+
+        Args:
+            record: ряд данных из pg_extractor
+
+        Returns:
+            Словарь film_work, в который собираются данные рядов.
+        """
+        film_work_id = record['fw_id']
+        if film_work_id not in self.film_work_data:
+            self.film_work_data[film_work_id] = defaultdict(set)
+            self.film_work_data[film_work_id].update(
+                {
+                    'id': record['fw_id'],
+                    'title': record['fw_title'],
+                    'description': record['fw_description'],
+                    'imdb_rating': record['fw_rating'],
+                },
+            )
 
-        return new_data
+        return self.film_work_data[film_work_id]
+
+    def _add_joined_record(self, film_work_entry, record: dict[str, Any]):
+        """Добавляет в объект film_work данные ряда движка join.
+
+        Args:
+            film_work_entry: собираемый объект film_work
+            record: ряд с одной персоной и одним жанром
+        """
+        film_work_entry['genre'].add(record['g_genre'])
+        self._add_person(
+            film_work_entry,
+            record['p_role'],
+            record['p_id'],
+            record['p_full_name'],
+        )
+
+    def _add_aggregated_record(self, film_work_entry, record: dict[str, Any]):
+        """Добавляет в объект film_work данные ряда движка aggregated.
+
+        Args:
+            film_work_entry: собираемый объект film_work
+            record: ряд со списками persons и genres фильма
+        """
+        film_work_entry['genre'].update(record['genres'])
+        for person in record['persons']:
+            self._add_person(
+                film_work_entry,
+                person['role'],
+                person['id'],
+                person['name'],
+            )
+
+    def _add_person(self, film_work_entry, role, person_id, name):
+        """Добавляет персону в список, соответствующий её роли.
+
+        Args:
+            film_work_entry: собираемый объект film_work
+            role: роль персоны в фильме
+            person_id: id персоны
+            name: полное имя персоны
+        """
+        if role == 'actor':
+            film_work_entry['actors'].add(frozendict(id=person_id, name=name))
+        elif role == 'writer':
+            film_work_entry['writers'].add(frozendict(id=person_id, name=name))
+        elif role == 'director':
+            film_work_entry['director'].add(name)
 
     def _prepare(self):
         """Готовит расширенный объект к передаче в elastic search.
@@ -114,3 +229,66 @@ class PostgresElasticTransformer:
                 for writer in entry['writers']
             ]
             entry['director'] = list(entry['director'])
+
+
+class PostgresElasticTransformer:
+    """Конвертирует данные, полученные от Postgres, в формат Elastic search."""
+
+    def __init__(self, keep_payload: Optional[bool] = None):
+        """Инициализирует словарь для данных преобразования.
+
+        Args:
+            keep_payload: хранить документы в состоянии, None - из настроек
+        """
+        if keep_payload is None:
+            keep_payload = settings.keep_payload_in_state
+        self._keep_payload = keep_payload
+        self._builder = DocumentBuilder()
+        self._state = State('pg_to_elastic')
+        if not settings.keep_payload_in_state and self._state.get('data'):
+            # документы, сохранённые прежним запуском в режиме payload;
+            # состояние общее с main.py, поэтому решают его настройки
+            self._state['data'] = None
+
+    def transform(
+        self,
+        bd_data: Iterable[dict[str, Any]],
+    ) -> Iterator[list[dict]]:
+        """Метод преобразования к формату elastic search.
+
+        Данные могут поступать генератором: ряды обрабатываются по одному,
+        в памяти накапливаются только итоговые документы.
+
+        Args:
+            bd_data: Данные, полученные от БД Postgres.
+
+        Yields:
+            Наборы словарей с отформатированными данными для elastic.
+        """
+        if self._keep_payload and self._state.get('data'):
+            yield self._state['data']
+
+        with metrics.transform_seconds.time():
+            state_data = self._process_bd_data(bd_data)
+        metrics.documents.inc('built', amount=len(state_data))
+        if self._keep_payload:
+            self._state['data'] = state_data
+
+        if state_data:
+            yield state_data
+        if self._keep_payload:
+            self._state['data'] = None
+
+    def _process_bd_data(
+        self,
+        bd_data: Iterable[dict[str, Any]],
+    ) -> list[dict[str, Any]]:
+        """Собирает документы блока.
+
+        Args:
+            bd_data: набор рядов данных из pg_extractor.
+
+        Returns:
+            Список словарей с данными film_work.
+        """
+        return self._builder.build(bd_data)
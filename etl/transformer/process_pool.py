@@ -0,0 +1,198 @@
+"""Преобразование рядов в документы elastic в пуле процессов.
+
+Сборка документов идёт на чистом Python и при быстрых Postgres и elastic
+упирается в одно ядро. ProcessPoolTransformer делит ряды блока по fw_id
+на части из идущих подряд film_work: все ряды одного film_work попадают
+в одну часть. Части собираются в transform_processes процессах, которые
+возвращают документы одним блоком pickle. Документы выдаются в том же
+порядке, что и при сборке в одном процессе, и тем же вызовом transform,
+поэтому подтверждение блоков и состояние этапов не меняются.
+"""
+import math
+import multiprocessing
+import pickle  # noqa: S403
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing.util import Finalize
+from typing import Any, Iterable, Optional
+
+from config import settings
+from logger.log_config import setup_logging
+from transformer import pg_to_elastic
+
+# меньшие части не окупают передачу рядов между процессами
+MIN_SHARD_SIZE = 50
+# поля документа со списками персон
+PERSON_FIELDS = ('actors', 'writers')
+# приоритет остановки пула среди завершающих действий процесса
+_SHUTDOWN_PRIORITY = 100
+
+
+def init_worker():
+    """Настраивает процесс преобразования."""
+    setup_logging()
+
+
+@lru_cache(maxsize=None)
+def worker_builder() -> pg_to_elastic.DocumentBuilder:
+    """Возвращает сборщик документов процесса пула.
+
+    Процессы пула только собирают документы и не обращаются к
+    состоянию ETL.
+
+    Returns:
+        сборщик, общий для всех частей процесса
+    """
+    return pg_to_elastic.DocumentBuilder()
+
+
+@lru_cache(maxsize=None)
+def process_pool(processes: int) -> ProcessPoolExecutor:
+    """Возвращает пул процессов преобразования, общий для потоков.
+
+    Args:
+        processes: количество процессов
+
+    Returns:
+        пул процессов
+    """
+    executor = ProcessPoolExecutor(
+        max_workers=processes,
+        # новые процессы не наследуют соединения и блокировки родителя
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker,
+    )
+    # процесс переиндексации при выходе ждёт свои дочерние процессы раньше,
+    # чем пул останавливается сам: пул останавливается до этого ожидания и
+    # до закрытия очередей multiprocessing, через которые идёт остановка
+    Finalize(executor, executor.shutdown, exitpriority=_SHUTDOWN_PRIORITY)
+    return executor
+
+
+def build_shard(rows: list[dict[str, Any]]) -> bytes:
+    """Собирает документы части блока в процессе пула.
+
+    Args:
+        rows: ряды film_work части блока
+
+    Returns:
+        документы в формате pickle
+    """
+    documents = [
+        plain_document(document)
+        for document in worker_builder().build(rows)
+    ]
+    return pickle.dumps(documents, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def plain_document(document: dict[str, Any]) -> dict[str, Any]:
+    """Заменяет frozendict персон документа обычными словарями.
+
+    frozendict нужны только для удаления повторов персон при сборке.
+
+    Args:
+        document: документ индекса
+
+    Returns:
+        документ без frozendict; документы удаления и частичного
+        обновления - без изменений
+    """
+    if any(field in document for field in pg_to_elastic.ACTION_FIELDS):
+        return document
+    return dict(
+        document,
+        **{
+            field: [dict(person) for person in document[field]]
+            for field in PERSON_FIELDS
+        },
+    )
+
+
+class ProcessPoolTransformer(pg_to_elastic.PostgresElasticTransformer):
+    """Собирает документы блока в пуле процессов."""
+
+    def __init__(self, processes: int, keep_payload: Optional[bool] = None):
+        """Задаёт количество процессов преобразования.
+
+        Args:
+            processes: количество процессов
+            keep_payload: хранить документы в состоянии, None - из настроек
+        """
+        super().__init__(keep_payload)
+        self._processes = processes
+
+    def _process_bd_data(
+        self,
+        bd_data: Iterable[dict[str, Any]],
+    ) -> list[dict[str, Any]]:
+        """Собирает документы по частям в процессах пула.
+
+        Небольшие блоки собираются в текущем процессе.
+
+        Args:
+            bd_data: набор рядов данных из pg_extractor.
+
+        Returns:
+            Список словарей с данными film_work.
+        """
+        film_work_rows: dict[str, list] = {}
+        for record in bd_data:
+            film_work_rows.setdefault(record['fw_id'], []).append(record)
+        shards = self._shard(list(film_work_rows.values()))
+        if len(shards) < 2:
+            return super()._process_bd_data(
+                shard_record for shard in shards for shard_record in shard
+            )
+        shard_documents = process_pool(self._processes).map(
+            build_shard,
+            shards,
+        )
+        return [
+            document
+            for documents in shard_documents
+            for document in pickle.loads(documents)  # noqa: S301
+        ]
+
+    def _shard(self, film_work_rows: list[list]) -> list[list]:
+        """Делит film_work на части из идущих подряд film_work.
+
+        Args:
+            film_work_rows: ряды каждого film_work в порядке появления
+
+        Returns:
+            ряды каждой части
+        """
+        if not film_work_rows:
+            return []
+        shard_count = min(
+            self._processes,
+            math.ceil(len(film_work_rows) / MIN_SHARD_SIZE),
+        )
+        shard_size = math.ceil(len(film_work_rows) / shard_count)
+        return [
+            [
+                record
+                for rows in film_work_rows[start:start + shard_size]
+                for record in rows
+            ]
+            for start in range(0, len(film_work_rows), shard_size)
+        ]
+
+
+def create_transformer(
+    keep_payload: Optional[bool] = None,
+) -> pg_to_elastic.PostgresElasticTransformer:
+    """Создаёт преобразователь по настройке transform_processes.
+
+    Args:
+        keep_payload: хранить документы в состоянии, None - из настроек
+
+    Returns:
+        преобразователь в пуле процессов или в текущем процессе
+    """
+    if settings.transform_processes > 1:
+        return ProcessPoolTransformer(
+            settings.transform_processes,
+            keep_payload,
+        )
+    return pg_to_elastic.PostgresElasticTransformer(keep_payload)